@@ -0,0 +1,67 @@
+# async_engine.py - Асинхронное ядро торгового цикла
+# Независимые запросы цикла (балансы, свечи всех пар, проверка здоровья) выполняются
+# одновременно, решение ждет только то, что ему нужно. Блокирующий python-binance клиент
+# (с его лимитером веса и кэшами) работает в пуле потоков через run_in_executor, а event
+# loop живет в потоке бота - Flask обрабатывает запросы независимо.
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.logger import log
+
+# Сколько последних циклов учитывать в перцентилях
+LATENCY_WINDOW = 500
+
+
+def percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class AsyncCycleEngine:
+    """Event loop + пул потоков для ввода-вывода одного торгового потока"""
+
+    def __init__(self, max_workers: int = 8):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cycle-io")
+        self.loop.set_default_executor(self.executor)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.cycles = 0
+
+    async def call(self, func: Callable, *args) -> Any:
+        """Выполнить блокирующий вызов в пуле, не блокируя event loop"""
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    async def gather(self, calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        """Запустить вызовы одновременно; исключения возвращаются как значения"""
+        keys = list(calls)
+        results = await asyncio.gather(*(self.call(calls[k]) for k in keys), return_exceptions=True)
+        return dict(zip(keys, results))
+
+    def run(self, coro: Awaitable) -> Any:
+        """Выполнить цикл и записать его длительность"""
+        started = time.perf_counter()
+        try:
+            return self.loop.run_until_complete(coro)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+            self.cycles += 1
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        to_ms = lambda v: round(v * 1000, 1) if v is not None else None
+        return {
+            "cycles": self.cycles,
+            "p50_ms": to_ms(percentile(latencies, 0.5)),
+            "p95_ms": to_ms(percentile(latencies, 0.95)),
+            "last_ms": to_ms(latencies[-1] if latencies else None),
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.loop.close()
+        log(f"⚙️ Асинхронное ядро остановлено: {self.stats()}", "ENGINE")
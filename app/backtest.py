@@ -0,0 +1,356 @@
+# backtest.py - Векторизованный бэктест стратегии переключения USDT <-> коин по MA
+# Использование:
+#   python -m app.backtest --data BNBUSDT-1m-2024.csv --interval 30m --ma-short 7 --ma-long 25
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from app.market_data import INTERVAL_MS
+from app.rounding import round_step
+
+# Те же константы, что и в AssetSwitcher / торговом цикле
+FEE_HAIRCUT = 0.999        # продаем/тратим 99.9% баланса для учета комиссий
+MIN_BUY_USDT = 10.0        # минимальная сумма покупки в _buy_base_with_usdt
+BUY_ORDER_MODES = ("quote", "quantity")   # как BUY_ORDER_MODE торгового цикла
+DUST_USDT = 1.0            # порог в get_current_asset_preference
+
+
+@dataclass
+class KlineHistory:
+    """История свечей: время открытия (мс) и цены закрытия"""
+    open_times: np.ndarray
+    closes: np.ndarray
+
+    def __len__(self):
+        return len(self.closes)
+
+
+@dataclass
+class BacktestParams:
+    ma_short: int = 7
+    ma_long: int = 25
+    interval: str = "30m"
+    ma_spread_bps: float = 0.5
+    ma_type: str = "sma"
+    step: float = 0.001                 # LOT_SIZE stepSize
+    fee: float = 0.001                  # комиссия биржи, списывается с полученного актива
+    slippage_bps: float = 0.0
+    initial_usdt: float = 1000.0
+    min_balance_usdt: float = 10.0
+    min_switch_interval: float = 10.0   # секунды, как AssetSwitcher.min_switch_interval
+    # quote - покупка на весь USDT (quoteOrderQty), quantity - на 99.9% с округлением до step
+    buy_order_mode: str = "quote"
+
+
+@dataclass
+class BacktestResult:
+    bars: int
+    initial_equity: float
+    final_equity: float
+    pnl: float
+    pnl_pct: float
+    buy_and_hold_pct: float
+    switches: int
+    failed_switches: int
+    max_drawdown_pct: float
+    final_usdt: float
+    final_base: float
+    elapsed_sec: float
+
+
+# ========== Загрузка истории ==========
+def _normalize_times(open_times: np.ndarray) -> np.ndarray:
+    # Дампы data.binance.vision с 2025 года хранят время в микросекундах
+    open_times = open_times.astype(np.int64)
+    if len(open_times) and open_times[0] > 10 ** 14:
+        open_times = open_times // 1000
+    return open_times
+
+
+def _load_csv(path: str) -> KlineHistory:
+    with open(path, "r", encoding="utf-8") as f:
+        first = f.readline()
+    skip = 0 if first[:1].isdigit() else 1
+    data = np.loadtxt(path, delimiter=",", usecols=(0, 4), skiprows=skip, dtype=np.float64, ndmin=2)
+    return KlineHistory(_normalize_times(data[:, 0]), data[:, 1].copy())
+
+
+def _load_parquet(path: str) -> KlineHistory:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для чтения Parquet установите pyarrow: pip install pyarrow")
+    table = pq.read_table(path)
+    names = table.column_names
+    time_col = "open_time" if "open_time" in names else names[0]
+    close_col = "close" if "close" in names else names[4]
+    open_times = table.column(time_col).to_numpy()
+    if np.issubdtype(open_times.dtype, np.datetime64):
+        open_times = open_times.astype("datetime64[ms]").astype(np.int64)
+    closes = table.column(close_col).to_numpy().astype(np.float64)
+    return KlineHistory(_normalize_times(open_times), closes)
+
+
+def load_klines(path: str) -> KlineHistory:
+    """Загрузить свечи из CSV (формат Binance klines), Parquet, .npz или каталога с файлами"""
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, "*.csv")) + glob.glob(os.path.join(path, "*.parquet")))
+        if not files:
+            raise FileNotFoundError(f"В каталоге {path} нет CSV/Parquet файлов")
+        parts = [load_klines(f) for f in files]
+        hist = KlineHistory(np.concatenate([p.open_times for p in parts]), np.concatenate([p.closes for p in parts]))
+    elif path.endswith(".npz"):
+        data = np.load(path)
+        return KlineHistory(data["open_times"], data["closes"])
+    elif path.endswith(".parquet"):
+        hist = _load_parquet(path)
+    else:
+        hist = _load_csv(path)
+
+    # Сортировка и удаление дублей по времени открытия
+    order = np.argsort(hist.open_times, kind="stable")
+    open_times, closes = hist.open_times[order], hist.closes[order]
+    keep = np.ones(len(open_times), dtype=bool)
+    keep[1:] = open_times[1:] != open_times[:-1]
+    return KlineHistory(open_times[keep], closes[keep])
+
+
+def save_cache(hist: KlineHistory, path: str):
+    """Сохранить историю в .npz для быстрой повторной загрузки"""
+    np.savez(path, open_times=hist.open_times, closes=hist.closes)
+
+
+def resample(hist: KlineHistory, interval: str) -> KlineHistory:
+    """Свести свечи к более крупному интервалу (close = close последней свечи периода)"""
+    interval_ms = INTERVAL_MS[interval]
+    if len(hist) < 2:
+        return hist
+    source_ms = int(np.median(np.diff(hist.open_times[: min(len(hist), 1000)])))
+    if source_ms >= interval_ms:
+        return hist
+    buckets = hist.open_times // interval_ms
+    last = np.flatnonzero(np.diff(buckets))
+    last = np.append(last, len(buckets) - 1)
+    return KlineHistory(buckets[last] * interval_ms, hist.closes[last])
+
+
+# ========== Индикаторы ==========
+def moving_average(closes: np.ndarray, period: int, kind: str = "sma") -> np.ndarray:
+    """MA по всему ряду за один проход; NaN там, где данных меньше периода"""
+    out = np.full(len(closes), np.nan)
+    if len(closes) < period:
+        return out
+    if kind == "sma":
+        windows = np.lib.stride_tricks.sliding_window_view(closes, period)
+        out[period - 1:] = windows.sum(axis=1) / period
+    elif kind == "wma":
+        weights = np.arange(1, period + 1, dtype=np.float64)
+        out[period - 1:] = np.convolve(closes, weights[::-1], mode="valid") / weights.sum()
+    elif kind == "ema":
+        # Рекуррентная формула, начальное значение - SMA первых `period` закрытий
+        alpha = 2.0 / (period + 1)
+        ema = closes[:period].sum() / period
+        values = closes.tolist()
+        result = out.tolist()
+        result[period - 1] = ema
+        for i in range(period, len(values)):
+            ema = alpha * values[i] + (1 - alpha) * ema
+            result[i] = ema
+        out = np.array(result)
+    else:
+        raise ValueError(f"Неизвестный тип MA: {kind}")
+    return out
+
+
+def compute_signals(closes: np.ndarray, params: BacktestParams) -> np.ndarray:
+    """Желаемый актив на каждой свече: 1 - коин, 0 - USDT, -1 - сигнал отфильтрован"""
+    m1 = moving_average(closes, params.ma_short, params.ma_type)
+    m2 = moving_average(closes, params.ma_long, params.ma_type)
+    return signals_from_mas(closes, m1, m2, params.ma_spread_bps)
+
+
+def signals_from_mas(closes: np.ndarray, m1: np.ndarray, m2: np.ndarray, ma_spread_bps: float) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        spread_bps = np.abs((m1 - m2) / closes) * 10000.0
+        desired = np.where(m1 > m2, 1, 0)
+        valid = ~np.isnan(m1) & ~np.isnan(m2) & (spread_bps >= ma_spread_bps)
+    return np.where(valid, desired, -1).astype(np.int8)
+
+
+# ========== Симуляция ==========
+def _holds_base(usdt: float, base: float, price: float) -> bool:
+    """Тот же критерий, что AssetSwitcher.get_current_asset_preference"""
+    base_value = base * price
+    return base_value > usdt and base_value > DUST_USDT
+
+
+def run_backtest(hist: KlineHistory, params: BacktestParams, signals: Optional[np.ndarray] = None) -> BacktestResult:
+    """Бэктест на свечах интервала params.interval (история ресемплируется при необходимости)
+
+    Сигналы считаются векторно для всего ряда (или передаются готовыми, тогда
+    история уже должна быть в интервале params.interval). Переключения
+    симулируются по тем же правилам, что в торговом цикле, но цикл идет только
+    по свечам-кандидатам (где желаемый актив отличается от текущего).
+    """
+    started = time.perf_counter()
+    if params.buy_order_mode not in BUY_ORDER_MODES:
+        raise ValueError(f"Неизвестный buy_order_mode={params.buy_order_mode} (допустимо: {', '.join(BUY_ORDER_MODES)})")
+    # quoteOrderQty тратит весь USDT: комиссия покупки списывается в базовом активе
+    buy_share = 1.0 if params.buy_order_mode == "quote" else FEE_HAIRCUT
+    if signals is None:
+        hist = resample(hist, params.interval)
+    closes, times = hist.closes, hist.open_times
+    n = len(closes)
+    if n == 0:
+        raise ValueError("Пустая история свечей")
+
+    if signals is None:
+        signals = compute_signals(closes, params)
+    want_base = np.flatnonzero(signals == 1)
+    want_usdt = np.flatnonzero(signals == 0)
+    interval_ms = INTERVAL_MS[params.interval]
+
+    usdt, base = params.initial_usdt, 0.0
+    last_switch_ms = None
+    switches = failed = 0
+    slip = params.slippage_bps / 10000.0
+    # Точки изменения балансов: (индекс свечи, usdt, base)
+    change_idx: List[int] = [0]
+    change_usdt: List[float] = [usdt]
+    change_base: List[float] = [base]
+
+    i = 0
+    while i < n:
+        holding_base = _holds_base(usdt, base, closes[i])
+        candidates = want_usdt if holding_base else want_base
+        k = np.searchsorted(candidates, i)
+        if k >= len(candidates):
+            break
+        j = int(candidates[k])
+        if _holds_base(usdt, base, closes[j]) != holding_base:
+            # Текущий актив по балансам изменился из-за движения цены
+            i = j
+            continue
+        i = j
+        price = closes[i]
+        # Решение принимается на закрытии свечи
+        now_ms = times[i] + interval_ms
+
+        if not holding_base and usdt * buy_share < MIN_BUY_USDT:
+            # Капитала не хватает на покупку - баланс больше не изменится
+            failed += 1
+            break
+        if usdt + base * price < params.min_balance_usdt:
+            i += 1
+            continue
+        if last_switch_ms is not None and (now_ms - last_switch_ms) / 1000.0 < params.min_switch_interval:
+            i += 1
+            continue
+
+        ok = False
+        if holding_base:
+            qty = round_step(base * FEE_HAIRCUT, params.step)
+            if qty > 0:
+                fill = price * (1 - slip)
+                usdt += qty * fill * (1 - params.fee)
+                base -= qty
+                ok = True
+        else:
+            to_spend = usdt * buy_share
+            fill = price * (1 + slip)
+            # В режиме quote количество по сумме считает биржа - тоже кратно stepSize
+            qty = round_step(to_spend / fill, params.step)
+            if qty > 0 and to_spend >= MIN_BUY_USDT:
+                usdt -= qty * fill
+                base += qty * (1 - params.fee)
+                ok = True
+
+        if ok:
+            switches += 1
+            last_switch_ms = now_ms
+            change_idx.append(i)
+            change_usdt.append(usdt)
+            change_base.append(base)
+        else:
+            failed += 1
+        i += 1
+
+    # Кривая капитала: балансы кусочно-постоянны между переключениями
+    seg_len = np.diff(np.append(change_idx, n))
+    equity = np.repeat(change_usdt, seg_len) + np.repeat(change_base, seg_len) * closes
+    peaks = np.maximum.accumulate(equity)
+    max_dd = float(np.max(1.0 - equity / peaks)) if n else 0.0
+
+    initial = params.initial_usdt
+    final = float(equity[-1])
+    return BacktestResult(
+        bars=n,
+        initial_equity=initial,
+        final_equity=final,
+        pnl=final - initial,
+        pnl_pct=(final / initial - 1.0) * 100.0,
+        buy_and_hold_pct=(closes[-1] / closes[0] - 1.0) * 100.0,
+        switches=switches,
+        failed_switches=failed,
+        max_drawdown_pct=max_dd * 100.0,
+        final_usdt=usdt,
+        final_base=base,
+        elapsed_sec=time.perf_counter() - started,
+    )
+
+
+# ========== CLI ==========
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Бэктест стратегии MA на истории свечей")
+    parser.add_argument("--data", required=True, help="CSV/Parquet/.npz файл или каталог со свечами")
+    parser.add_argument("--interval", default=os.getenv("INTERVAL", "30m"))
+    parser.add_argument("--ma-short", type=int, default=int(os.getenv("MA_SHORT", "7")))
+    parser.add_argument("--ma-long", type=int, default=int(os.getenv("MA_LONG", "25")))
+    parser.add_argument("--ma-type", default=os.getenv("MA_TYPE", "sma"), choices=["sma", "ema", "wma"])
+    parser.add_argument("--ma-spread-bps", type=float, default=float(os.getenv("MA_SPREAD_BPS", "0.5")))
+    parser.add_argument("--step", type=float, default=0.001, help="LOT_SIZE stepSize пары")
+    parser.add_argument("--fee", type=float, default=0.001)
+    parser.add_argument("--slippage-bps", type=float, default=0.0)
+    parser.add_argument("--initial-usdt", type=float, default=1000.0)
+    parser.add_argument("--min-balance-usdt", type=float, default=float(os.getenv("MIN_BALANCE_USDT", "10.0")))
+    parser.add_argument("--buy-order-mode", default=os.getenv("BUY_ORDER_MODE", "quote").lower(),
+                        choices=BUY_ORDER_MODES)
+    parser.add_argument("--cache", help="сохранить загруженную историю в .npz")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    t0 = time.perf_counter()
+    hist = load_klines(args.data)
+    load_sec = time.perf_counter() - t0
+    if args.cache:
+        save_cache(hist, args.cache)
+    params = BacktestParams(
+        ma_short=args.ma_short,
+        ma_long=args.ma_long,
+        interval=args.interval,
+        ma_spread_bps=args.ma_spread_bps,
+        ma_type=args.ma_type,
+        step=args.step,
+        fee=args.fee,
+        slippage_bps=args.slippage_bps,
+        initial_usdt=args.initial_usdt,
+        min_balance_usdt=args.min_balance_usdt,
+        buy_order_mode=args.buy_order_mode,
+    )
+    result = run_backtest(hist, params)
+    report = {"params": asdict(params), "result": asdict(result), "source_candles": len(hist), "load_sec": load_sec}
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# balances.py - Снимок балансов аккаунта: один get_account за цикл, дальше локальные чтения
+# В режиме WebSocket снимок поддерживается событиями user data stream
+# (outboundAccountPosition / balanceUpdate), и REST нужен только для пересинхронизации.
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.logger import log
+
+
+def base_asset(symbol: str) -> str:
+    return symbol[:-4] if symbol.endswith("USDT") else symbol.split("USDT")[0]
+
+
+# Пометка ордера, прочитанного через GET /api/v3/order: fills и комиссий в ответе нет,
+# сдвигать снимок по нему нельзя - балансы перечитываются через REST
+FILLS_UNKNOWN = "_fills_unknown"
+
+
+def fill_summary(order: Dict) -> Dict:
+    """Итог исполнения из ответа на ордер: количество, сумма в USDT, средняя цена, комиссии"""
+    fills = order.get("fills") or []
+    qty = float(order.get("executedQty") or 0.0)
+    quote = float(order.get("cummulativeQuoteQty") or 0.0)
+    if fills and not quote:
+        quote = sum(float(f["price"]) * float(f["qty"]) for f in fills)
+    commissions: Dict[str, float] = {}
+    for f in fills:
+        asset = f.get("commissionAsset")
+        if asset:
+            commissions[asset] = commissions.get(asset, 0.0) + float(f.get("commission") or 0.0)
+    return {
+        "qty": qty,
+        "quote": quote,
+        "avg_price": quote / qty if qty > 0 else 0.0,
+        "commissions": commissions,
+        # Ордер в конечном статусе без исполнений (IOC истек) - тоже полный ответ
+        "complete": not order.get(FILLS_UNKNOWN) and (
+            bool(fills) or (order.get("status") in ("EXPIRED", "CANCELED", "REJECTED") and not qty)),
+    }
+
+
+class BalanceService:
+    """Свободные балансы всех активов из одного снимка аккаунта
+
+    fetch_account() возвращает ответ get_account; stream_alive() - жив ли
+    user data stream. Пока поток жив, снимок считается актуальным всегда.
+    """
+
+    def __init__(self, fetch_account: Callable[[], Dict], stream_alive: Optional[Callable[[], bool]] = None):
+        self.fetch_account = fetch_account
+        self.stream_alive = stream_alive or (lambda: False)
+        self.free: Dict[str, float] = {}
+        self.locked: Dict[str, float] = {}
+        self.loaded = False
+        self.stale = True
+        self.updated = 0.0
+        self.rest_fetches = 0
+        self.stream_events = 0
+        self.fills_applied = 0
+        self.lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def begin_cycle(self):
+        """Новый торговый цикл: при первом чтении снимок будет перечитан (если нет потока)"""
+        self.stale = True
+
+    def invalidate(self):
+        self.stale = True
+
+    def refresh(self) -> Dict[str, float]:
+        account = self.fetch_account()
+        free, locked = {}, {}
+        for b in account.get("balances", []):
+            free[b["asset"]] = float(b["free"])
+            locked[b["asset"]] = float(b.get("locked", 0.0))
+        with self.lock:
+            self.free, self.locked = free, locked
+            self.loaded = True
+            self.stale = False
+            self.updated = time.time()
+            self.rest_fetches += 1
+        return dict(free)
+
+    def snapshot(self, refresh: bool = False) -> Dict[str, float]:
+        """Свободные балансы; refresh=True - нужны данные после собственного ордера"""
+        if not self.loaded or ((refresh or self.stale) and not self.stream_alive()):
+            requested = time.time()
+            with self._fetch_lock:
+                # Параллельный читатель мог обновить снимок, пока мы ждали блокировку
+                if self.loaded and not self.stale and self.updated >= requested:
+                    with self.lock:
+                        return dict(self.free)
+                return self.refresh()
+        with self.lock:
+            return dict(self.free)
+
+    def get(self, asset: str, refresh: bool = False) -> float:
+        return self.snapshot(refresh).get(asset, 0.0)
+
+    def pair(self, symbol: str, refresh: bool = False) -> Tuple[float, float]:
+        """(USDT, базовый актив) для пары"""
+        free = self.snapshot(refresh)
+        return free.get("USDT", 0.0), free.get(base_asset(symbol), 0.0)
+
+    def apply_fills(self, symbol: str, orders: List[Dict], sent_at: float) -> bool:
+        """Сдвинуть снимок на исполнение своих ордеров вместо повторного get_account
+
+        sent_at - время отправки первого ордера: если снимок уже обновлен после него (событием
+        потока или REST), исполнения в нем учтены. False - ответ без данных об исполнении.
+        """
+        summaries = [(order, fill_summary(order)) for order in orders]
+        if not all(summary["complete"] for _, summary in summaries):
+            return False
+        base = base_asset(symbol)
+        with self.lock:
+            if self.updated >= sent_at:
+                return True
+            for order, summary in summaries:
+                sign = 1.0 if order.get("side", "").upper() == "BUY" else -1.0
+                self.free[base] = max(self.free.get(base, 0.0) + sign * summary["qty"], 0.0)
+                self.free["USDT"] = max(self.free.get("USDT", 0.0) - sign * summary["quote"], 0.0)
+                for asset, commission in summary["commissions"].items():
+                    self.free[asset] = max(self.free.get(asset, 0.0) - commission, 0.0)
+                self.fills_applied += 1
+            self.stale = False
+            self.updated = time.time()
+        return True
+
+    # ---------- События user data stream ----------
+    def apply_account_position(self, event: Dict):
+        """outboundAccountPosition: новые значения free/locked по изменившимся активам"""
+        with self.lock:
+            for b in event.get("B", []):
+                self.free[b["a"]] = float(b["f"])
+                self.locked[b["a"]] = float(b["l"])
+            self.updated = time.time()
+            self.stream_events += 1
+
+    def apply_balance_update(self, event: Dict):
+        """balanceUpdate: ввод/вывод средств, приходит как изменение free"""
+        with self.lock:
+            asset = event["a"]
+            self.free[asset] = self.free.get(asset, 0.0) + float(event["d"])
+            self.updated = time.time()
+            self.stream_events += 1
+        log(f"💳 Изменение баланса {asset}: {event['d']}", "BALANCE")
+
+    def stats(self) -> Dict:
+        return {
+            "assets": len(self.free),
+            "updated": self.updated,
+            "rest_fetches": self.rest_fetches,
+            "stream_events": self.stream_events,
+            "fills_applied": self.fills_applied,
+            "stream_alive": self.stream_alive(),
+        }
@@ -0,0 +1,204 @@
+# exchange_info.py - Кэш exchangeInfo и фильтров символов
+# Один запрос get_exchange_info (вес 20) на все символы вместо get_symbol_info на каждый;
+# фильтры индексируются словарем {символ: {filterType: фильтр}}. Кэш обновляется по TTL и
+# принудительно после ошибки -1013 (биржа поменяла фильтры), а копия на диске позволяет
+# стартовать без запроса. Значений "по умолчанию" нет: если фильтров символа не знаем -
+# ошибка, а не ордер с чужим шагом лота.
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from app.logger import log
+from app.persistence import atomic_write_json
+from app.rounding import Quantizer
+
+# Код Binance "Filter failure" (LOT_SIZE, NOTIONAL, PRICE_FILTER...)
+FILTER_FAILURE_CODE = -1013
+
+
+@dataclass(frozen=True)
+class SymbolFilters:
+    symbol: str
+    step_size: float
+    min_qty: float
+    tick_size: float
+    min_notional: float
+    max_notional: Optional[float] = None
+    apply_min_to_market: bool = True
+    base_asset: str = ""
+    quote_asset: str = ""
+    status: str = "TRADING"
+    quote_precision: int = 8
+    quote_order_allowed: bool = True   # quoteOrderQty для рыночных ордеров
+    # Строки количества/цены для ордеров; без явного - из step_size/tick_size
+    quantizer: Optional[Quantizer] = field(default=None, compare=False, repr=False)
+
+    def __post_init__(self):
+        if self.quantizer is None:
+            object.__setattr__(self, "quantizer", Quantizer(self.step_size, self.tick_size, self.quote_precision))
+
+
+def _float(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def index_symbol(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Запись exchangeInfo.symbols[] -> компактная запись кэша с фильтрами по типу"""
+    return {
+        "status": info.get("status", "TRADING"),
+        "baseAsset": info.get("baseAsset", ""),
+        "quoteAsset": info.get("quoteAsset", ""),
+        "quoteAssetPrecision": info.get("quoteAssetPrecision", info.get("quotePrecision", 8)),
+        "quoteOrderQtyMarketAllowed": info.get("quoteOrderQtyMarketAllowed", True),
+        "filters": {f["filterType"]: f for f in info.get("filters", []) if "filterType" in f},
+    }
+
+
+def parse_filters(symbol: str, entry: Dict[str, Any]) -> SymbolFilters:
+    filters = entry["filters"]
+    lot = filters.get("LOT_SIZE")
+    price = filters.get("PRICE_FILTER")
+    if lot is None or price is None:
+        raise KeyError(f"У {symbol} нет LOT_SIZE/PRICE_FILTER")
+    # NOTIONAL заменил MIN_NOTIONAL; на бирже встречаются оба
+    notional = filters.get("NOTIONAL")
+    if notional is not None:
+        min_notional = _float(notional.get("minNotional"))
+        max_notional = _float(notional.get("maxNotional")) or None
+        apply_min = bool(notional.get("applyMinToMarket", True))
+    else:
+        legacy = filters.get("MIN_NOTIONAL", {})
+        min_notional = _float(legacy.get("minNotional"))
+        max_notional = None
+        apply_min = bool(legacy.get("applyToMarket", True))
+    return SymbolFilters(
+        symbol=symbol,
+        step_size=_float(lot["stepSize"]),
+        min_qty=_float(lot.get("minQty")),
+        tick_size=_float(price["tickSize"]),
+        min_notional=min_notional,
+        max_notional=max_notional,
+        apply_min_to_market=apply_min,
+        base_asset=entry.get("baseAsset", ""),
+        quote_asset=entry.get("quoteAsset", ""),
+        status=entry.get("status", "TRADING"),
+        quote_precision=int(entry.get("quoteAssetPrecision", 8)),
+        quote_order_allowed=bool(entry.get("quoteOrderQtyMarketAllowed", True)),
+        quantizer=Quantizer(lot["stepSize"], price["tickSize"], int(entry.get("quoteAssetPrecision", 8))),
+    )
+
+
+class ExchangeInfoCache:
+    """Фильтры всех символов биржи: TTL, сброс по -1013, теплый старт с диска"""
+
+    def __init__(self, fetch: Callable[[], Dict[str, Any]], path: Optional[str] = None, ttl: float = 3600.0,
+                 min_refresh_interval: float = 60.0):
+        self.fetch = fetch
+        self.path = path
+        self.ttl = ttl
+        # Вес запроса 20: неизвестный символ или недоступная биржа не должны вызывать его на каждый get
+        self.min_refresh_interval = min_refresh_interval
+        self.attempted_at = 0.0        # время последней попытки refresh из get()
+        self.throttled = 0
+        self.symbols: Dict[str, Dict[str, Any]] = {}
+        self.fetched_at = 0.0          # unix время ответа биржи, по нему считается TTL
+        self.refreshes = 0
+        self.failures = 0
+        self.invalidations = 0
+        self._parsed: Dict[str, SymbolFilters] = {}
+        self.lock = threading.Lock()
+        self._loaded = False
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at if self.fetched_at else float("inf")
+
+    def stale(self) -> bool:
+        return self.age() >= self.ttl
+
+    def load(self) -> bool:
+        """Загрузить копию с диска (без сети); True - данные есть"""
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            symbols = data["symbols"]
+            fetched_at = float(data["fetched_at"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log(f"⚠️ Кэш exchangeInfo {self.path} не прочитан: {e}", "WARN")
+            return False
+        with self.lock:
+            self.symbols, self.fetched_at, self._parsed = symbols, fetched_at, {}
+        log(f"📦 exchangeInfo с диска: {len(symbols)} символов, возраст {self.age():.0f}с", "FILTERS")
+        return True
+
+    def refresh(self) -> bool:
+        """Запросить exchangeInfo у биржи; при ошибке остаются прежние данные"""
+        try:
+            info = self.fetch()
+            symbols = {s["symbol"]: index_symbol(s) for s in info["symbols"]}
+        except Exception as e:
+            self.failures += 1
+            log(f"❌ Ошибка загрузки exchangeInfo: {e}", "ERROR")
+            return False
+        fetched_at = time.time()
+        with self.lock:
+            self.symbols, self.fetched_at, self._parsed = symbols, fetched_at, {}
+            self.refreshes += 1
+        log(f"📦 exchangeInfo загружен: {len(symbols)} символов", "FILTERS")
+        if self.path:
+            try:
+                atomic_write_json(self.path, {"fetched_at": fetched_at, "symbols": symbols})
+            except OSError as e:
+                log(f"⚠️ Не удалось сохранить exchangeInfo в {self.path}: {e}", "WARN")
+        return True
+
+    def invalidate(self):
+        """Биржа отвергла ордер фильтром (-1013): перечитать при следующем обращении"""
+        with self.lock:
+            self.fetched_at = 0.0
+            self.invalidations += 1
+        log("🔄 Фильтры символов устарели (-1013), exchangeInfo будет перечитан", "FILTERS")
+
+    def get(self, symbol: str) -> SymbolFilters:
+        """Фильтры символа; KeyError - символа нет даже после обновления"""
+        if not self._loaded:
+            self.load()
+        if self.stale() or symbol not in self.symbols:
+            now = time.time()
+            if now - self.attempted_at < self.min_refresh_interval:
+                self.throttled += 1
+            else:
+                self.attempted_at = now
+                # Просроченные данные лучше, чем никаких: при ошибке запроса работаем на них
+                if not self.refresh() and self.symbols:
+                    log(f"⚠️ Используются фильтры возрастом {self.age():.0f}с", "WARN")
+        filters = self._parsed.get(symbol)
+        if filters is None:
+            entry = self.symbols.get(symbol)
+            if entry is None:
+                raise KeyError(f"Нет фильтров для символа {symbol}")
+            filters = self._parsed[symbol] = parse_filters(symbol, entry)
+        return filters
+
+    def stats(self) -> Dict[str, Any]:
+        age = self.age()
+        return {
+            "symbols": len(self.symbols),
+            "age": round(age, 1) if age != float("inf") else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "invalidations": self.invalidations,
+            "throttled": self.throttled,
+        }
+
+
+def is_filter_failure(error: Exception) -> bool:
+    return getattr(error, "code", None) == FILTER_FAILURE_CODE
@@ -0,0 +1,525 @@
+# exchange_sim.py - Локальный симулятор Binance Spot REST для бумажной торговли и нагрузочных тестов
+# Отвечает на подмножество API, которое использует бот: ping, time, exchangeInfo, klines,
+# ticker/price, depth, account, order (MARKET, LIMIT IOC). Свечи проигрываются из записанной
+# истории. С --book-level-qty ордера исполняются по синтетическому стакану вокруг цены: крупный
+# ордер проходит несколько уровней, а снятая ликвидность восстанавливается со временем.
+# Использование:
+#   python -m app.exchange_sim --data BNBUSDT-1m.npz --port 8765 --speed 60 --slippage-bps 2
+#   EXCHANGE_SIM_URL=http://127.0.0.1:8765 TEST_MODE=false python app/web_bot.py
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from decimal import ROUND_DOWN, Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from binance.client import Client
+
+from app.backtest import KlineHistory, load_klines
+from app.logger import log
+from app.market_data import INTERVAL_MS
+
+# Вес запросов как у Binance (X-MBX-USED-WEIGHT-1M)
+REQUEST_WEIGHTS = {"ping": 1, "time": 1, "exchangeInfo": 20, "klines": 2, "ticker/price": 2, "account": 20, "order": 1,
+                   "depth": 5}
+
+
+@dataclass
+class SimConfig:
+    fee: float = 0.001                  # комиссия, списывается с полученного актива
+    slippage_bps: float = 0.0           # проскальзывание рыночного ордера
+    latency_ms: float = 0.0             # задержка каждого ответа
+    latency_jitter_ms: float = 0.0
+    order_latency_ms: float = 0.0       # дополнительная задержка исполнения ордера
+    weight_limit: int = 6000            # лимит веса запросов в минуту
+    error_rate: float = 0.0             # вероятность случайного 429 на любой запрос
+    speed: float = 1.0                  # скорость времени симуляции; 0 - время двигается только advance()
+    seed: int = 0
+    step_size: str = "0.001"
+    tick_size: str = "0.01"
+    min_notional: float = 10.0
+    book_level_qty: float = 0.0         # объем уровня стакана; 0 - без стакана, цена +- slippage_bps
+    book_levels: int = 20
+    book_spread_bps: float = 2.0        # спред между лучшими bid/ask
+    book_level_bps: float = 1.0         # шаг цены между уровнями
+    book_recovery_ms: float = 5000.0    # полураспад снятой ликвидности (время симуляции)
+    balances: Dict[str, float] = field(default_factory=lambda: {"USDT": 1000.0})
+
+
+class SimError(Exception):
+    """Ошибка в формате Binance: HTTP статус + code/msg"""
+
+    def __init__(self, status: int, code: int, msg: str):
+        super().__init__(msg)
+        self.status = status
+        self.code = code
+        self.msg = msg
+
+
+# ========== Биржа ==========
+class ExchangeSimulator:
+    """Состояние биржи: история свечей, часы симуляции, балансы, исполнение ордеров"""
+
+    def __init__(self, histories: Dict[str, KlineHistory], config: Optional[SimConfig] = None, start_ms: Optional[int] = None):
+        if not histories:
+            raise ValueError("Нужна история хотя бы одного символа")
+        self.histories = histories
+        self.config = config or SimConfig()
+        self.balances = dict(self.config.balances)
+        self.rng = random.Random(self.config.seed)
+        self.lock = threading.Lock()
+        self.base_ms = {s: int(np.median(np.diff(h.open_times[:1000]))) if len(h) > 1 else 60_000
+                        for s, h in histories.items()}
+
+        first = max(int(h.open_times[0]) for h in histories.values())
+        self.start_ms = start_ms if start_ms is not None else first
+        self._wall_start = time.monotonic()
+        self._manual_ms = 0
+
+        self.book_taken: Dict[Tuple[str, str], Tuple[float, int]] = {}   # (символ, сторона) -> (снято, мс)
+        self.book_updates = 0
+        self.next_order_id = 1
+        self.orders: List[Dict] = []
+        self.requests = 0
+        self.rejected = 0
+        self._weight_window = int(time.time() // 60)
+        self.used_weight = 0
+
+    # ---------- Время ----------
+    def now_ms(self) -> int:
+        elapsed = (time.monotonic() - self._wall_start) * 1000 * self.config.speed
+        return int(self.start_ms + elapsed + self._manual_ms)
+
+    def advance(self, ms: int):
+        """Сдвинуть часы симуляции вручную (для тестов и speed=0)"""
+        with self.lock:
+            self._manual_ms += ms
+
+    # ---------- Рыночные данные ----------
+    def _history(self, symbol: str) -> KlineHistory:
+        hist = self.histories.get(symbol)
+        if hist is None:
+            raise SimError(400, -1121, "Invalid symbol.")
+        return hist
+
+    def last_price(self, symbol: str) -> float:
+        hist = self._history(symbol)
+        i = int(np.searchsorted(hist.open_times, self.now_ms(), side="right"))
+        if i == 0:
+            raise SimError(400, -1121, "No market data yet.")
+        return float(hist.closes[i - 1])
+
+    def klines(self, symbol: str, interval: str, start_time: Optional[int] = None,
+               end_time: Optional[int] = None, limit: int = 500) -> List[List]:
+        """Свечи интервала, собранные из записанной истории; последняя свеча - незакрытая"""
+        if interval not in INTERVAL_MS:
+            raise SimError(400, -1120, "Invalid interval.")
+        hist = self._history(symbol)
+        step = INTERVAL_MS[interval]
+        limit = max(1, min(int(limit), 1000))
+
+        now = self.now_ms()
+        hi = int(np.searchsorted(hist.open_times, now, side="right"))
+        if end_time is not None:
+            hi = min(hi, int(np.searchsorted(hist.open_times, end_time, side="right")))
+        if hi == 0:
+            return []
+        if start_time is not None:
+            first = -(-int(start_time) // step) * step
+        else:
+            first = int(hist.open_times[hi - 1]) // step * step - (limit - 1) * step
+        lo = int(np.searchsorted(hist.open_times, first, side="left"))
+        if lo >= hi:
+            return []
+
+        times, closes = hist.open_times[lo:hi], hist.closes[lo:hi]
+        buckets = times // step * step
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:] - 1, len(buckets) - 1]
+        highs = np.maximum.reduceat(closes, starts)
+        lows = np.minimum.reduceat(closes, starts)
+
+        rows = []
+        for s, e, h, l in zip(starts, ends, highs, lows):
+            open_time = int(buckets[s])
+            rows.append([open_time, f"{closes[s]:.8f}", f"{h:.8f}", f"{l:.8f}", f"{closes[e]:.8f}", "0",
+                         open_time + step - 1, "0", 0, "0", "0", "0"])
+        return rows[:limit] if start_time is not None else rows[-limit:]
+
+    def exchange_info(self) -> Dict:
+        cfg = self.config
+        symbols = []
+        for symbol in self.histories:
+            base = symbol[:-4] if symbol.endswith("USDT") else symbol
+            symbols.append({
+                "symbol": symbol, "status": "TRADING", "baseAsset": base, "quoteAsset": "USDT",
+                "baseAssetPrecision": 8, "quotePrecision": 8, "quoteAssetPrecision": 8,
+                "orderTypes": ["MARKET"], "quoteOrderQtyMarketAllowed": True,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "minPrice": cfg.tick_size, "maxPrice": "1000000.00", "tickSize": cfg.tick_size},
+                    {"filterType": "LOT_SIZE", "minQty": cfg.step_size, "maxQty": "9000000", "stepSize": cfg.step_size},
+                    {"filterType": "MIN_NOTIONAL", "minNotional": f"{cfg.min_notional:.8f}", "applyToMarket": True},
+                ],
+            })
+        return {
+            "timezone": "UTC", "serverTime": self.now_ms(), "symbols": symbols,
+            "rateLimits": [{"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1, "limit": cfg.weight_limit}],
+        }
+
+    # ---------- Стакан ----------
+    def _taken(self, symbol: str, side: str, now: int) -> float:
+        taken, at = self.book_taken.get((symbol, side), (0.0, now))
+        return taken * 0.5 ** (max(0, now - at) / max(self.config.book_recovery_ms, 1.0))
+
+    def book_levels(self, symbol: str, side: str) -> List[Tuple[float, float]]:
+        """Уровни стороны ("asks" / "bids") с учетом снятой ликвидности: [(цена, объем)]"""
+        cfg = self.config
+        mid = self.last_price(symbol)
+        tick = float(cfg.tick_size)
+        sign = 1 if side == "asks" else -1
+        taken = self._taken(symbol, side, self.now_ms())
+        levels = []
+        for i in range(cfg.book_levels):
+            offset = cfg.book_spread_bps / 2 + i * cfg.book_level_bps
+            raw = mid * (1 + sign * offset / 10000.0) / tick
+            price = round((int(raw) + (1 if sign > 0 and raw % 1 else 0)) * tick, 8)
+            qty = cfg.book_level_qty - taken
+            taken = max(0.0, -qty)
+            if qty > 1e-12:
+                levels.append((price, qty))
+        return levels
+
+    def depth(self, symbol: str, limit: int = 100) -> Dict:
+        limit = max(1, min(int(limit), 5000))
+        with self.lock:
+            self.book_updates += 1
+            return {
+                "lastUpdateId": self.book_updates,
+                "bids": [[f"{p:.8f}", f"{q:.8f}"] for p, q in self.book_levels(symbol, "bids")[:limit]],
+                "asks": [[f"{p:.8f}", f"{q:.8f}"] for p, q in self.book_levels(symbol, "asks")[:limit]],
+            }
+
+    def _take_book(self, symbol: str, side: str, qty: Optional[float], quote: Optional[float],
+                   limit_price: Optional[float]) -> List[Tuple[float, float]]:
+        """Исполнения по уровням стороны до qty (или на сумму quote), не хуже limit_price"""
+        fills = []
+        for price, available in self.book_levels(symbol, side):
+            if limit_price is not None and (price > limit_price if side == "asks" else price < limit_price):
+                break
+            want = qty if quote is None else quote / price
+            take = min(available, want)
+            take = float((Decimal(repr(take)) / Decimal(self.config.step_size)).to_integral_value(ROUND_DOWN)
+                         * Decimal(self.config.step_size))
+            if take <= 0:
+                break
+            fills.append((price, take))
+            if quote is None:
+                qty -= take
+            else:
+                quote -= take * price
+        return fills
+
+    def _consume(self, symbol: str, side: str, qty: float):
+        now = self.now_ms()
+        self.book_taken[(symbol, side)] = (self._taken(symbol, side, now) + qty, now)
+
+    # ---------- Аккаунт ----------
+    def account(self) -> Dict:
+        # Как и Binance, отдаем все активы торгуемых пар, включая нулевые
+        assets = dict.fromkeys(["USDT"] + [s[:-4] for s in self.histories], 0.0)
+        with self.lock:
+            assets.update(self.balances)
+        balances = [{"asset": a, "free": f"{v:.8f}", "locked": "0.00000000"} for a, v in assets.items()]
+        return {"canTrade": True, "canWithdraw": False, "canDeposit": False, "accountType": "SPOT",
+                "updateTime": self.now_ms(), "balances": balances}
+
+    def place_order(self, params: Dict[str, str]) -> Dict:
+        """Исполнить ордер MARKET или LIMIT IOC с комиссией
+
+        Без стакана рыночный ордер исполняется по последней цене с проскальзыванием,
+        со стаканом - по уровням, как на бирже.
+        """
+        symbol = params.get("symbol", "")
+        side = params.get("side", "").upper()
+        order_type = params.get("type", "").upper()
+        if order_type == "LIMIT":
+            if params.get("timeInForce", "").upper() != "IOC":
+                raise SimError(400, -1116, "Only IOC limit orders are supported by the simulator.")
+            if not params.get("price") or not params.get("quantity"):
+                raise SimError(400, -1102, "Mandatory parameter 'price' was not sent, was empty/null, or malformed.")
+        elif order_type != "MARKET":
+            raise SimError(400, -1116, "Invalid orderType.")
+        if side not in ("BUY", "SELL"):
+            raise SimError(400, -1117, "Invalid side.")
+        base = symbol[:-4]
+        step = Decimal(self.config.step_size)
+        limit_price = float(params["price"]) if order_type == "LIMIT" else None
+
+        qty_req: Optional[float] = None
+        quote_req: Optional[float] = None
+        if params.get("quantity"):
+            qty = Decimal(params["quantity"])
+            if qty.as_tuple().exponent < -8:
+                raise SimError(400, -1111, "Precision is over the maximum defined for this asset.")
+            if qty <= 0 or qty % step != 0:
+                raise SimError(400, -1013, "Filter failure: LOT_SIZE")
+            qty_req = float(qty)
+        elif params.get("quoteOrderQty") and order_type == "MARKET":
+            quote_req = float(params["quoteOrderQty"])
+        else:
+            raise SimError(400, -1102, "Mandatory parameter 'quantity' was not sent, was empty/null, or malformed.")
+
+        price = self.last_price(symbol)
+        notional = quote_req if quote_req is not None else qty_req * (limit_price or price)
+        if notional < self.config.min_notional:
+            raise SimError(400, -1013, "Filter failure: MIN_NOTIONAL")
+
+        if self.config.order_latency_ms:
+            time.sleep(self.config.order_latency_ms / 1000.0)
+
+        fee = self.config.fee
+        book_side = "asks" if side == "BUY" else "bids"
+        with self.lock:
+            if self.config.book_level_qty > 0:
+                fills = self._take_book(symbol, book_side, qty_req, quote_req, limit_price)
+            else:
+                slip = self.config.slippage_bps / 10000.0
+                fill_price = price * (1 + slip) if side == "BUY" else price * (1 - slip)
+                if quote_req is not None:
+                    qty_req = float((Decimal(repr(quote_req)) / Decimal(repr(fill_price)) / step)
+                                    .to_integral_value(ROUND_DOWN) * step)
+                crossed = limit_price is None or (fill_price <= limit_price if side == "BUY" else fill_price >= limit_price)
+                fills = [(fill_price, qty_req)] if crossed and qty_req > 0 else []
+            qty_f = sum(q for _, q in fills)
+            quote = sum(p * q for p, q in fills)
+            if order_type == "MARKET" and qty_f <= 0:
+                raise SimError(400, -1013, "Filter failure: LOT_SIZE")
+
+            if side == "BUY":
+                # LIMIT блокирует qty * price, рыночный - фактическую сумму
+                required = qty_req * limit_price if limit_price is not None else quote
+                if self.balances.get("USDT", 0.0) < required:
+                    raise SimError(400, -2010, "Account has insufficient balance for requested action.")
+                self.balances["USDT"] -= quote
+                self.balances[base] = self.balances.get(base, 0.0) + qty_f * (1 - fee)
+                commission_asset = base
+            else:
+                if self.balances.get(base, 0.0) < max(qty_req or 0.0, qty_f):
+                    raise SimError(400, -2010, "Account has insufficient balance for requested action.")
+                self.balances[base] -= qty_f
+                self.balances["USDT"] = self.balances.get("USDT", 0.0) + quote * (1 - fee)
+                commission_asset = "USDT"
+            if self.config.book_level_qty > 0 and qty_f:
+                self._consume(symbol, book_side, qty_f)
+            order_id = self.next_order_id
+            self.next_order_id += 1
+            trade_id = order_id * 1000
+
+        requested = qty_req if qty_req is not None else qty_f
+        order = {
+            "symbol": symbol, "orderId": order_id,
+            "clientOrderId": params.get("newClientOrderId") or f"sim{order_id}",
+            "transactTime": self.now_ms(), "price": f"{limit_price or 0.0:.8f}",
+            "origQty": f"{requested:.8f}", "executedQty": f"{qty_f:.8f}", "cummulativeQuoteQty": f"{quote:.8f}",
+            "status": "FILLED" if qty_f >= requested - 1e-12 and qty_f > 0 else "EXPIRED",
+            "timeInForce": "IOC" if order_type == "LIMIT" else "GTC", "type": order_type, "side": side,
+            "fills": [{"price": f"{p:.8f}", "qty": f"{q:.8f}",
+                       "commission": f"{(q if side == 'BUY' else p * q) * fee:.8f}",
+                       "commissionAsset": commission_asset, "tradeId": trade_id + i}
+                      for i, (p, q) in enumerate(fills)],
+        }
+        self.orders.append(order)
+        avg = quote / qty_f if qty_f else 0.0
+        log(f"🏦 SIM {order_type} {side} {qty_f:.6f} {base} по {avg:.4f} (рынок {price:.4f}, {order['status']})", "SIM")
+        return order
+
+    # ---------- Лимиты ----------
+    def charge(self, endpoint: str) -> int:
+        """Учесть вес запроса; бросает 429, если лимит превышен или сработала инъекция ошибки"""
+        with self.lock:
+            self.requests += 1
+            window = int(time.time() // 60)
+            if window != self._weight_window:
+                self._weight_window, self.used_weight = window, 0
+            self.used_weight += REQUEST_WEIGHTS.get(endpoint, 1)
+            injected = self.config.error_rate > 0 and self.rng.random() < self.config.error_rate
+            if self.used_weight > self.config.weight_limit or injected:
+                self.rejected += 1
+                raise SimError(429, -1003, f"Too many requests; current limit is {self.config.weight_limit} request weight per 1 MINUTE.")
+            return self.used_weight
+
+    def delay(self):
+        cfg = self.config
+        if cfg.latency_ms or cfg.latency_jitter_ms:
+            with self.lock:
+                jitter = self.rng.uniform(-cfg.latency_jitter_ms, cfg.latency_jitter_ms)
+            time.sleep(max(0.0, cfg.latency_ms + jitter) / 1000.0)
+
+    # ---------- Маршрутизация ----------
+    def handle(self, method: str, path: str, params: Dict[str, str]) -> Tuple[int, Dict[str, str], object]:
+        """Обработать запрос: (HTTP статус, заголовки, тело)"""
+        endpoint = path.split("/api/", 1)[-1].split("/", 1)[-1] if "/api/" in path else path.strip("/")
+        headers: Dict[str, str] = {"X-Sim-Time": str(self.now_ms())}
+        try:
+            self.delay()
+            headers["X-MBX-USED-WEIGHT-1M"] = str(self.charge(endpoint))
+            if endpoint == "ping":
+                body = {}
+            elif endpoint == "time":
+                body = {"serverTime": self.now_ms()}
+            elif endpoint == "exchangeInfo":
+                body = self.exchange_info()
+            elif endpoint == "klines":
+                body = self.klines(params.get("symbol", ""), params.get("interval", ""),
+                                   int(params["startTime"]) if "startTime" in params else None,
+                                   int(params["endTime"]) if "endTime" in params else None,
+                                   int(params.get("limit", 500)))
+            elif endpoint == "ticker/price":
+                body = {"symbol": params.get("symbol", ""), "price": f"{self.last_price(params.get('symbol', '')):.8f}"}
+            elif endpoint == "depth":
+                body = self.depth(params.get("symbol", ""), int(params.get("limit", 100)))
+            elif endpoint == "account":
+                body = self.account()
+            elif endpoint == "order/test" and method == "POST":
+                body = {}
+            elif endpoint == "order" and method == "POST":
+                body = self.place_order(params)
+            else:
+                raise SimError(404, -1000, f"Unsupported endpoint: {method} {path}")
+            return 200, headers, body
+        except SimError as e:
+            if e.status == 429:
+                headers["Retry-After"] = "1"
+            return e.status, headers, {"code": e.code, "msg": e.msg}
+
+
+# ========== HTTP сервер ==========
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ExchangeSim/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def _serve(self, method: str):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update({k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode()).items()})
+        status, headers, body = self.server.sim.handle(method, url.path, params)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def do_DELETE(self):
+        self._serve("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class SimServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, sim: ExchangeSimulator, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.sim = sim
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "SimServer":
+        """Запустить сервер в фоновом потоке"""
+        threading.Thread(target=self.serve_forever, daemon=True, name="exchange-sim").start()
+        return self
+
+
+class SimulatedClient(Client):
+    """python-binance Client, направленный на локальный симулятор"""
+
+    def __init__(self, base_url: str, api_key: str = "sim", api_secret: str = "sim", **kwargs):
+        # Client.__init__ форматирует API_URL через .format(); адрес без {} остается как есть
+        self.API_URL = base_url.rstrip("/") + "/api"
+        super().__init__(api_key, api_secret, **kwargs)
+
+    def _request(self, method, uri: str, signed: bool, force_params: bool = False, **kwargs):
+        try:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        finally:
+            # Часы симуляции идут с множителем speed - подстраиваем смещение после каждого ответа,
+            # чтобы KlineStore и подписи запросов жили во времени симулятора
+            response = getattr(self, "response", None)
+            if response is not None and "X-Sim-Time" in response.headers:
+                self.timestamp_offset = int(response.headers["X-Sim-Time"]) - int(time.time() * 1000)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Локальный симулятор Binance Spot REST")
+    parser.add_argument("--data", action="append", required=True,
+                        help="файл/каталог свечей; для нескольких символов - SYMBOL=путь (можно повторять)")
+    parser.add_argument("--symbol", default="BNBUSDT", help="символ для --data без SYMBOL=")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--warmup-candles", type=int, default=20000,
+                        help="сколько свечей истории уже 'прошло' на старте (нужно для прогрева MA)")
+    parser.add_argument("--speed", type=float, default=1.0, help="множитель времени симуляции")
+    parser.add_argument("--usdt", type=float, default=1000.0)
+    parser.add_argument("--fee", type=float, default=0.001)
+    parser.add_argument("--slippage-bps", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--order-latency-ms", type=float, default=0.0)
+    parser.add_argument("--weight-limit", type=int, default=6000)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля запросов, получающих 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--book-level-qty", type=float, default=0.0,
+                        help="объем уровня синтетического стакана (0 - исполнение по цене +- slippage)")
+    parser.add_argument("--book-levels", type=int, default=20)
+    parser.add_argument("--book-spread-bps", type=float, default=2.0)
+    parser.add_argument("--book-level-bps", type=float, default=1.0)
+    parser.add_argument("--book-recovery-ms", type=float, default=5000.0)
+    args = parser.parse_args(argv)
+
+    histories = {}
+    for spec in args.data:
+        symbol, path = spec.split("=", 1) if "=" in spec else (args.symbol, spec)
+        histories[symbol.upper()] = load_klines(path)
+    config = SimConfig(fee=args.fee, slippage_bps=args.slippage_bps, latency_ms=args.latency_ms,
+                       latency_jitter_ms=args.latency_jitter_ms, order_latency_ms=args.order_latency_ms,
+                       weight_limit=args.weight_limit, error_rate=args.error_rate, speed=args.speed,
+                       seed=args.seed, balances={"USDT": args.usdt}, book_level_qty=args.book_level_qty,
+                       book_levels=args.book_levels, book_spread_bps=args.book_spread_bps,
+                       book_level_bps=args.book_level_bps, book_recovery_ms=args.book_recovery_ms)
+    start_ms = max(int(h.open_times[min(args.warmup_candles, len(h) - 1)]) for h in histories.values())
+    sim = ExchangeSimulator(histories, config, start_ms)
+    server = SimServer(sim, args.host, args.port)
+    log(f"🏦 Симулятор биржи {server.url}: {', '.join(histories)}, скорость x{args.speed}", "SIM")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        log(f"🏦 Симулятор остановлен: запросов {sim.requests}, отклонено {sim.rejected}, ордеров {len(sim.orders)}", "SIM")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+# execution.py - Исполнение переключения с учетом стакана
+# Рыночный ордер на весь баланс на тонкой паре проходит стакан на много уровней. BookExecutor
+# читает глубину, ставит агрессивные лимитные IOC ордера не хуже цены, заданной бюджетом
+# проскальзывания от середины спреда на момент начала, и режет крупный объем на части: каждая
+# часть берет только ликвидность внутри бюджета, остальное ждет восстановления стакана.
+# Источник глубины - функция: REST снимок или локальный стакан из потока.
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.balances import fill_summary
+from app.logger import log
+
+Levels = List[Tuple[float, float]]
+
+
+@dataclass
+class DepthSnapshot:
+    bids: Levels                      # по убыванию цены
+    asks: Levels                      # по возрастанию цены
+    update_id: int = 0
+
+    @property
+    def mid(self) -> float:
+        if not self.bids or not self.asks:
+            return self.bids[0][0] if self.bids else (self.asks[0][0] if self.asks else 0.0)
+        return (self.bids[0][0] + self.asks[0][0]) / 2
+
+
+def parse_depth(data: Dict[str, Any]) -> DepthSnapshot:
+    """Ответ GET /api/v3/depth -> DepthSnapshot"""
+    return DepthSnapshot(
+        bids=[(float(p), float(q)) for p, q in data.get("bids", [])],
+        asks=[(float(p), float(q)) for p, q in data.get("asks", [])],
+        update_id=int(data.get("lastUpdateId", 0)),
+    )
+
+
+def available_within(levels: Levels, limit_price: float, side: str) -> float:
+    """Объем уровней не хуже limit_price (BUY берет asks, SELL - bids)"""
+    total = 0.0
+    for price, qty in levels:
+        if (price > limit_price) if side == "BUY" else (price < limit_price):
+            break
+        total += qty
+    return total
+
+
+@dataclass
+class ExecutionReport:
+    """Итог переключения: все дочерние ордера и реализованное проскальзывание"""
+    side: str
+    mode: str
+    requested: float                  # SELL - базовый актив, BUY - USDT
+    reference_price: float            # середина спреда (book) или цена сигнала (market)
+    limit_price: float = 0.0
+    filled_qty: float = 0.0
+    quote: float = 0.0
+    slices: int = 0
+    orders: List[Dict[str, Any]] = field(default_factory=list)
+    reason: str = ""
+
+    def add_order(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        fill = fill_summary(order)
+        self.orders.append(order)
+        self.filled_qty += fill["qty"]
+        self.quote += fill["quote"]
+        return fill
+
+    @property
+    def avg_price(self) -> float:
+        return self.quote / self.filled_qty if self.filled_qty > 0 else 0.0
+
+    @property
+    def slippage_bps(self) -> Optional[float]:
+        """Положительное - хуже опорной цены (дороже купили / дешевле продали)"""
+        if not self.filled_qty or not self.reference_price:
+            return None
+        sign = 1.0 if self.side == "BUY" else -1.0
+        return sign * (self.avg_price - self.reference_price) / self.reference_price * 10000.0
+
+    def summary(self) -> Dict[str, Any]:
+        slippage = self.slippage_bps
+        return {
+            "side": self.side,
+            "mode": self.mode,
+            "requested": self.requested,
+            "filled_qty": self.filled_qty,
+            "quote": round(self.quote, 8),
+            "avg_price": self.avg_price,
+            "reference_price": self.reference_price,
+            "limit_price": self.limit_price or None,
+            "slippage_bps": round(slippage, 2) if slippage is not None else None,
+            "slices": self.slices,
+            "orders": len(self.orders),
+            "reason": self.reason,
+        }
+
+
+class BookExecutor:
+    """Агрессивные лимитные IOC ордера частями в пределах бюджета проскальзывания"""
+
+    def __init__(self, client, symbol: str, filters, depth: Callable[[], DepthSnapshot],
+                 max_slippage_bps: float = 20.0, max_slices: int = 5, slice_interval: float = 1.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.client = client
+        self.symbol = symbol
+        self.filters = filters
+        self.depth = depth
+        self.max_slippage_bps = max_slippage_bps
+        self.max_slices = max(1, max_slices)
+        self.slice_interval = slice_interval
+        self.sleep = sleep
+        self.report: Optional[ExecutionReport] = None   # доступен и после исключения посреди частей
+
+    def _tradeable(self, qty, limit_price: float) -> bool:
+        return qty > 0 and qty >= self.filters.min_qty and float(qty) * limit_price >= self.filters.min_notional
+
+    def execute(self, side: str, amount: float) -> ExecutionReport:
+        """SELL: amount базового актива; BUY: amount USDT"""
+        quantizer = self.filters.quantizer
+        book = self.depth()
+        mid = book.mid
+        report = self.report = ExecutionReport(side=side, mode="book", requested=amount, reference_price=mid)
+        if mid <= 0:
+            report.reason = "пустой стакан"
+            return report
+        budget = self.max_slippage_bps / 10000.0
+        limit = quantizer.price(mid * (1 + budget)) if side == "BUY" else quantizer.price_up(mid * (1 - budget))
+        limit_price = float(limit)
+        report.limit_price = limit_price
+        remaining = amount
+        if not self._tradeable(quantizer.qty(self._wanted(side, remaining, limit_price)), limit_price):
+            report.reason = "сумма меньше минимального ордера"
+            return report
+
+        for attempt in range(self.max_slices):
+            if attempt:
+                self.sleep(self.slice_interval)
+                book = self.depth()
+            levels = book.asks if side == "BUY" else book.bids
+            wanted = self._wanted(side, remaining, limit_price)
+            qty = quantizer.qty(min(wanted, available_within(levels, limit_price, side)))
+            if not self._tradeable(qty, limit_price):
+                report.reason = "нет ликвидности в пределах бюджета"
+                log(f"⏳ {self.symbol}: в пределах {self.max_slippage_bps} bps нет объема, ждем стакан", "EXECUTION")
+                continue
+            qty_str, price_str = format(qty, "f"), format(limit, "f")
+            log(f"📤 IOC {side} {qty_str} {self.symbol} по {price_str} (часть {attempt + 1}/{self.max_slices})", "ORDER")
+            if side == "BUY":
+                order = self.client.order_limit_buy(symbol=self.symbol, quantity=qty_str, price=price_str, timeInForce="IOC")
+            else:
+                order = self.client.order_limit_sell(symbol=self.symbol, quantity=qty_str, price=price_str, timeInForce="IOC")
+            report.slices += 1
+            fill = report.add_order(order)
+            remaining = max(remaining - (fill["quote"] if side == "BUY" else fill["qty"]), 0.0)
+            if not self._tradeable(quantizer.qty(self._wanted(side, remaining, limit_price)), limit_price):
+                report.reason = "исполнено"
+                return report
+            report.reason = "исчерпан лимит частей"
+        return report
+
+    @staticmethod
+    def _wanted(side: str, remaining: float, limit_price: float) -> float:
+        # Покупка: сколько можно купить на остаток USDT по лимиту (биржа блокирует qty * price)
+        return remaining / limit_price if side == "BUY" else remaining
+
+
+def report_from_orders(side: str, orders: List[Dict[str, Any]], requested: float, reference_price: float) -> ExecutionReport:
+    """Отчет для рыночного режима: один ордер, опорная цена - цена сигнала"""
+    report = ExecutionReport(side=side, mode="market", requested=requested, reference_price=reference_price)
+    for order in orders:
+        report.add_order(order)
+        report.slices += 1
+    report.reason = "исполнено" if report.filled_qty else "не исполнено"
+    return report
@@ -0,0 +1,265 @@
+# indicators.py - Скользящие средние с O(1) обновлением на кольцевом буфере
+# SMA совпадает с sum(closes[-period:]) / period бит в бит, WMA - с точностью до округления float
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+# Через столько обновлений сумма окна пересчитывается с нуля (защита от накопления ошибки)
+DEFAULT_RECOMPUTE_EVERY = 1000
+
+
+class RollingMA(ABC):
+    """Базовый класс: кольцевой буфер последних `period` значений"""
+
+    def __init__(self, period: int, recompute_every: int = DEFAULT_RECOMPUTE_EVERY):
+        if period <= 0:
+            raise ValueError(f"Период должен быть положительным: {period}")
+        self.period = period
+        self.recompute_every = recompute_every
+        self.buffer: List[float] = [0.0] * period
+        self.pos = 0  # индекс следующей записи
+        self.count = 0
+        self._ops = 0
+
+    def window(self) -> List[float]:
+        """Значения окна от старого к новому"""
+        if self.count < self.period:
+            return self.buffer[:self.count]
+        return self.buffer[self.pos:] + self.buffer[:self.pos]
+
+    def update(self, value: float):
+        """Добавить новое закрытие (значение - через value)"""
+        if self.count < self.period:
+            old = None
+            self.count += 1
+        else:
+            old = self.buffer[self.pos]
+        self.buffer[self.pos] = value
+        self.pos = (self.pos + 1) % self.period
+        self._on_update(value, old)
+        self._tick()
+
+    def replace_last(self, value: float):
+        """Заменить последнее значение (незакрытая свеча изменилась)"""
+        if self.count == 0:
+            self.update(value)
+            return
+        last = (self.pos - 1) % self.period
+        old = self.buffer[last]
+        self.buffer[last] = value
+        self._on_replace(value, old)
+        self._tick()
+
+    def reset(self, values: Optional[List[float]] = None):
+        self.buffer = [0.0] * self.period
+        self.pos = 0
+        self.count = 0
+        self._ops = 0
+        self._on_reset()
+        for v in values or ():
+            self.update(v)
+
+    def _tick(self):
+        self._ops += 1
+        if self._ops >= self.recompute_every:
+            self._ops = 0
+            self.recompute()
+
+    @property
+    @abstractmethod
+    def value(self) -> Optional[float]:
+        """Текущее значение средней; None, пока окно не заполнено"""
+
+    @abstractmethod
+    def recompute(self):
+        """Пересчитать суммы окна с нуля"""
+
+    @abstractmethod
+    def _on_update(self, value: float, old: Optional[float]):
+        """Учесть новое значение и вытесненное (None, пока окно не заполнено)"""
+
+    @abstractmethod
+    def _on_replace(self, value: float, old: float):
+        """Учесть замену последнего значения"""
+
+    @abstractmethod
+    def _on_reset(self):
+        """Обнулить суммы окна"""
+
+
+class SMA(RollingMA):
+    """Простая скользящая средняя, бит в бит sum(arr[-period:]) / period
+
+    Бегущая сумма float расходится с последовательным sum() окна в последнем бите, а
+    сравнение ma_short > ma_long на ровном рынке чувствительно к одному ulp. Поэтому
+    update/replace_last только пишут в кольцевой буфер, а сумма окна считается при
+    чтении value - один раз на изменение.
+    """
+
+    def __init__(self, period: int, recompute_every: int = DEFAULT_RECOMPUTE_EVERY):
+        super().__init__(period, recompute_every)
+        self._on_reset()
+
+    def _on_reset(self):
+        self._value: Optional[float] = None
+
+    def _on_update(self, value: float, old: Optional[float]):
+        self._value = None
+
+    def _on_replace(self, value: float, old: float):
+        self._value = None
+
+    def recompute(self):
+        # Сумма не накапливается - копить ошибку нечему
+        pass
+
+    @property
+    def value(self) -> Optional[float]:
+        if self.count < self.period:
+            return None
+        if self._value is None:
+            self._value = sum(self.window()) / self.period
+        return self._value
+
+
+class WMA(RollingMA):
+    """Взвешенная скользящая средняя: веса 1..period от старого к новому"""
+
+    def __init__(self, period: int, recompute_every: int = DEFAULT_RECOMPUTE_EVERY):
+        super().__init__(period, recompute_every)
+        self.denominator = period * (period + 1) / 2
+        self._on_reset()
+
+    def _on_reset(self):
+        self.total = 0.0
+        self.weighted = 0.0
+
+    def _on_update(self, value: float, old: Optional[float]):
+        if old is None:
+            self.weighted += self.count * value
+            self.total += value
+        else:
+            # Сдвиг всех весов на 1 вниз: самый старый (вес 1) выпадает из окна
+            self.weighted += self.period * value - self.total
+            self.total += value - old
+
+    def _on_replace(self, value: float, old: float):
+        self.weighted += self.count * (value - old)
+        self.total += value - old
+
+    def recompute(self):
+        window = self.window()
+        self.total = math.fsum(window)
+        self.weighted = math.fsum((i + 1) * v for i, v in enumerate(window))
+
+    @property
+    def value(self) -> Optional[float]:
+        if self.count < self.period:
+            return None
+        return self.weighted / self.denominator
+
+
+class EMA(RollingMA):
+    """Экспоненциальная скользящая средняя, начальное значение - SMA первых `period` закрытий"""
+
+    def __init__(self, period: int, recompute_every: int = DEFAULT_RECOMPUTE_EVERY):
+        super().__init__(period, recompute_every)
+        self.alpha = 2.0 / (period + 1)
+        self._on_reset()
+
+    def _on_reset(self):
+        self.ema: Optional[float] = None
+        self.prev_ema: Optional[float] = None
+        self.seen = 0
+
+    def _step(self, base: Optional[float], value: float) -> Optional[float]:
+        if self.seen < self.period:
+            return None
+        if self.seen == self.period:
+            return sum(self.window()) / self.period
+        return self.alpha * value + (1 - self.alpha) * base
+
+    def _on_update(self, value: float, old: Optional[float]):
+        self.seen += 1
+        self.prev_ema = self.ema
+        self.ema = self._step(self.prev_ema, value)
+
+    def _on_replace(self, value: float, old: float):
+        self.ema = self._step(self.prev_ema, value)
+
+    def recompute(self):
+        # EMA рекуррентна и не накапливает ошибку суммы - пересчитывать нечего
+        pass
+
+    @property
+    def value(self) -> Optional[float]:
+        return self.ema
+
+
+MA_TYPES = {"sma": SMA, "ema": EMA, "wma": WMA}
+
+
+class MovingAverageEngine:
+    """Пара коротких/длинных MA, синхронизируемая с KlineStore
+
+    sync() обрабатывает только свечи, появившиеся с прошлого вызова:
+    обновление незакрытой свечи - replace_last(), новая свеча - update().
+    """
+
+    def __init__(self, short_period: int, long_period: int, kind: str = "sma"):
+        if kind not in MA_TYPES:
+            raise ValueError(f"Неизвестный тип MA: {kind}")
+        self.kind = kind
+        self.short = MA_TYPES[kind](short_period)
+        self.long = MA_TYPES[kind](long_period)
+        self.last_open_time: Optional[int] = None
+        self.store = None
+
+    def reset(self, closes: List[float]):
+        self.short.reset(closes)
+        self.long.reset(closes)
+
+    def sync(self, store) -> Tuple[Optional[float], Optional[float]]:
+        if store is not self.store or self.last_open_time is None:
+            self._rebuild(store)
+            return self.values()
+
+        tail = store.tail_since(self.last_open_time)
+        if not tail or tail[0][0] != self.last_open_time:
+            # Кэш был перезагружен - старой свечи в нем больше нет
+            self._rebuild(store)
+            return self.values()
+
+        self.short.replace_last(tail[0][1])
+        self.long.replace_last(tail[0][1])
+        for _, close in tail[1:]:
+            self.short.update(close)
+            self.long.update(close)
+        self.last_open_time = tail[-1][0]
+        return self.values()
+
+    def _rebuild(self, store):
+        # Полный прогрев на всем кэше (EMA зависит от всей истории)
+        self.store = store
+        open_time, closes = store.snapshot()
+        self.reset(closes)
+        self.last_open_time = open_time
+
+    def values(self) -> Tuple[Optional[float], Optional[float]]:
+        return self.short.value, self.long.value
+
+
+_engines: Dict[Tuple, MovingAverageEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_ma_engine(symbol: str, interval: str, short_period: int, long_period: int, kind: str = "sma") -> MovingAverageEngine:
+    """Получить (или создать) движок MA для пары и набора параметров"""
+    key = (symbol, interval, short_period, long_period, kind)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = MovingAverageEngine(short_period, long_period, kind)
+            _engines[key] = engine
+        return engine
@@ -0,0 +1,182 @@
+# journal.py - Журнал сигналов, ордеров, исполнений и изменений балансов (SQLite)
+# Торговый поток только кладет событие в очередь; отдельный поток пишет их пачками
+# в одной транзакции. WAL позволяет читать журнал из Flask во время записи, а выборки
+# идут по индексам (symbol, id) / (kind, id) с keyset пагинацией - скорость страницы
+# не зависит от размера таблицы.
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.logger import log
+
+EVENT_KINDS = ("signal", "order", "fill", "execution", "balance")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,            -- мс UTC
+    kind TEXT NOT NULL,             -- signal | order | fill | execution | balance
+    symbol TEXT NOT NULL,
+    interval TEXT,
+    side TEXT,
+    price REAL,
+    qty REAL,
+    quote_qty REAL,
+    ma_short REAL,
+    ma_long REAL,
+    decision TEXT,
+    order_id TEXT,
+    data TEXT                       -- остальные поля события (JSON)
+);
+CREATE INDEX IF NOT EXISTS events_symbol_id ON events(symbol, id);
+CREATE INDEX IF NOT EXISTS events_kind_id ON events(kind, id);
+CREATE INDEX IF NOT EXISTS events_ts ON events(ts);
+"""
+
+COLUMNS = ("ts", "kind", "symbol", "interval", "side", "price", "qty", "quote_qty",
+           "ma_short", "ma_long", "decision", "order_id")
+
+# Максимум строк на страницу /journal
+MAX_PAGE = 1000
+
+
+class TradeJournal:
+    """Append-only журнал с фоновой пакетной записью"""
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+        log(f"📒 Журнал сделок: {path} (WAL, пакетная запись)", "JOURNAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL режиме NORMAL не теряет целостность, а fsync идет на checkpoint, не на каждую пачку
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """Соединение для чтения - свое в каждом потоке Flask"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # ---------- Запись ----------
+    def record(self, kind: str, symbol: str, **fields):
+        """Поставить событие в очередь (не блокирует торговый поток)"""
+        row = {c: fields.pop(c, None) for c in COLUMNS[3:]}
+        row.update({"ts": fields.pop("ts", None) or int(time.time() * 1000), "kind": kind, "symbol": symbol})
+        values = tuple(row[c] for c in COLUMNS)
+        self.queue.put(values + (json.dumps(fields, ensure_ascii=False, default=str) if fields else None,))
+
+    def record_order(self, symbol: str, order: Dict[str, Any], **fields):
+        """Ордер и все его исполнения (ответ newOrderRespType=FULL)"""
+        executed = float(order.get("executedQty", 0) or 0)
+        quote = float(order.get("cummulativeQuoteQty", 0) or 0)
+        self.record("order", symbol, ts=order.get("transactTime"), side=order.get("side"),
+                    price=quote / executed if executed else None, qty=executed, quote_qty=quote,
+                    order_id=str(order.get("orderId", "")), status=order.get("status"),
+                    type=order.get("type"), **fields)
+        for fill in order.get("fills", []) or []:
+            price, qty = float(fill["price"]), float(fill["qty"])
+            self.record("fill", symbol, ts=order.get("transactTime"), side=order.get("side"),
+                        price=price, qty=qty, quote_qty=price * qty, order_id=str(order.get("orderId", "")),
+                        commission=fill.get("commission"), commission_asset=fill.get("commissionAsset"),
+                        trade_id=fill.get("tradeId"))
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                with conn:
+                    conn.executemany(
+                        f"INSERT INTO events ({', '.join(COLUMNS)}, data) VALUES ({', '.join('?' * (len(COLUMNS) + 1))})",
+                        batch,
+                    )
+                self.written += len(batch)
+                self.batches += 1
+            except sqlite3.Error as e:
+                self.dropped += len(batch)
+                log(f"📒 Не удалось записать {len(batch)} событий журнала: {e}", "ERROR")
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                break
+        conn.close()
+
+    def flush(self):
+        """Дождаться записи всех событий из очереди"""
+        self.queue.join()
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join(timeout=10)
+
+    # ---------- Чтение ----------
+    def query(self, symbol: Optional[str] = None, kind: Optional[str] = None,
+              before_id: Optional[int] = None, since_ts: Optional[int] = None,
+              limit: int = 100) -> Dict[str, Any]:
+        """Страница событий от новых к старым; next_before - курсор следующей страницы"""
+        limit = max(1, min(int(limit), MAX_PAGE))
+        where, params = [], []
+        for column, value in (("symbol", symbol), ("kind", kind)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if before_id is not None:
+            where.append("id < ?")
+            params.append(int(before_id))
+        if since_ts is not None:
+            where.append("ts >= ?")
+            params.append(int(since_ts))
+        sql = "SELECT * FROM events"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        rows = self._reader().execute(sql, params + [limit]).fetchall()
+        events: List[Dict[str, Any]] = []
+        for row in rows:
+            event = {k: row[k] for k in row.keys() if k != "data" and row[k] is not None}
+            if row["data"]:
+                event.update(json.loads(row["data"]))
+            events.append(event)
+        return {
+            "events": events,
+            "next_before": events[-1]["id"] if len(events) == limit else None,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {"written": self.written, "batches": self.batches, "pending": self.queue.qsize(),
+                "dropped": self.dropped}
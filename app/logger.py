@@ -0,0 +1,152 @@
+# logger.py - Утилиты логирования, общие для всех модулей бота
+# Второй аргумент log() - тег компонента (CONFIG, SAFETY, TRADE, DEBUG...). У тега есть
+# уровень важности; порог проверяется до какой-либо работы со строкой, поэтому отключенные
+# сообщения почти бесплатны. Форматирование (время, JSON) и запись в stdout выполняет
+# фоновый поток пачками: торговый цикл не ждет системных вызовов вывода.
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "WARNING": 30, "ERROR": 40, "OFF": 100}
+
+# Уровень тегов; все остальные теги - INFO
+TAG_LEVELS = {"DEBUG": 10, "WARN": 30, "WARNING": 30, "ERROR": 40}
+
+# Сколько строк максимум писать одним вызовом write()
+WRITE_BATCH = 512
+
+_threshold = LEVELS["INFO"]
+_component_thresholds: Dict[str, int] = {}
+_json_format = False
+_enabled: Dict[str, bool] = {}   # кэш решения по тегу, сбрасывается в configure()
+_writer: Optional["LogWriter"] = None
+
+
+def parse_level(value: str) -> int:
+    value = value.strip().upper()
+    if value not in LEVELS:
+        raise ValueError(f"Неизвестный уровень логов: {value} (допустимо: {', '.join(LEVELS)})")
+    return LEVELS[value]
+
+
+def parse_components(spec: str) -> Dict[str, int]:
+    """"CONFIG=WARN,DEBUG=OFF" -> {"CONFIG": 30, "DEBUG": 100}"""
+    result = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        tag, _, level = item.partition("=")
+        result[tag.strip().upper()] = parse_level(level or "INFO")
+    return result
+
+
+def enabled(tag: str) -> bool:
+    """Будет ли напечатано сообщение с этим тегом (для защиты дорогих DEBUG строк)"""
+    decision = _enabled.get(tag)
+    if decision is None:
+        decision = _enabled[tag] = TAG_LEVELS.get(tag, 20) >= _component_thresholds.get(tag, _threshold)
+    return decision
+
+
+def format_record(created: float, tag: str, msg: str) -> str:
+    if _json_format:
+        return json.dumps({
+            "ts": datetime.fromtimestamp(created).astimezone().isoformat(timespec="milliseconds"),
+            "level": next((name for name, value in LEVELS.items() if value == TAG_LEVELS.get(tag, 20)), "INFO"),
+            "tag": tag,
+            "msg": msg,
+        }, ensure_ascii=False)
+    ts = datetime.fromtimestamp(created).astimezone().strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{ts}] [{tag}] {msg}"
+
+
+class LogWriter:
+    """Фоновый поток: забирает записи из очереди и пишет их в stdout пачками"""
+
+    def __init__(self):
+        self.queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.written = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        self.queue.put(record)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            lines = [format_record(*record) for record in batch if record is not None]
+            if lines:
+                try:
+                    sys.stdout.write("\n".join(lines) + "\n")
+                    sys.stdout.flush()
+                except (OSError, ValueError):
+                    pass
+                self.written += len(lines)
+                self.batches += 1
+            if stop:
+                return
+
+    def close(self, timeout: float = 2.0):
+        self.queue.put(None)
+        self._thread.join(timeout)
+
+
+def configure(level: Optional[str] = None, components: Optional[str] = None,
+              fmt: Optional[str] = None, async_write: Optional[bool] = None):
+    """Настроить вывод; None - оставить текущее значение. Ошибка разбора не меняет ничего"""
+    global _threshold, _component_thresholds, _json_format, _writer
+    threshold = parse_level(level) if level is not None else _threshold
+    thresholds = parse_components(components) if components is not None else _component_thresholds
+    _threshold, _component_thresholds = threshold, thresholds
+    if fmt is not None:
+        _json_format = fmt.strip().lower() == "json"
+    if async_write is not None:
+        if async_write and _writer is None:
+            _writer = LogWriter()
+        elif not async_write and _writer is not None:
+            writer, _writer = _writer, None
+            writer.close()
+    _enabled.clear()
+
+
+def log(msg: str, level: str = "INFO"):
+    if not enabled(level):
+        return
+    record = (time.time(), level, msg)
+    writer = _writer
+    if writer is not None:
+        writer.put(record)
+    else:
+        print(format_record(*record), flush=True)
+
+
+def flush():
+    """Дописать очередь (при остановке процесса)"""
+    if _writer is not None:
+        configure(async_write=False)
+
+
+def stats() -> Dict[str, int]:
+    return {"written": _writer.written, "batches": _writer.batches} if _writer else {}
+
+
+# Начальные настройки из окружения; web_bot перенастраивает после загрузки .env
+try:
+    configure(level=os.getenv("LOG_LEVEL", "INFO"), components=os.getenv("LOG_COMPONENTS", ""))
+except ValueError as e:
+    print(f"[logger] {e} - используется LOG_LEVEL=INFO", file=sys.stderr, flush=True)
+    configure(level="INFO", components="")
+configure(fmt=os.getenv("LOG_FORMAT", "text"), async_write=os.getenv("LOG_ASYNC", "true").strip().lower() == "true")
+atexit.register(flush)
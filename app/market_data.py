@@ -0,0 +1,172 @@
+# market_data.py - Локальный кэш свечей с инкрементальной догрузкой
+# История загружается один раз, дальше запрашиваются только новые свечи (startTime)
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from app.logger import log
+
+# Длительность интервалов Binance в миллисекундах
+INTERVAL_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 60 * 60_000,
+    "2h": 2 * 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "6h": 6 * 60 * 60_000,
+    "8h": 8 * 60 * 60_000,
+    "12h": 12 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+}
+
+# Максимальный limit одного запроса /api/v3/klines
+MAX_KLINES_PER_REQUEST = 1000
+
+
+def interval_to_ms(interval: str) -> int:
+    """Длительность интервала свечи в миллисекундах"""
+    if interval not in INTERVAL_MS:
+        raise ValueError(f"Неизвестный интервал свечей: {interval}")
+    return INTERVAL_MS[interval]
+
+
+class KlineStore:
+    """Кэш свечей для одной пары (symbol, interval)
+
+    Хранит время открытия и цену закрытия последних `capacity` свечей.
+    Первый refresh() загружает историю целиком, последующие запрашивают
+    только свечи начиная с последней сохраненной (она могла еще не закрыться).
+    """
+
+    def __init__(self, client, symbol: str, interval: str, capacity: int = 500):
+        self.client = client
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = interval_to_ms(interval)
+        self.capacity = capacity
+        self.open_times: deque = deque(maxlen=capacity)
+        self.closes: deque = deque(maxlen=capacity)
+        self.loaded = False
+        self.last_refresh = 0.0
+        self.last_stream_update = 0.0
+        self.lock = threading.Lock()
+
+    def refresh(self) -> int:
+        """Обновить кэш, вернуть количество полученных с биржи свечей"""
+        with self.lock:
+            last_open = self.open_times[-1] if self.open_times else None
+        if not self.loaded or last_open is None:
+            # Первая загрузка вернула пустой ответ - догружать не от чего, повторяем полную
+            return self.load_history()
+
+        now_ms = int(time.time() * 1000) + getattr(self.client, "timestamp_offset", 0)
+        expected = (now_ms - last_open) // self.interval_ms + 2
+        if expected > MAX_KLINES_PER_REQUEST:
+            # Кэш слишком устарел (например, после долгой остановки) - проще перезагрузить
+            log(f"Кэш свечей {self.symbol} {self.interval} устарел на {expected} свечей, перезагрузка", "DATA")
+            return self.load_history()
+
+        klines = self.client.get_klines(
+            symbol=self.symbol, interval=self.interval, startTime=last_open, limit=int(expected)
+        )
+        self.apply_klines(klines)
+        return len(klines)
+
+    def load_history(self) -> int:
+        """Полная загрузка последних `capacity` свечей"""
+        klines = self.client.get_klines(
+            symbol=self.symbol, interval=self.interval, limit=min(self.capacity, MAX_KLINES_PER_REQUEST)
+        )
+        with self.lock:
+            self.open_times.clear()
+            self.closes.clear()
+        self.apply_klines(klines)
+        self.loaded = True
+        log(f"📥 История свечей {self.symbol} {self.interval} загружена: {len(klines)} шт.", "DATA")
+        return len(klines)
+
+    def apply_klines(self, klines: List[list]):
+        """Слить свечи в формате /api/v3/klines с кэшем (по времени открытия)"""
+        if not klines:
+            return
+        with self.lock:
+            first_open = int(klines[0][0])
+            # Незакрытая свеча (и все после нее) заменяется свежими данными
+            while self.open_times and self.open_times[-1] >= first_open:
+                self.open_times.pop()
+                self.closes.pop()
+            for k in klines:
+                self.open_times.append(int(k[0]))
+                self.closes.append(float(k[4]))
+            self.last_refresh = time.time()
+
+    def apply_stream_kline(self, open_time: int, close: float) -> bool:
+        """Применить свечу из WebSocket потока
+
+        Возвращает False, если кэш не загружен или между сохраненной и
+        пришедшей свечой есть пропуск - тогда нужна догрузка через REST.
+        """
+        with self.lock:
+            if not self.loaded or not self.open_times:
+                return False
+            last_open = self.open_times[-1]
+            if open_time == last_open:
+                self.closes[-1] = close
+            elif open_time == last_open + self.interval_ms:
+                self.open_times.append(open_time)
+                self.closes.append(close)
+            elif open_time > last_open:
+                return False
+            # Более старые свечи (повтор после переподключения) игнорируем
+            self.last_stream_update = time.time()
+            return True
+
+    def tail_since(self, open_time: int) -> List[Tuple[int, float]]:
+        """Свечи (open_time, close) начиная с `open_time` включительно, от старых к новым"""
+        with self.lock:
+            tail = []
+            for i in range(len(self.open_times) - 1, -1, -1):
+                t = self.open_times[i]
+                if t < open_time:
+                    break
+                tail.append((t, self.closes[i]))
+            tail.reverse()
+            return tail
+
+    def snapshot(self) -> Tuple[Optional[int], List[float]]:
+        """Время открытия последней свечи и все цены закрытия из кэша"""
+        with self.lock:
+            last_open = self.open_times[-1] if self.open_times else None
+            return last_open, list(self.closes)
+
+    def last_close(self) -> Optional[float]:
+        with self.lock:
+            return self.closes[-1] if self.closes else None
+
+    def get_closes(self, limit: int) -> List[float]:
+        """Последние `limit` цен закрытия (последняя - текущая незакрытая свеча)"""
+        with self.lock:
+            n = len(self.closes)
+            if limit >= n:
+                return list(self.closes)
+            return list(islice(self.closes, n - limit, n))
+
+
+_stores: Dict[Tuple[str, str], KlineStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_kline_store(client, symbol: str, interval: str, capacity: int) -> KlineStore:
+    """Получить (или создать) кэш свечей для пары (symbol, interval)"""
+    key = (symbol, interval)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None or store.client is not client or store.capacity < capacity:
+            store = KlineStore(client, symbol, interval, capacity)
+            _stores[key] = store
+        return store
@@ -0,0 +1,178 @@
+# order_book.py - Локальный L2 стакан символа из REST снимка и потока <symbol>@depth@100ms
+# Синхронизация по правилам Binance: события буферизуются, берется снимок, события с
+# u <= lastUpdateId отбрасываются, первое применяемое должно покрывать lastUpdateId + 1, а
+# каждое следующее начинаться с u предыдущего + 1. Разрыв последовательности - стакан
+# помечается несинхронизированным и перечитывается снимком.
+# Стороны хранятся как отсортированные array('d') цен и объемов: лучшая цена - элемент 0,
+# поиск уровня - bisect, поэтому запросы (лучшие цены, спред, объем до цены) - микросекунды.
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from app.execution import DepthSnapshot
+
+# Результаты apply_diff
+APPLIED = "applied"
+STALE = "stale"        # событие старше снимка, отброшено
+GAP = "gap"            # пропуск в последовательности, нужен новый снимок
+UNSYNCED = "unsynced"  # снимка еще нет
+
+
+class BookSide:
+    """Уровни одной стороны; у bids ключ - цена со знаком минус, чтобы лучшая была первой"""
+    __slots__ = ("sign", "keys", "qtys")
+
+    def __init__(self, descending: bool):
+        self.sign = -1.0 if descending else 1.0
+        self.keys = array("d")
+        self.qtys = array("d")
+
+    def load(self, levels: List[Tuple[float, float]]):
+        pairs = sorted((self.sign * p, q) for p, q in levels if q > 0)
+        self.keys = array("d", (k for k, _ in pairs))
+        self.qtys = array("d", (q for _, q in pairs))
+
+    def set(self, price: float, qty: float):
+        """Новый объем уровня; 0 - уровень удален"""
+        key = self.sign * price
+        keys = self.keys
+        i = bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            if qty > 0:
+                self.qtys[i] = qty
+            else:
+                del keys[i]
+                del self.qtys[i]
+        elif qty > 0:
+            keys.insert(i, key)
+            self.qtys.insert(i, qty)
+
+    def best(self) -> Optional[Tuple[float, float]]:
+        return (self.sign * self.keys[0], self.qtys[0]) if self.keys else None
+
+    def levels(self, limit: int) -> List[Tuple[float, float]]:
+        return [(self.sign * k, q) for k, q in zip(self.keys[:limit], self.qtys[:limit])]
+
+    def volume_to(self, price: float) -> Tuple[float, float]:
+        """(объем, сумма в котировке) уровней не хуже price"""
+        n = bisect_right(self.keys, self.sign * price)
+        qty = quote = 0.0
+        sign = self.sign
+        for k, q in zip(self.keys[:n], self.qtys[:n]):
+            qty += q
+            quote += sign * k * q
+        return qty, quote
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class LocalOrderBook:
+    """L2 стакан символа; писатель - поток WebSocket, читатели - торговый цикл и Flask"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol.upper()
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.last_update_id = 0
+        self.synced = False
+        self.have_snapshot = False
+        self.updated = 0.0
+        self.updates = 0
+        self.snapshots = 0
+        self.gaps = 0
+        self.lock = threading.Lock()
+
+    # ---------- Синхронизация ----------
+    def apply_snapshot(self, data: Dict):
+        """Ответ GET /api/v3/depth; дальше принимаются только продолжающие его события"""
+        with self.lock:
+            self.bids.load([(float(p), float(q)) for p, q in data.get("bids", [])])
+            self.asks.load([(float(p), float(q)) for p, q in data.get("asks", [])])
+            self.last_update_id = int(data["lastUpdateId"])
+            self.synced = False     # станет True на первом событии, покрывающем снимок
+            self.snapshots += 1
+            self.updated = time.time()
+            self.have_snapshot = True
+
+    def invalidate(self):
+        """Переподключение потока: события могли потеряться, нужен новый снимок"""
+        with self.lock:
+            self.synced = False
+            self.have_snapshot = False
+
+    def apply_diff(self, event: Dict) -> str:
+        """Событие depthUpdate (поля U, u, b, a); возвращает APPLIED / STALE / GAP / UNSYNCED"""
+        first, last = int(event["U"]), int(event["u"])
+        with self.lock:
+            if not self.have_snapshot:
+                return UNSYNCED
+            if last <= self.last_update_id:
+                return STALE
+            expected = self.last_update_id + 1
+            if (first != expected) if self.synced else (first > expected):
+                self.synced = False
+                self.have_snapshot = False
+                self.gaps += 1
+                return GAP
+            for p, q in event.get("b", []):
+                self.bids.set(float(p), float(q))
+            for p, q in event.get("a", []):
+                self.asks.set(float(p), float(q))
+            self.last_update_id = last
+            self.synced = True
+            self.updates += 1
+            self.updated = time.time()
+            return APPLIED
+
+    # ---------- Запросы ----------
+    def best_bid(self) -> Optional[Tuple[float, float]]:
+        with self.lock:
+            return self.bids.best()
+
+    def best_ask(self) -> Optional[Tuple[float, float]]:
+        with self.lock:
+            return self.asks.best()
+
+    def mid(self) -> Optional[float]:
+        with self.lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        return (bid[0] + ask[0]) / 2 if bid and ask else None
+
+    def spread_bps(self) -> Optional[float]:
+        with self.lock:
+            bid, ask = self.bids.best(), self.asks.best()
+        if not bid or not ask:
+            return None
+        mid = (bid[0] + ask[0]) / 2
+        return (ask[0] - bid[0]) / mid * 10000.0
+
+    def depth_to_price(self, side: str, price: float) -> Tuple[float, float]:
+        """Объем и сумма, доступные покупке (asks до price) или продаже (bids от price)"""
+        with self.lock:
+            return (self.asks if side == "BUY" else self.bids).volume_to(price)
+
+    def is_fresh(self, max_age: float) -> bool:
+        return self.synced and time.time() - self.updated <= max_age
+
+    def snapshot(self, limit: int = 100) -> DepthSnapshot:
+        """Копия верхних уровней для исполнения (тот же формат, что REST снимок)"""
+        with self.lock:
+            return DepthSnapshot(bids=self.bids.levels(limit), asks=self.asks.levels(limit),
+                                 update_id=self.last_update_id)
+
+    def stats(self) -> Dict:
+        spread = self.spread_bps()
+        return {
+            "synced": self.synced,
+            "last_update_id": self.last_update_id,
+            "bids": len(self.bids),
+            "asks": len(self.asks),
+            "spread_bps": round(spread, 3) if spread is not None else None,
+            "age": round(time.time() - self.updated, 3) if self.updated else None,
+            "updates": self.updates,
+            "snapshots": self.snapshots,
+            "gaps": self.gaps,
+        }
@@ -0,0 +1,116 @@
+# order_tracker.py - Состояние ордеров по событиям executionReport user data stream
+# Ордер отправляется с newOrderRespType=ACK: ответ приходит сразу после приема биржей, а
+# исполнение подтверждается событием потока. Торговый поток ждет конечного статуса в wait(),
+# поток WebSocket будит его через Condition. Собранный ордер имеет форму ответа FULL
+# (executedQty, cummulativeQuoteQty, fills), поэтому fill_summary и журнал работают без изменений.
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.logger import log
+
+TERMINAL_STATUSES = ("FILLED", "CANCELED", "EXPIRED", "REJECTED", "EXPIRED_IN_MATCH")
+
+
+@dataclass
+class TrackedOrder:
+    order_id: int
+    client_order_id: str
+    symbol: str
+    side: str
+    type: str
+    status: str = "NEW"
+    executed_qty: str = "0"
+    quote_qty: str = "0"
+    fills: List[Dict[str, str]] = field(default_factory=list)
+    transact_time: int = 0
+    updated: float = 0.0
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_order(self) -> Dict[str, Any]:
+        """Ордер в форме ответа POST /api/v3/order с newOrderRespType=FULL"""
+        return {
+            "symbol": self.symbol,
+            "orderId": self.order_id,
+            "clientOrderId": self.client_order_id,
+            "transactTime": self.transact_time,
+            "status": self.status,
+            "type": self.type,
+            "side": self.side,
+            "executedQty": self.executed_qty,
+            "cummulativeQuoteQty": self.quote_qty,
+            "fills": list(self.fills),
+        }
+
+
+class OrderTracker:
+    """Ордера аккаунта по событиям executionReport; последние `max_orders` в памяти"""
+
+    def __init__(self, max_orders: int = 256):
+        self.max_orders = max_orders
+        self.orders: "OrderedDict[int, TrackedOrder]" = OrderedDict()
+        self.cond = threading.Condition()
+        self.events = 0
+        self.confirmed = 0
+        self.timeouts = 0
+
+    def apply_execution_report(self, event: Dict) -> TrackedOrder:
+        """executionReport: статус и накопленное исполнение; x=TRADE добавляет fill"""
+        with self.cond:
+            order_id = int(event["i"])
+            order = self.orders.get(order_id)
+            if order is None:
+                order = self.orders[order_id] = TrackedOrder(
+                    order_id=order_id, client_order_id=event.get("c", ""), symbol=event["s"],
+                    side=event["S"], type=event.get("o", ""))
+                self._evict()
+            if event.get("x") == "TRADE":
+                order.fills.append({"price": event["L"], "qty": event["l"],
+                                    "commission": event.get("n") or "0", "commissionAsset": event.get("N") or ""})
+            order.status = event["X"]
+            order.executed_qty = event.get("z", order.executed_qty)
+            order.quote_qty = event.get("Z", order.quote_qty)
+            order.transact_time = int(event.get("T") or order.transact_time)
+            order.updated = time.time()
+            self.events += 1
+            self.cond.notify_all()
+        return order
+
+    def _evict(self):
+        # Старые завершенные ордера вытесняются первыми; открытые держим, пока их не больше лимита
+        while len(self.orders) > self.max_orders:
+            victim = next((oid for oid, o in self.orders.items() if o.terminal), next(iter(self.orders)))
+            del self.orders[victim]
+
+    def get(self, order_id: int) -> Optional[TrackedOrder]:
+        with self.cond:
+            return self.orders.get(int(order_id))
+
+    def wait(self, order_id: int, timeout: float) -> Optional[TrackedOrder]:
+        """Ждать конечного статуса ордера; None - событие не пришло за timeout секунд"""
+        order_id = int(order_id)
+        with self.cond:
+            done = self.cond.wait_for(
+                lambda: order_id in self.orders and self.orders[order_id].terminal, timeout)
+            if not done:
+                self.timeouts += 1
+                log(f"⏱️ Нет executionReport для ордера {order_id} за {timeout}с", "WARN")
+                return None
+            self.confirmed += 1
+            return self.orders[order_id]
+
+    def stats(self) -> Dict:
+        with self.cond:
+            open_orders = sum(1 for o in self.orders.values() if not o.terminal)
+            return {
+                "tracked": len(self.orders),
+                "open": open_orders,
+                "events": self.events,
+                "confirmed": self.confirmed,
+                "timeouts": self.timeouts,
+            }
@@ -0,0 +1,97 @@
+# persistence.py - Сохранение состояния бота на диск
+# Файл переписывается только при реальном изменении состояния (переключение актива, смена
+# статуса), а не каждый цикл. Запись атомарная: временный файл + fsync + os.replace, поэтому
+# падение процесса посреди записи оставляет на диске прежнюю целую версию.
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from app.logger import log
+
+# Поля, которые меняются каждый цикл и восстанавливаются из рынка/аккаунта сами
+VOLATILE_FIELDS = frozenset({
+    "last_update", "uptime", "current_price", "ma_short", "ma_long", "balance_usdt", "balance_base",
+})
+
+
+def durable_fields(status: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in status.items() if k not in VOLATILE_FIELDS}
+
+
+def atomic_write_json(path: str, data: Dict[str, Any]):
+    """Записать JSON во временный файл рядом и атомарно подменить им path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".state-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"), default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    # Переименование переживет сбой питания только после fsync каталога
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class StateStore:
+    """Состояние одной стратегии в JSON файле, запись только при изменении"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._written: Optional[str] = None   # durable поля последней записи (канонический JSON)
+        self.writes = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self.lock:
+            self._written = json.dumps(durable_fields(data), sort_keys=True, default=str)
+        return data
+
+    def save(self, status: Dict[str, Any]) -> bool:
+        """Записать, если durable поля изменились; True - файл переписан"""
+        with self.lock:
+            status = dict(status)
+            key = json.dumps(durable_fields(status), sort_keys=True, default=str)
+            if key == self._written:
+                self.skipped += 1
+                return False
+            atomic_write_json(self.path, status)
+            self._written = key
+            self.writes += 1
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"writes": self.writes, "skipped": self.skipped}
+
+
+_stores: Dict[str, StateStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_state_store(path: str) -> StateStore:
+    """Один StateStore на файл (сравнение с последней записью живет в нем)"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = StateStore(path)
+            _stores[key] = store
+            log(f"💾 Состояние: {path} (запись при изменении, атомарная замена)", "STATE")
+        return store
@@ -0,0 +1,134 @@
+# profiler.py - Семплирующий профайлер торгового потока
+# Включается на N секунд по запросу: отдельный поток раз в interval снимает стек нужных
+# потоков через sys._current_frames() и считает одинаковые стеки. Профилируемый код не
+# инструментируется, поэтому в неактивном состоянии профайлер не стоит ничего, а в активном -
+# только время семплирующего потока. Результат - collapsed stacks (формат flamegraph.pl /
+# speedscope) и таблица функций по собственному и суммарному времени.
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Ограничения, чтобы запрос не мог повесить бота профилированием
+MAX_SECONDS = 300
+MIN_INTERVAL = 0.001
+MAX_DEPTH = 128
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Один активный сеанс профилирования за раз; результат хранится до следующего"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.finished = 0.0
+        self.seconds = 0.0
+        self.interval = 0.0
+        self.threads: List[str] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, select: Callable[[threading.Thread], bool], interval: float = 0.01) -> bool:
+        """Начать сеанс; select(thread) - какие потоки семплировать. False - уже идет"""
+        with self.lock:
+            if self.running:
+                return False
+            self.stacks = Counter()
+            self.samples = 0
+            self.seconds = min(max(seconds, 0.1), MAX_SECONDS)
+            self.interval = max(interval, MIN_INTERVAL)
+            self.started = time.time()
+            self.finished = 0.0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(select,), name="profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(5)
+
+    def _run(self, select: Callable[[threading.Thread], bool]):
+        deadline = time.monotonic() + self.seconds
+        own = threading.get_ident()
+        seen = set()
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            targets = {t.ident: t.name for t in threading.enumerate() if t.ident != own and select(t)}
+            frames = sys._current_frames()
+            batch = []
+            for ident, name in targets.items():
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                batch.append(";".join(reversed(stack)))
+                seen.add(name)
+            del frames
+            with self.lock:
+                self.stacks.update(batch)
+                self.samples += 1
+            self._stop.wait(self.interval)
+        with self.lock:
+            self.threads = sorted(seen)
+            self.finished = time.time()
+
+    def collapsed(self) -> str:
+        """Строки "поток;f1;f2;...;leaf count" для flamegraph.pl / speedscope"""
+        with self.lock:
+            items = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+    def top(self, limit: int = 30) -> List[Dict]:
+        """Функции по собственному (листовому) и суммарному числу семплов"""
+        with self.lock:
+            items = list(self.stacks.items())
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in items:
+            frames = stack.split(";")[1:]   # первый элемент - имя потока
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for label in set(frames):
+                total[label] += count
+        stack_samples = sum(count for _, count in items) or 1
+        rows: List[Tuple[str, int]] = own.most_common(limit)
+        return [
+            {
+                "function": label,
+                "self": count,
+                "total": total[label],
+                "self_pct": round(100.0 * count / stack_samples, 1),
+                "total_pct": round(100.0 * total[label] / stack_samples, 1),
+            }
+            for label, count in rows
+        ]
+
+    def summary(self) -> Dict:
+        with self.lock:
+            return {
+                "running": self.running,
+                "started": self.started or None,
+                "finished": self.finished or None,
+                "seconds": self.seconds,
+                "interval_ms": round(self.interval * 1000, 2),
+                "samples": self.samples,
+                "threads": list(self.threads),
+            }
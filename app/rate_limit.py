@@ -0,0 +1,266 @@
+# rate_limit.py - Общий ограничитель веса запросов к Binance REST
+# Все вызовы API идут через RateLimitedClient: вес запроса списывается из token bucket
+# до отправки, счетчик сверяется с заголовком X-MBX-USED-WEIGHT-1M после ответа,
+# а 429/418 с Retry-After останавливают все запросы до окончания бана.
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from binance.exceptions import BinanceAPIException
+
+from app.logger import log
+
+# Лимит Binance Spot по умолчанию - 6000 веса в минуту на IP
+DEFAULT_WEIGHT_LIMIT = 6000
+# Доля лимита, которую бот позволяет себе использовать (запас для других процессов на том же IP)
+DEFAULT_HEADROOM = 0.8
+
+
+def _order_book_weight(kwargs: Dict[str, Any]) -> int:
+    limit = int(kwargs.get("limit", 100))
+    if limit <= 100:
+        return 5
+    if limit <= 500:
+        return 25
+    if limit <= 1000:
+        return 50
+    return 250
+
+
+# Вес методов python-binance (https://binance-docs.github.io/apidocs/spot/en/#limits)
+ENDPOINT_WEIGHTS: Dict[str, Union[int, Callable[[Dict[str, Any]], int]]] = {
+    "ping": 1,
+    "get_server_time": 1,
+    "get_klines": 2,
+    "get_symbol_ticker": 2,
+    "get_order_book": _order_book_weight,
+    "get_exchange_info": 20,
+    "get_symbol_info": 20,
+    "get_account": 20,
+    "get_asset_balance": 20,
+    "get_order": 4,
+    "get_open_orders": 6,
+    "create_order": 1,
+    "order_market": 1,
+    "order_market_buy": 1,
+    "order_market_sell": 1,
+    "order_limit": 1,
+    "order_limit_buy": 1,
+    "order_limit_sell": 1,
+    "cancel_order": 1,
+    "stream_get_listen_key": 2,
+    "stream_keepalive": 2,
+}
+
+# Повторяющиеся чтения в пределах TTL (секунды) склеиваются в один запрос
+COALESCE_TTL: Dict[str, float] = {
+    "ping": 5.0,
+    "get_server_time": 1.0,
+    "get_account": 1.0,
+    "get_exchange_info": 60.0,
+}
+
+
+def request_weight(method: str, kwargs: Dict[str, Any]) -> int:
+    weight = ENDPOINT_WEIGHTS.get(method, 1)
+    return weight(kwargs) if callable(weight) else weight
+
+
+class WeightLimiter:
+    """Token bucket по весу запросов, синхронизируемый с заголовками ответа Binance"""
+
+    def __init__(self, limit: int = DEFAULT_WEIGHT_LIMIT, headroom: float = DEFAULT_HEADROOM):
+        self.limit = limit
+        self.capacity = max(1.0, limit * headroom)
+        self.rate = self.capacity / 60.0  # пополнение в секунду
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.banned_until = 0.0
+        self.lock = threading.Lock()
+
+        # Метрики
+        self.server_used_weight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.coalesced = 0
+        self.bans = 0
+        self._recent = deque()  # (monotonic, weight) за последние 60с
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _trim_recent(self, now: float):
+        # Без чтения stats() окно не должно расти бесконечно
+        while self._recent and now - self._recent[0][0] >= 60:
+            self._recent.popleft()
+
+    def acquire(self, weight: int):
+        """Дождаться, пока запрос с таким весом уложится в лимит, и списать вес"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.banned_until:
+                    wait = self.banned_until - now
+                elif self.tokens >= weight or self.tokens >= self.capacity:
+                    self.tokens -= weight
+                    self.requests += 1
+                    self._recent.append((now, weight))
+                    self._trim_recent(now)
+                    if waited:
+                        self.throttled += 1
+                        self.throttled_seconds += waited
+                    return
+                else:
+                    wait = (weight - self.tokens) / self.rate
+            wait = min(wait, 60.0)
+            if not waited:
+                log(f"⏳ Лимит веса API: пауза {wait:.2f}с перед запросом веса {weight}", "RATE")
+            time.sleep(wait)
+            waited += wait
+
+    def observe(self, headers: Optional[Dict[str, str]]):
+        """Сверить бюджет с весом, который насчитала биржа в текущем окне"""
+        if not headers:
+            return
+        used = headers.get("X-MBX-USED-WEIGHT-1M") or headers.get("x-mbx-used-weight-1m")
+        if used is None:
+            return
+        with self.lock:
+            self.server_used_weight = int(used)
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, self.capacity - int(used))
+
+    def ban(self, status: int, retry_after: Optional[str]):
+        """429 - предупреждение, 418 - бан IP; в обоих случаях ждем Retry-After"""
+        seconds = float(retry_after) if retry_after else (60.0 if status == 418 else 5.0)
+        with self.lock:
+            self.bans += 1
+            self.banned_until = max(self.banned_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+        log(f"🚫 Binance вернул {status}, все запросы приостановлены на {seconds:.0f}с", "RATE")
+
+    def backoff_remaining(self) -> float:
+        return max(0.0, self.banned_until - time.monotonic())
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._trim_recent(now)
+            return {
+                "limit_1m": self.limit,
+                "budget_1m": int(self.capacity),
+                "used_weight_1m": self.server_used_weight,
+                "local_weight_1m": sum(w for _, w in self._recent),
+                "available": round(self.tokens, 1),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "throttled_seconds": round(self.throttled_seconds, 2),
+                "coalesced": self.coalesced,
+                "bans": self.bans,
+                "banned_for_seconds": round(max(0.0, self.banned_until - now), 1),
+            }
+
+
+class RateLimitedClient:
+    """Прокси над binance.Client: каждый вызов API проходит через WeightLimiter
+
+    Атрибуты (timestamp_offset, response, session...) читаются и пишутся
+    в исходный клиент, поэтому прокси можно передавать везде вместо Client.
+    on_request(name, seconds, ok) - наблюдатель задержки каждого запроса к бирже.
+    """
+
+    def __init__(self, client, limiter: Optional[WeightLimiter] = None,
+                 on_request: Optional[Callable[[str, float, bool], None]] = None):
+        object.__setattr__(self, "_client", client)
+        object.__setattr__(self, "limiter", limiter or WeightLimiter())
+        object.__setattr__(self, "on_request", on_request)
+        object.__setattr__(self, "_cache", {})
+        object.__setattr__(self, "_inflight", {})
+        object.__setattr__(self, "_cache_lock", threading.Lock())
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self._call(name, attr, args, kwargs)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._client, name, value)
+
+    @property
+    def raw(self):
+        return self._client
+
+    def get_asset_balance(self, asset: str, **params):
+        # Client.get_asset_balance вызывает get_account напрямую - берем его через прокси,
+        # чтобы несколько активов подряд стоили один запрос
+        account = self.get_account(**params)
+        return next((b for b in account.get("balances", []) if b["asset"].lower() == asset.lower()), None)
+
+    def _call(self, name: str, method: Callable, args: Tuple, kwargs: Dict[str, Any]):
+        ttl = COALESCE_TTL.get(name)
+        if ttl is None:
+            return self._send(name, method, args, kwargs)
+
+        key = (name, args, tuple(sorted(kwargs.items())))
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached and time.monotonic() - cached[0] < ttl:
+                self.limiter.coalesced += 1
+                return cached[1]
+            event = self._inflight.get(key)
+            leader = event is None
+            if leader:
+                event = self._inflight[key] = threading.Event()
+        if not leader:
+            # Такой же запрос уже выполняется в другом потоке - ждем его результат
+            event.wait(30)
+            with self._cache_lock:
+                cached = self._cache.get(key)
+            if cached:
+                self.limiter.coalesced += 1
+                return cached[1]
+            return self._send(name, method, args, kwargs)
+        try:
+            result = self._send(name, method, args, kwargs)
+            with self._cache_lock:
+                self._cache[key] = (time.monotonic(), result)
+            return result
+        finally:
+            with self._cache_lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _send(self, name: str, method: Callable, args: Tuple, kwargs: Dict[str, Any]):
+        self.limiter.acquire(request_weight(name, kwargs))
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = method(*args, **kwargs)
+            ok = True
+            if name.startswith(("order_", "create_order", "cancel_order")):
+                self.invalidate("get_account")
+            return result
+        except BinanceAPIException as e:
+            if e.status_code in (418, 429):
+                response = getattr(e, "response", None)
+                self.limiter.ban(e.status_code, response.headers.get("Retry-After") if response is not None else None)
+            raise
+        finally:
+            if self.on_request is not None:
+                self.on_request(name, time.perf_counter() - started, ok)
+            response = getattr(self._client, "response", None)
+            if response is not None:
+                self.limiter.observe(response.headers)
+
+    def invalidate(self, name: Optional[str] = None):
+        """Сбросить склеенные ответы (например, get_account после ордера)"""
+        with self._cache_lock:
+            for key in [k for k in self._cache if name is None or k[0] == name]:
+                del self._cache[key]
@@ -0,0 +1,76 @@
+# rounding.py - Округление количества и цены под фильтры биржи (LOT_SIZE / PRICE_FILTER)
+# Арифметика в Decimal: float деление (0.3 / 0.1 = 2.9999...) теряет целый шаг, а двоичный
+# хвост дает строки, которые биржа отвергает по точности. Шаг разбирается один раз при
+# создании Quantizer; на ордер остается floor до шага и форматирование без экспоненты.
+from decimal import ROUND_CEILING, ROUND_FLOOR, Decimal
+from functools import lru_cache
+from typing import Union
+
+Number = Union[float, int, str, Decimal]
+
+
+def to_decimal(value: Number) -> Decimal:
+    # str(float) - кратчайшее представление (1.499, а не 1.49899999999999988...)
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+class Quantizer:
+    """Количество/цена символа -> строки, которые биржа принимает как есть
+
+    Строится один раз из stepSize/tickSize (строк биржи или float) и точности
+    актива котировки (для quoteOrderQty).
+    """
+    __slots__ = ("step", "tick", "_qty_exp", "_price_exp", "_quote_exp")
+
+    def __init__(self, step: Number, tick: Number, quote_precision: int = 8):
+        self.step = to_decimal(step).normalize()
+        self.tick = to_decimal(tick).normalize()
+        if self.step <= 0 or self.tick <= 0:
+            raise ValueError(f"Шаг должен быть больше 0: step={step}, tick={tick}")
+        # Показатель для quantize: 0.001 -> 1E-3, а шаг 10 -> целые
+        self._qty_exp = Decimal(1).scaleb(min(self.step.as_tuple().exponent, 0))
+        self._price_exp = Decimal(1).scaleb(min(self.tick.as_tuple().exponent, 0))
+        self._quote_exp = Decimal(1).scaleb(-quote_precision)
+
+    @staticmethod
+    def _floor(value: Number, step: Decimal, exp: Decimal, rounding: str = ROUND_FLOOR) -> Decimal:
+        units = (to_decimal(value) / step).to_integral_value(rounding=rounding)
+        return (units * step).quantize(exp)
+
+    def qty(self, value: Number) -> Decimal:
+        """Количество вниз до кратного stepSize"""
+        return self._floor(value, self.step, self._qty_exp)
+
+    def price(self, value: Number) -> Decimal:
+        """Цена вниз до кратного tickSize"""
+        return self._floor(value, self.tick, self._price_exp)
+
+    def price_up(self, value: Number) -> Decimal:
+        """Цена вверх до кратного tickSize (лимит продажи не ниже заданного)"""
+        return self._floor(value, self.tick, self._price_exp, ROUND_CEILING)
+
+    def quote(self, value: Number) -> Decimal:
+        """Сумма в активе котировки вниз до его точности (quoteOrderQty)"""
+        return to_decimal(value).quantize(self._quote_exp, rounding=ROUND_FLOOR)
+
+    def qty_str(self, value: Number) -> str:
+        return format(self.qty(value), "f")
+
+    def price_str(self, value: Number) -> str:
+        return format(self.price(value), "f")
+
+    def quote_str(self, value: Number) -> str:
+        return format(self.quote(value), "f")
+
+
+@lru_cache(maxsize=256)
+def _step_quantizer(step: float) -> Quantizer:
+    return Quantizer(step, step)
+
+
+def round_step(qty: float, step: float) -> float:
+    return float(_step_quantizer(step).qty(qty))
+
+
+def round_tick(price: float, tick: float) -> float:
+    return float(_step_quantizer(tick).price(price))
@@ -0,0 +1,96 @@
+# scheduler.py - Планировщик торгового цикла по закрытию свечей
+# Цикл просыпается на границе свечи (по времени сервера Binance), а не каждые CHECK_INTERVAL
+# секунд. Между границами - сон; промежуточные проверки только по запросу вызывающего.
+import threading
+import time
+from typing import Callable, List, Optional
+
+from app.market_data import INTERVAL_MS
+
+# Сон режется на кусочки, чтобы вовремя заметить остановку бота
+WAIT_SLICE_SECONDS = 1.0
+
+
+class CandleScheduler:
+    """Ожидание ближайшего закрытия свечи среди заданных интервалов
+
+    offset_ms() - смещение времени сервера относительно локальных часов
+    (client.timestamp_offset). close_delay_ms - пауза после границы, чтобы
+    закрытая свеча успела появиться в REST ответах. На каждую границу - один
+    цикл: граница, по которой цикл уже запущен (таймером или событием потока),
+    запоминается в last_close_ms, и повторное пробуждение по ней пропускается.
+    """
+
+    def __init__(self, intervals: List[str], close_delay_ms: int = 500,
+                 offset_ms: Optional[Callable[[], int]] = None):
+        unknown = [i for i in intervals if i not in INTERVAL_MS]
+        if unknown:
+            raise ValueError(f"Неизвестные интервалы: {', '.join(unknown)}")
+        self.interval_ms = sorted({INTERVAL_MS[i] for i in intervals})
+        self.close_delay_ms = close_delay_ms
+        self.offset_ms = offset_ms or (lambda: 0)
+        self.last_close_ms = 0   # граница (время сервера) последней свечи, по которой запущен цикл
+        self.wakeups = {"candle": 0, "stream": 0, "check": 0, "stop": 0}
+        self.duplicates = 0      # события потока по уже обработанной границе
+
+    def server_now_ms(self) -> int:
+        return int(time.time() * 1000) + int(self.offset_ms() or 0)
+
+    def next_boundary_ms(self, now_ms: int) -> int:
+        """Ближайшая граница свечи строго после now и после уже обработанной"""
+        after = max(now_ms, self.last_close_ms)
+        return min((after // step + 1) * step for step in self.interval_ms)
+
+    def last_boundary_ms(self, now_ms: int) -> int:
+        """Последняя граница свечи не позже now"""
+        return max((now_ms // step) * step for step in self.interval_ms)
+
+    def next_close_ms(self, now_ms: Optional[int] = None) -> int:
+        """Время сервера ближайшего пробуждения: next_boundary_ms(now) + задержка"""
+        now_ms = self.server_now_ms() if now_ms is None else now_ms
+        return self.next_boundary_ms(now_ms) + self.close_delay_ms
+
+    def seconds_until_close(self) -> float:
+        now_ms = self.server_now_ms()
+        return max(0.0, (self.next_close_ms(now_ms) - now_ms) / 1000.0)
+
+    def wait(self, max_wait: Optional[float] = None, event: Optional[threading.Event] = None,
+             should_stop: Optional[Callable[[], bool]] = None,
+             stream_close_ms: Optional[Callable[[], int]] = None) -> str:
+        """Спать до закрытия свечи. Причина пробуждения:
+        candle - граница свечи, stream - закрытие пришло из WebSocket раньше,
+        check - истек max_wait (промежуточная проверка), stop - бот остановлен.
+        stream_close_ms() - граница последней закрытой свечи из потока (время открытия
+        следующей); событие по уже обработанной границе не запускает второй цикл."""
+        now_ms = self.server_now_ms()
+        boundary = self.next_boundary_ms(now_ms)
+        deadline = time.monotonic() + max(0.0, (boundary + self.close_delay_ms - now_ms) / 1000.0)
+        reason = "candle"
+        if max_wait is not None and time.monotonic() + max_wait < deadline:
+            deadline = time.monotonic() + max_wait
+            reason = "check"
+
+        while True:
+            if should_stop and should_stop():
+                reason = "stop"
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = min(remaining, WAIT_SLICE_SECONDS)
+            if event is not None:
+                if event.wait(timeout):
+                    event.clear()
+                    closed = stream_close_ms() if stream_close_ms else self.last_boundary_ms(self.server_now_ms())
+                    if closed <= self.last_close_ms:
+                        self.duplicates += 1
+                        continue
+                    self.last_close_ms = closed
+                    reason = "stream"
+                    break
+            else:
+                time.sleep(timeout)
+        if reason == "candle":
+            self.last_close_ms = max(self.last_close_ms, boundary)
+        self.wakeups[reason] += 1
+        return reason
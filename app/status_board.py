@@ -0,0 +1,45 @@
+# status_board.py - Снимок состояния бота для /health и /status
+# Торговый цикл публикует новый неизменяемый снимок, HTTP обработчики только читают ссылку
+# на него: без блокировок, без обращений к бирже, время ответа не зависит от цикла.
+import time
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Any, Dict, Mapping
+
+
+class StatusBoard:
+    """Атомарно подменяемый снимок + пульс торгового потока
+
+    publish() собирает новый словарь и заменяет ссылку одним присваиванием -
+    читатель видит либо старый снимок, либо новый, но никогда не частично
+    обновленный. heartbeat() - дешевая отметка "поток жив" между циклами.
+    """
+
+    def __init__(self):
+        self._snapshot: Mapping[str, Any] = MappingProxyType({})
+        self._published = 0.0
+        self._heartbeat = 0.0
+        self.publications = 0
+
+    def publish(self, data: Dict[str, Any]):
+        now = time.time()
+        snapshot = dict(data)
+        snapshot["published_at"] = datetime.fromtimestamp(now, timezone.utc).isoformat()
+        self._snapshot = MappingProxyType(snapshot)
+        self._published = now
+        self._heartbeat = now
+        self.publications += 1
+
+    def heartbeat(self):
+        self._heartbeat = time.time()
+
+    @property
+    def current(self) -> Mapping[str, Any]:
+        return self._snapshot
+
+    def age(self) -> float:
+        """Секунд с последней публикации (inf - еще не публиковался)"""
+        return time.time() - self._published if self._published else float("inf")
+
+    def heartbeat_age(self) -> float:
+        return time.time() - self._heartbeat if self._heartbeat else float("inf")
@@ -0,0 +1,265 @@
+# streams.py - WebSocket потоки Binance с автоматическим переподключением
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+import websocket
+
+from app.logger import log
+from app.order_book import GAP, UNSYNCED
+
+DEFAULT_WS_URL = "wss://stream.binance.com:9443"
+
+
+class ReconnectingWebSocket(ABC):
+    """Базовый WebSocket клиент: отдельный поток, переподключение с backoff"""
+
+    name = "WS"
+
+    def __init__(self, url: str, max_backoff: float = 60.0):
+        self.url = url
+        self.max_backoff = max_backoff
+        self.connected = False
+        self.last_message_ts = 0.0
+        self.reconnects = 0
+        self._url = ""      # адрес текущей попытки подключения (get_url вызывается один раз на попытку)
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"ws-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._ws:
+            self._ws.close()
+
+    def is_alive(self, max_silence: float) -> bool:
+        """Соединение открыто и сообщения приходили не позже `max_silence` секунд назад"""
+        return self.connected and (time.time() - self.last_message_ts) <= max_silence
+
+    def get_url(self) -> str:
+        return self.url
+
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                # get_url может ходить в REST (listenKey) - его ошибка тоже уходит в backoff
+                self._url = self.get_url()
+                self._ws = websocket.WebSocketApp(
+                    self._url,
+                    on_open=self._on_open,
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                    on_close=self._on_close,
+                )
+                self._ws.run_forever(ping_interval=60, ping_timeout=20)
+            except Exception as e:
+                log(f"{self.name}: ошибка WebSocket: {e}", "WARN")
+            self.connected = False
+            if self._stop.is_set():
+                break
+            # Соединение продержалось долго - начинаем backoff заново
+            if time.time() - started > 60:
+                backoff = 1.0
+            self.reconnects += 1
+            log(f"{self.name}: соединение потеряно, переподключение через {backoff:.0f}с", "WARN")
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+        log(f"{self.name}: поток остановлен", "WS")
+
+    def _on_open(self, ws):
+        self.connected = True
+        self.last_message_ts = time.time()
+        log(f"{self.name}: подключено к {self._url}", "WS")
+        try:
+            self.on_connected()
+        except Exception as e:
+            log(f"{self.name}: ошибка обработки подключения: {e}", "ERROR")
+
+    def _on_message(self, ws, message: str):
+        self.last_message_ts = time.time()
+        try:
+            self.handle_message(json.loads(message))
+        except Exception as e:
+            log(f"{self.name}: ошибка обработки сообщения: {e}", "ERROR")
+
+    def _on_error(self, ws, error):
+        log(f"{self.name}: {error}", "WARN")
+
+    def _on_close(self, ws, status_code, msg):
+        self.connected = False
+
+    def on_connected(self):
+        """Вызывается после каждого (пере)подключения"""
+
+    @abstractmethod
+    def handle_message(self, payload: Dict):
+        """Разобранное JSON сообщение потока"""
+
+
+class KlineStream(ReconnectingWebSocket):
+    """Поток <symbol>@kline_<interval> для набора кэшей свечей (combined stream)
+
+    Закрытые и незакрытые свечи сразу попадают в KlineStore. После
+    переподключения и при обнаружении пропуска свечей кэш догружается через
+    REST функцией `backfill(store)`.
+    """
+
+    name = "KLINES"
+
+    def __init__(self, stores: List, backfill: Callable, base_url: str = DEFAULT_WS_URL):
+        super().__init__(base_url)
+        self.stores = {f"{s.symbol.lower()}@kline_{s.interval}": s for s in stores}
+        self.backfill = backfill
+        # Взводится при закрытии любой свечи - торговый цикл просыпается сразу
+        self.candle_closed = threading.Event()
+        # Граница последней закрытой свечи (время открытия следующей) - для отсева повторов
+        self.last_close_ms = 0
+
+    def get_url(self) -> str:
+        return f"{self.url}/stream?streams={'/'.join(self.stores)}"
+
+    def on_connected(self):
+        # За время разрыва могли закрыться свечи - догружаем их через REST
+        for store in self.stores.values():
+            self._backfill(store)
+
+    def handle_message(self, payload: Dict):
+        store = self.stores.get(payload.get("stream"))
+        data = payload.get("data") or {}
+        if store is None or data.get("e") != "kline":
+            return
+        k = data["k"]
+        if not store.apply_stream_kline(int(k["t"]), float(k["c"])):
+            log(f"{self.name}: пропуск свечей {store.symbol} {store.interval}, догрузка через REST", "WARN")
+            self._backfill(store)
+        if k["x"]:
+            self.last_close_ms = max(self.last_close_ms, int(k["t"]) + store.interval_ms)
+            self.candle_closed.set()
+
+    def _backfill(self, store):
+        try:
+            self.backfill(store)
+        except Exception as e:
+            log(f"{self.name}: не удалось догрузить свечи {store.symbol}: {e}", "ERROR")
+
+
+class UserDataStream(ReconnectingWebSocket):
+    """User data stream аккаунта: /ws/<listenKey>
+
+    События раздаются обработчикам по типу (`handlers["outboundAccountPosition"]`
+    и т.д.). После каждого подключения вызывается `resync()` - за время разрыва
+    события могли потеряться. listenKey продлевается каждые `keepalive` секунд.
+    """
+
+    name = "USER"
+
+    def __init__(self, client, handlers: Dict[str, Callable], resync: Optional[Callable] = None,
+                 base_url: str = DEFAULT_WS_URL, keepalive: float = 30 * 60):
+        super().__init__(base_url)
+        self.client = client
+        self.handlers = handlers
+        self.resync = resync
+        self.keepalive = keepalive
+        self.listen_key: Optional[str] = None
+        self._keepalive_thread: Optional[threading.Thread] = None
+
+    def start(self):
+        super().start()
+        if not (self._keepalive_thread and self._keepalive_thread.is_alive()):
+            self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name="ws-USER-keepalive", daemon=True)
+            self._keepalive_thread.start()
+
+    def get_url(self) -> str:
+        # Binance возвращает тот же ключ, пока он действителен
+        self.listen_key = self.client.stream_get_listen_key()
+        return f"{self.url}/ws/{self.listen_key}"
+
+    def on_connected(self):
+        if self.resync:
+            self.resync()
+
+    def handle_message(self, payload: Dict):
+        event = payload.get("e")
+        if event == "listenKeyExpired":
+            log(f"{self.name}: listenKey истек, переподключение", "WARN")
+            if self._ws:
+                self._ws.close()
+            return
+        handler = self.handlers.get(event)
+        if handler:
+            handler(payload)
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive):
+            if not self.listen_key:
+                continue
+            try:
+                self.client.stream_keepalive(self.listen_key)
+            except Exception as e:
+                log(f"{self.name}: не удалось продлить listenKey: {e}", "WARN")
+
+
+class DepthStream(ReconnectingWebSocket):
+    """Поток <symbol>@depth@100ms для набора локальных стаканов (combined stream)
+
+    Стакан без снимка (старт, переподключение, разрыв последовательности)
+    загружается через REST функцией `snapshot(symbol)` прямо в потоке
+    WebSocket: пока идет запрос, новые события копятся в сокете и применяются
+    после снимка по правилам U/u. Повторная загрузка снимка одного символа - не
+    чаще `resync_interval` секунд (вес depth limit=1000 - 50).
+    """
+
+    name = "DEPTH"
+
+    def __init__(self, books: List, snapshot: Callable, base_url: str = DEFAULT_WS_URL,
+                 resync_interval: float = 5.0):
+        super().__init__(base_url)
+        self.books = {f"{b.symbol.lower()}@depth@100ms": b for b in books}
+        self.snapshot = snapshot
+        self.resync_interval = resync_interval
+        self._last_resync: Dict[str, float] = {}
+
+    def get_url(self) -> str:
+        return f"{self.url}/stream?streams={'/'.join(self.books)}"
+
+    def on_connected(self):
+        # События за время разрыва потеряны - все стаканы ждут нового снимка
+        for book in self.books.values():
+            book.invalidate()
+        self._last_resync.clear()
+
+    def handle_message(self, payload: Dict):
+        book = self.books.get(payload.get("stream"))
+        data = payload.get("data") or {}
+        if book is None or data.get("e") != "depthUpdate":
+            return
+        status = book.apply_diff(data)
+        if status == GAP:
+            log(f"{self.name}: разрыв последовательности {book.symbol} "
+                f"(U={data['U']}, ожидался {book.last_update_id + 1}), перезагрузка снимка", "WARN")
+        if status in (GAP, UNSYNCED) and self._resync(book):
+            book.apply_diff(data)
+
+    def _resync(self, book) -> bool:
+        now = time.time()
+        if now - self._last_resync.get(book.symbol, 0.0) < self.resync_interval:
+            return False
+        self._last_resync[book.symbol] = now
+        try:
+            book.apply_snapshot(self.snapshot(book.symbol))
+        except Exception as e:
+            log(f"{self.name}: не удалось загрузить снимок стакана {book.symbol}: {e}", "ERROR")
+            return False
+        log(f"{self.name}: снимок стакана {book.symbol} lastUpdateId={book.last_update_id}", "WS")
+        return True
@@ -0,0 +1,198 @@
+# sweep.py - Параллельный перебор параметров стратегии на истории свечей
+# Использование:
+#   python -m app.sweep --data BNBUSDT-1m.npz --ma-short 3:15 --ma-long 20:60:5 \
+#       --interval 15m,30m,1h --spread-bps 0,0.5,1,2 --top 20 --out sweep.csv
+import argparse
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, replace
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.backtest import (BUY_ORDER_MODES, BacktestParams, KlineHistory, load_klines,
+                          moving_average, resample, run_backtest, signals_from_mas)
+
+# Параметры одной комбинации: (interval, ma_short, ma_long, ma_spread_bps)
+Combo = Tuple[str, int, int, float]
+
+RESULT_FIELDS = ["interval", "ma_short", "ma_long", "ma_spread_bps", "pnl_pct", "max_drawdown_pct",
+                 "switches", "failed_switches", "buy_and_hold_pct", "final_equity"]
+
+
+# ========== Разделяемая память ==========
+class SharedHistory:
+    """История свечей по интервалам в shared memory: массивы не копируются в каждую задачу"""
+
+    def __init__(self, histories: Dict[str, KlineHistory]):
+        self.blocks: List[SharedMemory] = []
+        # interval -> (имя блока времен, имя блока цен, длина)
+        self.layout: Dict[str, Tuple[str, str, int]] = {}
+        for interval, hist in histories.items():
+            t_name = self._put(hist.open_times.astype(np.int64))
+            c_name = self._put(hist.closes.astype(np.float64))
+            self.layout[interval] = (t_name, c_name, len(hist))
+
+    def _put(self, array: np.ndarray) -> str:
+        shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+        self.blocks.append(shm)
+        return shm.name
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+
+# Состояние процесса-воркера
+_worker_blocks: List[SharedMemory] = []
+_worker_histories: Dict[str, KlineHistory] = {}
+_worker_mas: Dict[Tuple[str, int], np.ndarray] = {}
+_worker_base: Optional[BacktestParams] = None
+
+
+def _init_worker(layout: Dict[str, Tuple[str, str, int]], base_params: BacktestParams):
+    global _worker_base
+    _worker_base = base_params
+    for interval, (t_name, c_name, n) in layout.items():
+        t_shm, c_shm = SharedMemory(name=t_name), SharedMemory(name=c_name)
+        _worker_blocks.extend([t_shm, c_shm])
+        _worker_histories[interval] = KlineHistory(
+            np.ndarray((n,), dtype=np.int64, buffer=t_shm.buf),
+            np.ndarray((n,), dtype=np.float64, buffer=c_shm.buf),
+        )
+
+
+def _cached_ma(interval: str, period: int) -> np.ndarray:
+    # Одна и та же MA нужна многим комбинациям - считаем один раз на воркер
+    key = (interval, period)
+    if key not in _worker_mas:
+        _worker_mas[key] = moving_average(_worker_histories[interval].closes, period, _worker_base.ma_type)
+    return _worker_mas[key]
+
+
+def _run_combo(combo: Combo) -> Dict:
+    interval, ma_short, ma_long, spread = combo
+    hist = _worker_histories[interval]
+    params = replace(_worker_base, interval=interval, ma_short=ma_short, ma_long=ma_long, ma_spread_bps=spread)
+    signals = signals_from_mas(hist.closes, _cached_ma(interval, ma_short), _cached_ma(interval, ma_long), spread)
+    result = run_backtest(hist, params, signals)
+    row = {"interval": interval, "ma_short": ma_short, "ma_long": ma_long, "ma_spread_bps": spread}
+    row.update({k: v for k, v in asdict(result).items() if k in RESULT_FIELDS})
+    return row
+
+
+# ========== Перебор ==========
+def parse_values(spec: str, cast=float) -> List:
+    """'7' | '5,7,9' | '5:15' | '5:15:2' (диапазон включительно)"""
+    values = []
+    for part in spec.split(","):
+        part = part.strip()
+        if ":" in part:
+            bounds = [cast(x) for x in part.split(":")]
+            start, stop = bounds[0], bounds[1]
+            step = bounds[2] if len(bounds) > 2 else cast(1)
+            v = start
+            while v <= stop + (1e-9 if cast is float else 0):
+                values.append(round(v, 10) if cast is float else v)
+                v += step
+        elif part:
+            values.append(cast(part))
+    return values
+
+
+def build_combos(intervals: List[str], shorts: List[int], longs: List[int], spreads: List[float],
+                 sample: Optional[int] = None, seed: int = 0) -> List[Combo]:
+    combos = [c for c in itertools.product(intervals, shorts, longs, spreads) if c[1] < c[2]]
+    if sample and sample < len(combos):
+        combos = random.Random(seed).sample(combos, sample)
+    return combos
+
+
+def run_sweep(hist: KlineHistory, combos: List[Combo], base_params: BacktestParams,
+              processes: Optional[int] = None, sort_by: str = "pnl_pct") -> List[Dict]:
+    """Прогнать все комбинации в пуле процессов и вернуть результаты по убыванию sort_by"""
+    intervals = sorted({c[0] for c in combos})
+    shared = SharedHistory({interval: resample(hist, interval) for interval in intervals})
+    processes = processes or os.cpu_count() or 1
+    # Задачи группируются по интервалу и MA, чтобы кэш MA в воркерах попадал чаще
+    combos = sorted(combos)
+    chunksize = max(1, len(combos) // (processes * 8))
+    try:
+        ctx = get_context("spawn")
+        with ctx.Pool(processes, initializer=_init_worker, initargs=(shared.layout, base_params)) as pool:
+            results = list(pool.imap_unordered(_run_combo, combos, chunksize=chunksize))
+    finally:
+        shared.close()
+    reverse = sort_by != "max_drawdown_pct"
+    results.sort(key=lambda r: r[sort_by], reverse=reverse)
+    return results
+
+
+def format_table(rows: List[Dict], top: int) -> str:
+    header = f"{'#':>4} {'interval':>8} {'short':>5} {'long':>5} {'spread':>7} {'pnl%':>9} {'dd%':>7} {'switches':>8} {'b&h%':>8}"
+    lines = [header, "-" * len(header)]
+    for rank, r in enumerate(rows[:top], 1):
+        lines.append(
+            f"{rank:>4} {r['interval']:>8} {r['ma_short']:>5} {r['ma_long']:>5} {r['ma_spread_bps']:>7.2f} "
+            f"{r['pnl_pct']:>9.2f} {r['max_drawdown_pct']:>7.2f} {r['switches']:>8} {r['buy_and_hold_pct']:>8.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Перебор параметров MA стратегии на истории")
+    parser.add_argument("--data", required=True, help="CSV/Parquet/.npz файл или каталог со свечами")
+    parser.add_argument("--interval", default="30m", help="список интервалов через запятую")
+    parser.add_argument("--ma-short", default="3:15")
+    parser.add_argument("--ma-long", default="20:60:5")
+    parser.add_argument("--spread-bps", default="0,0.5,1,2")
+    parser.add_argument("--ma-type", default="sma", choices=["sma", "ema", "wma"])
+    parser.add_argument("--step", type=float, default=0.001)
+    parser.add_argument("--buy-order-mode", default=os.getenv("BUY_ORDER_MODE", "quote").lower(),
+                        choices=BUY_ORDER_MODES)
+    parser.add_argument("--fee", type=float, default=0.001)
+    parser.add_argument("--random", type=int, help="случайная выборка N комбинаций вместо полной сетки")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, help="по умолчанию - все ядра")
+    parser.add_argument("--sort", default="pnl_pct", choices=["pnl_pct", "max_drawdown_pct", "switches", "final_equity"])
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", help="сохранить все результаты в CSV")
+    args = parser.parse_args(argv)
+
+    hist = load_klines(args.data)
+    combos = build_combos(
+        [i.strip() for i in args.interval.split(",") if i.strip()],
+        parse_values(args.ma_short, int),
+        parse_values(args.ma_long, int),
+        parse_values(args.spread_bps, float),
+        args.random,
+        args.seed,
+    )
+    base_params = BacktestParams(ma_type=args.ma_type, step=args.step, fee=args.fee,
+                                 buy_order_mode=args.buy_order_mode)
+
+    started = time.perf_counter()
+    results = run_sweep(hist, combos, base_params, args.processes, args.sort)
+    elapsed = time.perf_counter() - started
+
+    print(format_table(results, args.top))
+    print(f"\n{len(results)} комбинаций за {elapsed:.1f}с ({len(results) / max(elapsed, 1e-9):.0f}/с)")
+    if args.out:
+        with open(args.out, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# transport.py - HTTP транспорт для Binance клиента
+# Пул keep-alive соединений нужного размера, раздельные таймауты по типам запросов,
+# повторы только для безопасных (идемпотентных) запросов и статистика переиспользования
+# соединений. Прогрев соединения держит TLS рукопожатия вне пути отправки ордера.
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.logger import log
+
+
+@dataclass
+class TransportConfig:
+    pool_size: int = 10                 # соединений на хост
+    connect_timeout: float = 3.05
+    read_timeout: float = 10.0          # обычные запросы
+    order_read_timeout: float = 5.0     # ордера: лучше быстро узнать о проблеме, чем висеть
+    market_read_timeout: float = 5.0    # свечи, стакан, цены
+    retries: int = 2                    # только GET/DELETE и только ошибки соединения/5xx
+    backoff_factor: float = 0.2
+    keepalive_seconds: float = 30.0     # 0 - без прогрева соединения
+
+
+# Суффикс пути -> тип запроса для выбора таймаута
+ENDPOINT_CLASSES = (
+    ("/order", "order"),
+    ("/klines", "market"),
+    ("/depth", "market"),
+    ("/ticker/price", "market"),
+)
+
+
+class TimedSession(requests.Session):
+    """Session с таймаутом по типу запроса (таймаут клиента python-binance игнорируется)"""
+
+    def __init__(self, config: TransportConfig):
+        super().__init__()
+        self.config = config
+
+    def timeout_for(self, url: str) -> Tuple[float, float]:
+        path = url.split("?", 1)[0]
+        kind = next((k for suffix, k in ENDPOINT_CLASSES if path.endswith(suffix)), "default")
+        read = {
+            "order": self.config.order_read_timeout,
+            "market": self.config.market_read_timeout,
+        }.get(kind, self.config.read_timeout)
+        return self.config.connect_timeout, read
+
+    def request(self, method, url, **kwargs):
+        kwargs["timeout"] = self.timeout_for(url)
+        return super().request(method, url, **kwargs)
+
+
+def build_session(config: TransportConfig, headers: Optional[Dict[str, str]] = None) -> TimedSession:
+    session = TimedSession(config)
+    retry = Retry(
+        total=config.retries,
+        connect=config.retries,
+        read=config.retries,
+        status=config.retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        # POST (ордер) никогда не повторяется автоматически - риск двойного исполнения
+        allowed_methods=frozenset({"GET", "DELETE", "PUT"}),
+        respect_retry_after_header=False,  # 429/418 обрабатывает лимитер веса
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=config.pool_size, max_retries=retry, pool_block=False)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def install_transport(client, config: TransportConfig) -> TimedSession:
+    """Заменить session у python-binance клиента, сохранив его заголовки (API ключ)"""
+    old = client.session
+    client.session = build_session(config, dict(old.headers))
+    old.close()
+    log(f"🔌 HTTP транспорт: пул {config.pool_size}, таймауты connect={config.connect_timeout}с "
+        f"read={config.read_timeout}с order={config.order_read_timeout}с, повторы {config.retries}", "HTTP")
+    return client.session
+
+
+def connection_stats(session: requests.Session) -> Dict[str, int]:
+    """Открыто соединений / выполнено запросов по всем пулам urllib3"""
+    opened = served = 0
+    adapters = {id(a): a for a in session.adapters.values()}.values()
+    for adapter in adapters:
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                served += pool.num_requests
+    return {
+        "connections_opened": opened,
+        "requests": served,
+        "reused": max(0, served - opened),
+        "reuse_ratio": round(1 - opened / served, 3) if served else None,
+    }
+
+
+class KeepAliveWarmer:
+    """Периодический легкий запрос, чтобы соединение в пуле не закрылось по простою"""
+
+    def __init__(self, ping: Callable[[], object], interval: float):
+        self.ping = ping
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запустить (или перезапустить после stop) поток прогрева"""
+        if self.interval <= 0 or self.running:
+            return
+        # Свое событие на каждый поток: остановленный, но еще не вышедший из ping поток
+        # не подхватит повторный запуск
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name="http-keepalive", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive() and not self._stop.is_set())
+
+    def _run(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            try:
+                self.ping()
+            except Exception as e:
+                log(f"🔌 Прогрев соединения не удался: {e}", "WARN")
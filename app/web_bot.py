@@ -1,27 +1,65 @@
 # web_bot.py - Простой спот-бот для переключения между активами по пересечению MA7/MA25
 # MA7 > MA25 = держим коин, MA7 < MA25 = держим USDT
+import hmac
 import os
-import json
 import time
-import math
 import threading
 from datetime import datetime, timezone
-from typing import Tuple, Optional, Dict, Any
-from flask import Flask, jsonify
+from typing import Tuple, Optional, Dict, Any, Callable
+from flask import Flask, Response, jsonify, request
 from dotenv import load_dotenv
 from binance.client import Client
 from binance.enums import *
 from binance.exceptions import BinanceAPIException, BinanceOrderException
 
 # ========== Утилиты логов ==========
-def log(msg: str, level: str = "INFO"):
-    ts = datetime.now(timezone.utc).astimezone().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{ts}] [{level}] {msg}", flush=True)
+from app.logger import configure as configure_logging, enabled as log_enabled, log, parse_components, parse_level
 
 # ========== Управление конфигурацией ==========
 from dataclasses import dataclass
 from typing import List
 
+BINANCE_INTERVALS = {
+    "1m": Client.KLINE_INTERVAL_1MINUTE,
+    "3m": Client.KLINE_INTERVAL_3MINUTE,
+    "5m": Client.KLINE_INTERVAL_5MINUTE,
+    "15m": Client.KLINE_INTERVAL_15MINUTE,
+    "30m": Client.KLINE_INTERVAL_30MINUTE,
+    "1h": Client.KLINE_INTERVAL_1HOUR,
+    "4h": Client.KLINE_INTERVAL_4HOUR,
+}
+
+def parse_portfolio(spec: str, default_interval: str) -> List[Tuple[str, str, float]]:
+    """Разбор PORTFOLIO="BNBUSDT:30m,ETHUSDT:1h:2" -> [(symbol, interval, weight)]
+    
+    ValueError - некорректная запись (пустой символ, неизвестный интервал, вес не > 0).
+    """
+    pairs = []
+    base_assets = set()
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        parts = item.split(":")
+        symbol = parts[0].strip().upper()
+        interval = parts[1].strip() if len(parts) > 1 and parts[1].strip() else default_interval
+        if not symbol or len(parts) > 3:
+            raise ValueError(f"PORTFOLIO: некорректная запись '{item}' (формат SYMBOL[:INTERVAL[:WEIGHT]])")
+        if interval not in BINANCE_INTERVALS:
+            raise ValueError(f"PORTFOLIO: неизвестный интервал {interval} у {symbol} "
+                             f"(допустимо: {', '.join(BINANCE_INTERVALS)})")
+        try:
+            weight = float(parts[2]) if len(parts) > 2 else 1.0
+        except ValueError:
+            raise ValueError(f"PORTFOLIO: вес '{parts[2]}' у {symbol} не число")
+        if not weight > 0 or weight == float("inf"):
+            raise ValueError(f"PORTFOLIO: вес {parts[2]} у {symbol} должен быть больше 0")
+        base = symbol[:-4] if symbol.endswith("USDT") else symbol.split("USDT")[0]
+        if base in base_assets:
+            # Две стратегии на одном коине делили бы один баланс
+            log(f"❌ PORTFOLIO: {symbol} пропущен - базовый актив {base} уже используется", "ERROR")
+            continue
+        base_assets.add(base)
+        pairs.append((symbol, interval, weight))
+    return pairs
+
 @dataclass
 class ConfigurationStatus:
     test_mode: bool
@@ -65,13 +103,34 @@ class EnvironmentConfig:
             log("⚠️ .env файл не найден, используем системные переменные", "CONFIG")
             load_dotenv()  # Попытка загрузить из текущей директории
         
+        # Логи: общий порог, пороги компонентов (CONFIG=WARN,DEBUG=OFF), формат text|json
+        self.log_level = self._get_env_with_logging("LOG_LEVEL", "INFO", str.upper)
+        self.log_components = self._get_env_with_logging("LOG_COMPONENTS", "")
+        self.log_format = self._get_env_with_logging("LOG_FORMAT", "text", str.lower)
+        self.log_async = self._get_env_with_logging("LOG_ASYNC", "true", str.lower) == "true"
+        # Каждая настройка применяется отдельно: неверный уровень не отменяет формат и пороги
+        # компонентов (сама ошибка попадет в validate_configuration)
+        configure_logging(fmt=self.log_format, async_write=self.log_async)
+        try:
+            configure_logging(level=self.log_level)
+        except ValueError as e:
+            configure_logging(level="INFO")
+            log(f"⚠️ {e} - используется LOG_LEVEL=INFO", "WARN")
+        try:
+            configure_logging(components=self.log_components)
+        except ValueError as e:
+            configure_logging(components="")
+            log(f"⚠️ {e} - LOG_COMPONENTS не применен", "WARN")
+        
         # Загружаем все переменные с логированием
         self.api_key = self._get_env_with_logging("BINANCE_API_KEY", "").strip() or None
         self.api_secret = self._get_env_with_logging("BINANCE_API_SECRET", "").strip() or None
         self.symbol = self._get_env_with_logging("SYMBOL", "BNBUSDT", str.upper)
+        self.portfolio = self._get_env_with_logging("PORTFOLIO", "")
         self.interval = self._get_env_with_logging("INTERVAL", "30m")
         self.ma_short = self._get_env_with_logging("MA_SHORT", "7", int)
         self.ma_long = self._get_env_with_logging("MA_LONG", "25", int)
+        self.ma_type = self._get_env_with_logging("MA_TYPE", "sma", str.lower)
         
         # Критически важная переменная TEST_MODE
         # ВАЖНО: По умолчанию используем тестовый режим для безопасности
@@ -92,6 +151,40 @@ class EnvironmentConfig:
         self.max_retries = self._get_env_with_logging("MAX_RETRIES", "3", int)
         self.health_check_interval = self._get_env_with_logging("HEALTH_CHECK_INTERVAL", "300", int)
         self.min_balance_usdt = self._get_env_with_logging("MIN_BALANCE_USDT", "10.0", float)
+        self.kline_cache_size = self._get_env_with_logging("KLINE_CACHE_SIZE", "500", int)
+        self.market_data_mode = self._get_env_with_logging("MARKET_DATA_MODE", "stream", str.lower)
+        self.binance_ws_url = self._get_env_with_logging("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+        self.exchange_sim_url = self._get_env_with_logging("EXCHANGE_SIM_URL", "").strip()
+        self.api_weight_limit = self._get_env_with_logging("API_WEIGHT_LIMIT", "6000", int)
+        self.schedule_mode = self._get_env_with_logging("SCHEDULE_MODE", "candle", str.lower)
+        self.candle_close_delay_ms = self._get_env_with_logging("CANDLE_CLOSE_DELAY_MS", "500", int)
+        self.intra_candle_band_bps = self._get_env_with_logging("INTRA_CANDLE_BAND_BPS", "2.0", float)
+        self.engine_mode = self._get_env_with_logging("ENGINE_MODE", "async", str.lower)
+        self.http_pool_size = self._get_env_with_logging("HTTP_POOL_SIZE", "10", int)
+        self.http_connect_timeout = self._get_env_with_logging("HTTP_CONNECT_TIMEOUT", "3.05", float)
+        self.http_read_timeout = self._get_env_with_logging("HTTP_READ_TIMEOUT", "10", float)
+        self.http_order_timeout = self._get_env_with_logging("HTTP_ORDER_TIMEOUT", "5", float)
+        self.http_retries = self._get_env_with_logging("HTTP_RETRIES", "2", int)
+        self.http_keepalive_seconds = self._get_env_with_logging("HTTP_KEEPALIVE_SECONDS", "30", float)
+        self.health_stale_seconds = self._get_env_with_logging("HEALTH_STALE_SECONDS", "180", int)
+        self.journal_path = self._get_env_with_logging("JOURNAL_PATH", "journal.db").strip()
+        self.exchange_info_path = self._get_env_with_logging("EXCHANGE_INFO_PATH", "exchange_info.json").strip()
+        self.exchange_info_ttl = self._get_env_with_logging("EXCHANGE_INFO_TTL", "3600", int)
+        self.buy_order_mode = self._get_env_with_logging("BUY_ORDER_MODE", "quote", str.lower)
+        self.execution_mode = self._get_env_with_logging("EXECUTION_MODE", "market", str.lower)
+        self.execution_max_slippage_bps = self._get_env_with_logging("EXECUTION_MAX_SLIPPAGE_BPS", "20", float)
+        self.execution_max_slices = self._get_env_with_logging("EXECUTION_MAX_SLICES", "5", int)
+        self.execution_slice_interval = self._get_env_with_logging("EXECUTION_SLICE_INTERVAL", "1.0", float)
+        self.execution_depth_limit = self._get_env_with_logging("EXECUTION_DEPTH_LIMIT", "100", int)
+        self.order_book_stream = self._get_env_with_logging("ORDER_BOOK_STREAM", "auto", str.lower)
+        self.order_book_snapshot_limit = self._get_env_with_logging("ORDER_BOOK_SNAPSHOT_LIMIT", "1000", int)
+        self.max_book_spread_bps = self._get_env_with_logging("MAX_BOOK_SPREAD_BPS", "0", float)
+        self.order_confirmation = self._get_env_with_logging("ORDER_CONFIRMATION", "stream", str.lower)
+        self.order_confirm_timeout = self._get_env_with_logging("ORDER_CONFIRM_TIMEOUT", "5.0", float)
+        self.metrics_enabled = self._get_env_with_logging("METRICS_ENABLED", "true", str.lower) == "true"
+        # Токен админских эндпоинтов (профайлер) не логируем
+        self.admin_token = os.getenv("ADMIN_TOKEN", "").strip()
+        log(f"🔧 ENV ADMIN_TOKEN={'установлен' if self.admin_token else 'не задан (админ эндпоинты выключены)'}", "CONFIG")
         
         log("✅ КОНФИГУРАЦИЯ ЗАГРУЖЕНА УСПЕШНО", "CONFIG")
         log("=" * 60, "CONFIG")
@@ -146,6 +239,61 @@ class EnvironmentConfig:
         if not api_keys_present:
             issues.append("API ключи не настроены")
         
+        # Некорректный PORTFOLIO не должен ронять импорт (и gunicorn server:app) - это проблема конфигурации
+        try:
+            self.portfolio_specs = parse_portfolio(self.portfolio, self.interval)
+        except ValueError as e:
+            self.portfolio_specs = []
+            issues.append(str(e))
+        
+        if self.ma_type not in ("sma", "ema", "wma"):
+            issues.append(f"Неизвестный MA_TYPE={self.ma_type} (допустимо: sma, ema, wma)")
+        
+        if self.schedule_mode not in ("candle", "interval"):
+            issues.append(f"Неизвестный SCHEDULE_MODE={self.schedule_mode} (допустимо: candle, interval)")
+        
+        if self.engine_mode not in ("async", "sync"):
+            issues.append(f"Неизвестный ENGINE_MODE={self.engine_mode} (допустимо: async, sync)")
+        
+        try:
+            parse_level(self.log_level)
+            parse_components(self.log_components)
+        except ValueError as e:
+            issues.append(str(e))
+        
+        if self.log_format not in ("text", "json"):
+            issues.append(f"Неизвестный LOG_FORMAT={self.log_format} (допустимо: text, json)")
+        
+        if self.health_stale_seconds <= 0:
+            issues.append(f"HEALTH_STALE_SECONDS={self.health_stale_seconds} должен быть больше 0")
+        
+        if self.buy_order_mode not in ("quote", "quantity"):
+            issues.append(f"Неизвестный BUY_ORDER_MODE={self.buy_order_mode} (допустимо: quote, quantity)")
+        
+        if self.execution_mode not in ("market", "book"):
+            issues.append(f"Неизвестный EXECUTION_MODE={self.execution_mode} (допустимо: market, book)")
+        
+        if self.execution_max_slippage_bps <= 0 or self.execution_max_slices < 1:
+            issues.append("EXECUTION_MAX_SLIPPAGE_BPS должен быть больше 0, EXECUTION_MAX_SLICES - не меньше 1")
+        
+        if self.order_book_stream not in ("auto", "on", "off"):
+            issues.append(f"Неизвестный ORDER_BOOK_STREAM={self.order_book_stream} (допустимо: auto, on, off)")
+        
+        if self.order_book_snapshot_limit not in (5, 10, 20, 50, 100, 500, 1000, 5000):
+            issues.append(f"ORDER_BOOK_SNAPSHOT_LIMIT={self.order_book_snapshot_limit} (допустимо: 5, 10, 20, 50, 100, 500, 1000, 5000)")
+        
+        if self.max_book_spread_bps < 0:
+            issues.append(f"MAX_BOOK_SPREAD_BPS={self.max_book_spread_bps} не может быть отрицательным (0 - фильтр выключен)")
+        
+        if self.order_confirmation not in ("stream", "response"):
+            issues.append(f"Неизвестный ORDER_CONFIRMATION={self.order_confirmation} (допустимо: stream, response)")
+        
+        if self.order_confirm_timeout <= 0:
+            issues.append(f"ORDER_CONFIRM_TIMEOUT={self.order_confirm_timeout} должен быть больше 0")
+        
+        if self.exchange_info_ttl <= 0:
+            issues.append(f"EXCHANGE_INFO_TTL={self.exchange_info_ttl} должен быть больше 0")
+        
         # Логируем критически важную информацию о режиме торговли
         log("=" * 60, "CONFIG")
         if self.test_mode:
@@ -403,6 +551,40 @@ class SafetyValidator:
         issues = self.perform_safety_checks(client, usdt_balance, base_balance, current_price)
         return len(issues) == 0
 
+# ========== Метрики ==========
+from app import metrics
+from app.metrics import REGISTRY, SLIPPAGE_BPS_BUCKETS, STALENESS_BUCKETS, timed
+
+CYCLE_SECONDS = REGISTRY.histogram("bot_cycle_duration_seconds", "Длительность торгового цикла", ("engine",))
+BINANCE_SECONDS = REGISTRY.histogram("binance_request_duration_seconds", "Задержка запросов к Binance",
+                                     ("endpoint", "outcome"))
+CALL_SECONDS = REGISTRY.histogram("bot_call_duration_seconds", "Длительность операций цикла", ("operation",))
+ORDER_FILL_SECONDS = REGISTRY.histogram("bot_order_fill_seconds", "От отправки рыночного ордера до подтверждения исполнения",
+                                        ("side", "status"))
+KLINE_STALENESS = REGISTRY.histogram("bot_kline_staleness_seconds", "Возраст данных свечей в момент решения",
+                                     ("symbol",), STALENESS_BUCKETS)
+EXECUTION_SLIPPAGE = REGISTRY.histogram("bot_execution_slippage_bps", "Реализованное проскальзывание переключения",
+                                        ("side", "mode"), SLIPPAGE_BPS_BUCKETS)
+RETRIES = REGISTRY.counter("bot_retries_total", "Неудачные попытки в retry_on_error", ("reason",))
+RETRIES_EXHAUSTED = REGISTRY.counter("bot_retries_exhausted_total", "Операции, не выполненные после всех попыток")
+
+def observe_binance_request(name: str, seconds: float, ok: bool):
+    BINANCE_SECONDS.observe(seconds, endpoint=name, outcome="ok" if ok else "error")
+
+def observe_order(side: str, started: float, order: Dict[str, Any]):
+    ORDER_FILL_SECONDS.observe(time.perf_counter() - started, side=side, status=order.get("status", "UNKNOWN"))
+
+def report_execution(symbol: str, report: "ExecutionReport"):
+    """Реализованное проскальзывание переключения в лог и метрики"""
+    slippage = report.slippage_bps
+    if slippage is None:
+        log(f"📐 ИСПОЛНЕНИЕ {symbol} {report.side}: ничего не исполнено ({report.reason})", "EXECUTION")
+        return
+    EXECUTION_SLIPPAGE.observe(slippage, side=report.side, mode=report.mode)
+    log(f"📐 ИСПОЛНЕНИЕ {symbol} {report.side}: {report.filled_qty:.8f} за {report.quote:.2f} USDT, "
+        f"средняя {report.avg_price:.4f} vs опорная {report.reference_price:.4f} = {slippage:+.2f} bps "
+        f"({report.slices} орд., {report.mode}, {report.reason})", "EXECUTION")
+
 # ========== Простая логика переключения активов ==========
 class AssetSwitcher:
     """Простой класс для переключения между активами по MA сигналам"""
@@ -415,6 +597,10 @@ class AssetSwitcher:
         self.last_switch_time = 0
         self.min_switch_interval = 10  # минимум 10 секунд между переключениями
         self.trading_mode_controller = trading_mode_controller
+        self.last_orders: List[Dict[str, Any]] = []  # ответы биржи последнего переключения
+        self.last_execution: Optional["ExecutionReport"] = None
+        # Переключение по стакану исполнено частично: к какому активу его нужно довести
+        self.unfinished_to: Optional[str] = None
     
     def should_hold_base(self, ma_short: float, ma_long: float) -> bool:
         """Определить, должны ли мы держать базовый актив (коин)"""
@@ -425,50 +611,114 @@ class AssetSwitcher:
         usdt_value = usdt_balance
         base_value = base_balance * current_price
         
+        debug = log_enabled("DEBUG")
+        
         # Логируем детали для диагностики
-        log(f"🔍 ОПРЕДЕЛЕНИЕ АКТИВА: USDT=${usdt_value:.2f}, {self.base_asset}=${base_value:.2f}", "DEBUG")
+        if debug:
+            log(f"🔍 ОПРЕДЕЛЕНИЕ АКТИВА: USDT=${usdt_value:.2f}, {self.base_asset}=${base_value:.2f}", "DEBUG")
         
         # Считаем что держим тот актив, которого больше по стоимости
         # Используем более низкий порог для определения
         if base_value > usdt_value and base_value > 1.0:  # минимум $1
-            log(f"🔍 РЕЗУЛЬТАТ: Держим {self.base_asset} (${base_value:.2f} > ${usdt_value:.2f})", "DEBUG")
+            if debug:
+                log(f"🔍 РЕЗУЛЬТАТ: Держим {self.base_asset} (${base_value:.2f} > ${usdt_value:.2f})", "DEBUG")
             return self.base_asset
         else:
-            log(f"🔍 РЕЗУЛЬТАТ: Держим {self.quote_asset} (${usdt_value:.2f} >= ${base_value:.2f})", "DEBUG")
+            if debug:
+                log(f"🔍 РЕЗУЛЬТАТ: Держим {self.quote_asset} (${usdt_value:.2f} >= ${base_value:.2f})", "DEBUG")
             return self.quote_asset
     
+    def resume_unfinished(self, current_asset: str, should_hold: str, usdt_balance: float,
+                          base_balance: float, current_price: float, min_notional: float) -> str:
+        """Текущий актив с учетом недоисполненного переключения
+        
+        После частичного исполнения большая часть стоимости может уже быть в целевом активе, и
+        get_current_asset_preference считает переключение законченным. Пока остаток исходного
+        актива не меньше min_notional и сигнал не сменился, исходным считается он.
+        """
+        if self.unfinished_to is None:
+            return current_asset
+        source = self.quote_asset if self.unfinished_to == self.base_asset else self.base_asset
+        leftover = usdt_balance if source == self.quote_asset else base_balance * current_price
+        if self.unfinished_to != should_hold or leftover < min_notional:
+            self.unfinished_to = None
+            return current_asset
+        log(f"🧩 ДОИСПОЛНЕНИЕ: остаток {source} на ${leftover:.2f} после частичного переключения", "SWITCH")
+        return source
+    
     def need_to_switch(self, current_asset: str, should_hold: str) -> bool:
         """Нужно ли переключать актив"""
         current_time = time.time()
         time_since_last = current_time - self.last_switch_time
+        debug = log_enabled("DEBUG")
         
-        log(f"🔍 ПРОВЕРКА ПЕРЕКЛЮЧЕНИЯ: current='{current_asset}', should='{should_hold}', time_since_last={time_since_last:.1f}s", "DEBUG")
+        if debug:
+            log(f"🔍 ПРОВЕРКА ПЕРЕКЛЮЧЕНИЯ: current='{current_asset}', should='{should_hold}', time_since_last={time_since_last:.1f}s", "DEBUG")
         
-        # Проверяем кулдаун
-        if time_since_last < self.min_switch_interval:
-            log(f"🔍 КУЛДАУН АКТИВЕН: {time_since_last:.1f}s < {self.min_switch_interval}s", "DEBUG")
+        # Проверяем кулдаун (доисполнение частичного переключения - не смена направления)
+        if time_since_last < self.min_switch_interval and self.unfinished_to != should_hold:
+            if debug:
+                log(f"🔍 КУЛДАУН АКТИВЕН: {time_since_last:.1f}s < {self.min_switch_interval}s", "DEBUG")
             return False
         
         assets_different = current_asset != should_hold
-        log(f"🔍 АКТИВЫ РАЗНЫЕ: {assets_different}", "DEBUG")
+        if debug:
+            log(f"🔍 АКТИВЫ РАЗНЫЕ: {assets_different}", "DEBUG")
         
         return assets_different
     
-    def execute_switch(self, from_asset: str, to_asset: str, balance: float, current_price: float, step: float) -> bool:
+    @timed(CALL_SECONDS, operation="execute_switch")
+    def execute_switch(self, from_asset: str, to_asset: str, balance: float, current_price: float,
+                       filters: "SymbolFilters") -> bool:
         """Выполнить переключение актива"""
-        try:
-            if from_asset == self.base_asset and to_asset == self.quote_asset:
-                # Продаем коин за USDT
-                return self._sell_base_for_usdt(balance, step)
-            elif from_asset == self.quote_asset and to_asset == self.base_asset:
-                # Покупаем коин за USDT
-                return self._buy_base_with_usdt(balance, current_price, step)
+        self.last_orders = []
+        self.last_execution = None
+        self.unfinished_to = None
+        if from_asset == self.base_asset and to_asset == self.quote_asset:
+            side = "SELL"   # продаем коин за USDT
+        elif from_asset == self.quote_asset and to_asset == self.base_asset:
+            side = "BUY"    # покупаем коин за USDT
+        else:
             return False
+        try:
+            if EXECUTION_MODE == "book" and not TEST_MODE and self.client:
+                success = self._execute_on_book(side, balance, filters)
+            elif side == "SELL":
+                success = self._sell_base_for_usdt(balance, filters)
+            else:
+                success = self._buy_base_with_usdt(balance, current_price, filters)
         except Exception as e:
             log(f"Ошибка переключения {from_asset} -> {to_asset}: {e}", "ERROR")
+            success = False
+        if self.last_orders and self.last_execution is None:
+            self.last_execution = report_from_orders(side, self.last_orders, balance, current_price)
+        if self.last_execution:
+            report_execution(self.symbol, self.last_execution)
+        return success
+    
+    def _execute_on_book(self, side: str, balance: float, filters: "SymbolFilters") -> bool:
+        """IOC ордера частями по стакану в пределах EXECUTION_MAX_SLIPPAGE_BPS"""
+        amount = balance * 0.999 if side == "SELL" else balance   # как и рыночная продажа
+        executor = BookExecutor(self.client, self.symbol, filters, lambda: get_depth(self.symbol),
+                                EXECUTION_MAX_SLIPPAGE_BPS, EXECUTION_MAX_SLICES, EXECUTION_SLICE_INTERVAL)
+        try:
+            report = executor.execute(side, amount)
+        except Exception as e:
+            log(f"❌ ОШИБКА ИСПОЛНЕНИЯ {side}: {e}", "ERROR")
+            on_filter_failure(e)
+            report = executor.report or ExecutionReport(side, "book", amount, 0.0, reason=str(e))
+        # Исполненные части учитываются, даже если следующая часть упала
+        self.last_execution = report
+        self.last_orders = list(report.orders)
+        if not report.filled_qty:
             return False
+        if report.reason != "исполнено":
+            self.unfinished_to = self.quote_asset if side == "SELL" else self.base_asset
+            log(f"⚠️ {self.symbol} {side}: исполнено частично ({report.reason}), остаток - в следующем цикле", "WARN")
+        self.last_switch_time = time.time()
+        return True
     
-    def _sell_base_for_usdt(self, base_qty: float, step: float) -> bool:
+    def _sell_base_for_usdt(self, base_qty: float, filters: "SymbolFilters") -> bool:
         """Продать весь базовый актив за USDT"""
         if TEST_MODE:
             prefix = self.trading_mode_controller.get_trade_operation_prefix() if self.trading_mode_controller else "🧪 TEST"
@@ -480,27 +730,24 @@ class AssetSwitcher:
             log(f"❌ Нет подключения к Binance API", "ERROR")
             return False
         
-        # Округляем количество согласно требованиям биржи
-        qty = round_step(base_qty * 0.999, step)  # 99.9% для учета комиссий
+        # Количество строкой, кратной stepSize - биржа примет его без повторов по точности
+        qty = filters.quantizer.qty(base_qty * 0.999)  # 99.9% для учета комиссий
+        qty_str = format(qty, "f")
         
-        log(f"🔢 РАСЧЕТ ПРОДАЖИ: Исходное количество={base_qty:.6f}, После округления={qty} (step={step})", "CALC")
+        log(f"🔢 РАСЧЕТ ПРОДАЖИ: Исходное количество={base_qty:.6f}, После округления={qty_str} (step={filters.quantizer.step})", "CALC")
         
-        if qty <= 0:
-            log(f"❌ Количество для продажи слишком мало: {qty}", "WARN")
+        if qty <= 0 or qty < filters.min_qty:
+            log(f"❌ Количество для продажи слишком мало: {qty_str} (минимум {filters.min_qty})", "WARN")
             return False
         
         try:
-            # Преобразуем количество в строку с подходящей точностью
-            precision = 0
-            step_str = str(step)
-            if '.' in step_str:
-                precision = len(step_str.split('.')[-1])
-            
-            # Используем строковое представление для точного соответствия требованиям Binance
-            qty_str = '{:.{}f}'.format(qty, precision)
-            log(f"📤 ОТПРАВКА ОРДЕРА НА ПРОДАЖУ: {qty_str} {self.base_asset} (форматировано с точностью {precision})", "ORDER")
+            log(f"📤 ОТПРАВКА ОРДЕРА НА ПРОДАЖУ: {qty_str} {self.base_asset}", "ORDER")
             
-            order = self.client.order_market_sell(symbol=self.symbol, quantity=qty_str)
+            started = time.perf_counter()
+            order = confirm_order(self.client.order_market_sell(symbol=self.symbol, quantity=qty_str,
+                                                                **order_response_params()))
+            observe_order("SELL", started, order)
+            self.last_orders = [order]
             
             # Подробная информация об ордере
             if 'fills' in order and order['fills']:
@@ -514,26 +761,13 @@ class AssetSwitcher:
             return True
         except BinanceAPIException as e:
             log(f"❌ ОШИБКА ПРОДАЖИ: {e}", "ERROR")
-            # Пробуем с меньшей точностью при ошибке о большой точности
-            if "слишком большую точность" in str(e) and precision > 0:
-                try:
-                    # Пробуем с меньшей точностью
-                    new_precision = max(0, precision - 1)
-                    qty_str = '{:.{}f}'.format(qty, new_precision)
-                    log(f"🔄 ПОВТОРНАЯ ПОПЫТКА с меньшей точностью {new_precision}: {qty_str}", "RETRY")
-                    
-                    order = self.client.order_market_sell(symbol=self.symbol, quantity=qty_str)
-                    log(f"✅ ПРОДАЖА ВЫПОЛНЕНА со второй попытки: {qty_str} {self.base_asset} -> USDT", "TRADE")
-                    self.last_switch_time = time.time()
-                    return True
-                except Exception as retry_e:
-                    log(f"❌ ОШИБКА при повторной попытке: {retry_e}", "ERROR")
+            on_filter_failure(e)
             return False
         except Exception as e:
             log(f"❌ ОШИБКА ПРОДАЖИ: {e}", "ERROR")
             return False
     
-    def _buy_base_with_usdt(self, usdt_amount: float, current_price: float, step: float) -> bool:
+    def _buy_base_with_usdt(self, usdt_amount: float, current_price: float, filters: "SymbolFilters") -> bool:
         """Купить базовый актив за весь USDT"""
         if TEST_MODE:
             qty = usdt_amount / current_price
@@ -546,59 +780,75 @@ class AssetSwitcher:
             log(f"❌ Нет подключения к Binance API", "ERROR")
             return False
         
+        if BUY_ORDER_MODE == "quote" and filters.quote_order_allowed:
+            return self._buy_quote_order(usdt_amount, filters)
+        
         # Рассчитываем количество с учетом комиссий
         usdt_to_spend = usdt_amount * 0.999  # 99.9% для учета комиссий
-        qty = round_step(usdt_to_spend / current_price, step)
+        qty = filters.quantizer.qty(usdt_to_spend / current_price)
+        qty_str = format(qty, "f")
         
-        # Определяем точность
-        precision = 0
-        step_str = str(step)
-        if '.' in step_str:
-            precision = len(step_str.split('.')[-1])
-            
-        log(f"🔢 РАСЧЕТ ПОКУПКИ: USDT={usdt_amount:.2f}, К трате={usdt_to_spend:.2f}, Цена={current_price:.4f}, Количество={qty} (step={step}, precision={precision})", "CALC")
+        log(f"🔢 РАСЧЕТ ПОКУПКИ: USDT={usdt_amount:.2f}, К трате={usdt_to_spend:.2f}, Цена={current_price:.4f}, Количество={qty_str} (step={filters.quantizer.step})", "CALC")
         
-        if qty <= 0 or usdt_to_spend < 10:  # минимум $10
-            log(f"❌ Сумма для покупки слишком мала: {usdt_to_spend:.2f} USDT (минимум $10)", "WARN")
+        if qty <= 0 or qty < filters.min_qty or (filters.apply_min_to_market and usdt_to_spend < filters.min_notional):
+            log(f"❌ Сумма для покупки слишком мала: {usdt_to_spend:.2f} USDT (минимум {filters.min_notional} USDT, "
+                f"{filters.min_qty} {self.base_asset})", "WARN")
             return False
         
         try:
-            # Используем строковое представление для точного соответствия требованиям Binance
-            qty_str = '{:.{}f}'.format(qty, precision)
-            
             log(f"📤 ОТПРАВКА ОРДЕРА НА ПОКУПКУ: {qty_str} {self.base_asset} за {usdt_to_spend:.2f} USDT", "ORDER")
-            order = self.client.order_market_buy(symbol=self.symbol, quantity=qty_str)
-            
-            # Подробная информация об ордере
-            if 'fills' in order and order['fills']:
-                total_cost = sum(float(fill['price']) * float(fill['qty']) for fill in order['fills'])
-                avg_price = total_cost / float(order['executedQty']) if float(order['executedQty']) > 0 else 0
-                log(f"✅ ПОКУПКА ВЫПОЛНЕНА: {order['executedQty']} {self.base_asset} за {total_cost:.2f} USDT (средняя цена: {avg_price:.4f})", "TRADE")
-            else:
-                log(f"✅ ПОКУПКА ВЫПОЛНЕНА: {usdt_to_spend:.2f} USDT -> {qty_str} {self.base_asset}", "TRADE")
+            started = time.perf_counter()
+            order = confirm_order(self.client.order_market_buy(symbol=self.symbol, quantity=qty_str,
+                                                               **order_response_params()))
+            observe_order("BUY", started, order)
+            self.last_orders = [order]
+            self._log_buy_fill(order)
             
             self.last_switch_time = time.time()
             return True
         except BinanceAPIException as e:
             log(f"❌ ОШИБКА ПОКУПКИ: {e}", "ERROR")
-            # Пробуем с меньшей точностью при ошибке о большой точности
-            if "слишком большую точность" in str(e) and precision > 0:
-                try:
-                    # Пробуем с меньшей точностью
-                    new_precision = max(0, precision - 1)
-                    qty_str = '{:.{}f}'.format(qty, new_precision)
-                    log(f"🔄 ПОВТОРНАЯ ПОПЫТКА с меньшей точностью {new_precision}: {qty_str}", "RETRY")
-                    
-                    order = self.client.order_market_buy(symbol=self.symbol, quantity=qty_str)
-                    log(f"✅ ПОКУПКА ВЫПОЛНЕНА со второй попытки: {qty_str} {self.base_asset}", "TRADE")
-                    self.last_switch_time = time.time()
-                    return True
-                except Exception as retry_e:
-                    log(f"❌ ОШИБКА при повторной попытке: {retry_e}", "ERROR")
+            on_filter_failure(e)
             return False
         except Exception as e:
             log(f"❌ ОШИБКА ПОКУПКИ: {e}", "ERROR")
             return False
+    
+    def _buy_quote_order(self, usdt_amount: float, filters: "SymbolFilters") -> bool:
+        """Купить на точную сумму USDT (quoteOrderQty): количество считает биржа по текущей цене"""
+        # Комиссия покупки списывается в базовом активе, поэтому тратим весь USDT
+        spend = filters.quantizer.quote(usdt_amount)
+        spend_str = format(spend, "f")
+        
+        log(f"🔢 РАСЧЕТ ПОКУПКИ: USDT={usdt_amount:.2f}, К трате={spend_str} (quoteOrderQty)", "CALC")
+        
+        if spend <= 0 or (filters.apply_min_to_market and spend < filters.min_notional):
+            log(f"❌ Сумма для покупки слишком мала: {spend_str} USDT (минимум {filters.min_notional} USDT)", "WARN")
+            return False
+        
+        try:
+            log(f"📤 ОТПРАВКА ОРДЕРА НА ПОКУПКУ: {self.base_asset} на {spend_str} USDT", "ORDER")
+            started = time.perf_counter()
+            order = confirm_order(self.client.order_market_buy(symbol=self.symbol, quoteOrderQty=spend_str,
+                                                               **order_response_params()))
+            observe_order("BUY", started, order)
+            self.last_orders = [order]
+            self._log_buy_fill(order)
+            self.last_switch_time = time.time()
+            return True
+        except BinanceAPIException as e:
+            log(f"❌ ОШИБКА ПОКУПКИ: {e}", "ERROR")
+            on_filter_failure(e)
+            return False
+        except Exception as e:
+            log(f"❌ ОШИБКА ПОКУПКИ: {e}", "ERROR")
+            return False
+    
+    def _log_buy_fill(self, order: Dict):
+        fill = fill_summary(order)
+        commissions = ", ".join(f"{v:.8f} {a}" for a, v in fill["commissions"].items()) or "нет данных"
+        log(f"✅ ПОКУПКА ВЫПОЛНЕНА: {fill['qty']:.8f} {self.base_asset} за {fill['quote']:.2f} USDT "
+            f"(средняя цена: {fill['avg_price']:.4f}, комиссия: {commissions})", "TRADE")
 
 # ========== Инициализация конфигурации ==========
 env_config = EnvironmentConfig()
@@ -610,9 +860,12 @@ env_config.log_configuration_status()
 API_KEY = env_config.api_key
 API_SECRET = env_config.api_secret
 SYMBOL = env_config.symbol
+PORTFOLIO = env_config.portfolio
+PORTFOLIO_SPECS = env_config.portfolio_specs
 INTERVAL = env_config.interval
 MA_SHORT = env_config.ma_short
 MA_LONG = env_config.ma_long
+MA_TYPE = env_config.ma_type
 TEST_MODE = env_config.test_mode
 CHECK_INTERVAL = env_config.check_interval
 STATE_PATH = env_config.state_path
@@ -620,6 +873,33 @@ MA_SPREAD_BPS = env_config.ma_spread_bps
 MAX_RETRIES = env_config.max_retries
 HEALTH_CHECK_INTERVAL = env_config.health_check_interval
 MIN_BALANCE_USDT = env_config.min_balance_usdt
+KLINE_CACHE_SIZE = env_config.kline_cache_size
+MARKET_DATA_MODE = env_config.market_data_mode
+BINANCE_WS_URL = env_config.binance_ws_url
+EXCHANGE_SIM_URL = env_config.exchange_sim_url
+API_WEIGHT_LIMIT = env_config.api_weight_limit
+SCHEDULE_MODE = env_config.schedule_mode
+CANDLE_CLOSE_DELAY_MS = env_config.candle_close_delay_ms
+INTRA_CANDLE_BAND_BPS = env_config.intra_candle_band_bps
+ENGINE_MODE = env_config.engine_mode
+HEALTH_STALE_SECONDS = env_config.health_stale_seconds
+JOURNAL_PATH = env_config.journal_path
+EXCHANGE_INFO_PATH = env_config.exchange_info_path
+EXCHANGE_INFO_TTL = env_config.exchange_info_ttl
+BUY_ORDER_MODE = env_config.buy_order_mode
+EXECUTION_MODE = env_config.execution_mode
+EXECUTION_MAX_SLIPPAGE_BPS = env_config.execution_max_slippage_bps
+EXECUTION_MAX_SLICES = env_config.execution_max_slices
+EXECUTION_SLICE_INTERVAL = env_config.execution_slice_interval
+EXECUTION_DEPTH_LIMIT = env_config.execution_depth_limit
+ORDER_BOOK_STREAM = env_config.order_book_stream
+ORDER_BOOK_SNAPSHOT_LIMIT = env_config.order_book_snapshot_limit
+MAX_BOOK_SPREAD_BPS = env_config.max_book_spread_bps
+ORDER_CONFIRMATION = env_config.order_confirmation
+ORDER_CONFIRM_TIMEOUT = env_config.order_confirm_timeout
+METRICS_ENABLED = env_config.metrics_enabled
+ADMIN_TOKEN = env_config.admin_token
+metrics.set_enabled(METRICS_ENABLED)
 
 app = Flask(__name__)
 
@@ -631,7 +911,6 @@ safety_validator: Optional[SafetyValidator] = None
 running = False
 last_action_ts = 0
 last_health_check = 0
-error_count = 0
 
 bot_status = {
     "status": "idle", 
@@ -652,36 +931,95 @@ bot_status = {
 }
 
 # ========== Персистентное состояние ==========
-def load_state():
-    global bot_status
-    if os.path.exists(STATE_PATH):
-        try:
-            with open(STATE_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                bot_status.update(data)
-                log("Состояние загружено из state.json", "STATE")
-        except Exception as e:
-            log(f"Не удалось загрузить состояние: {e}", "WARN")
+from app.persistence import get_state_store
+
+def load_state(status: Optional[Dict[str, Any]] = None, path: Optional[str] = None):
+    status = bot_status if status is None else status
+    path = path or STATE_PATH
+    try:
+        data = get_state_store(path).load()
+        if data:
+            status.update(data)
+            log(f"Состояние загружено из {path}", "STATE")
+    except Exception as e:
+        log(f"Не удалось загрузить состояние: {e}", "WARN")
 
-def save_state():
+def save_state(status: Optional[Dict[str, Any]] = None, path: Optional[str] = None):
+    """Записать состояние, если изменилось что-то кроме цен/MA/uptime (атомарно)"""
+    status = bot_status if status is None else status
     try:
-        bot_status["last_update"] = datetime.now(timezone.utc).isoformat()
-        with open(STATE_PATH, "w", encoding="utf-8") as f:
-            json.dump(bot_status, f, ensure_ascii=False, indent=2)
+        status["last_update"] = datetime.now(timezone.utc).isoformat()
+        get_state_store(path or STATE_PATH).save(status)
     except Exception as e:
         log(f"Не удалось сохранить состояние: {e}", "WARN")
 
+# ========== Журнал сделок ==========
+from app.journal import EVENT_KINDS, TradeJournal
+
+journal: Optional[TradeJournal] = None
+journal_lock = threading.Lock()
+
+def open_journal() -> Optional[TradeJournal]:
+    """SQLite журнал сигналов/ордеров/балансов (JOURNAL_PATH пустой - выключен)"""
+    global journal
+    with journal_lock:
+        if journal is None and JOURNAL_PATH:
+            try:
+                journal = TradeJournal(JOURNAL_PATH)
+            except Exception as e:
+                log(f"Журнал сделок недоступен: {e}", "WARN")
+        return journal
+
+def journal_record(kind: str, symbol: str, **fields):
+    if journal:
+        journal.record(kind, symbol, **fields)
+
 # ========== Binance клиент ==========
+from app.rate_limit import RateLimitedClient, WeightLimiter
+from app.transport import KeepAliveWarmer, TransportConfig, connection_stats, install_transport
+
+# Один лимитер на процесс: вес запросов Binance считается на IP
+rate_limiter = WeightLimiter(API_WEIGHT_LIMIT)
+
+TRANSPORT_CONFIG = TransportConfig(
+    pool_size=env_config.http_pool_size,
+    connect_timeout=env_config.http_connect_timeout,
+    read_timeout=env_config.http_read_timeout,
+    order_read_timeout=env_config.http_order_timeout,
+    market_read_timeout=min(env_config.http_read_timeout, env_config.http_order_timeout),
+    retries=env_config.http_retries,
+    keepalive_seconds=env_config.http_keepalive_seconds,
+)
+http_warmer: Optional[KeepAliveWarmer] = None
+
+def start_http_warmer():
+    """Прогрев соединения только пока работает торговый цикл (создается в init_client)"""
+    if http_warmer:
+        http_warmer.start()
+
+def stop_http_warmer():
+    # Остановленный бот не должен тратить вес запросов на ping
+    if http_warmer:
+        http_warmer.stop()
+
 def init_client():
-    global client, asset_switcher, trading_mode_controller
+    global client, asset_switcher, trading_mode_controller, http_warmer
     
     # Создаем контроллер режима торговли
     trading_mode_controller = TradingModeController(env_config)
     trading_mode_controller.log_trading_mode_status()
     
-    if API_KEY and API_SECRET:
+    if EXCHANGE_SIM_URL or (API_KEY and API_SECRET):
         try:
-            client = Client(API_KEY, API_SECRET)
+            if EXCHANGE_SIM_URL:
+                # Локальный симулятор биржи (app/exchange_sim.py): ордера не уходят на Binance
+                from app.exchange_sim import SimulatedClient
+                client = SimulatedClient(EXCHANGE_SIM_URL, API_KEY or "sim", API_SECRET or "sim")
+                log(f"🏦 Используется симулятор биржи {EXCHANGE_SIM_URL}", "CONFIG")
+            else:
+                client = Client(API_KEY, API_SECRET)
+            install_transport(client, TRANSPORT_CONFIG)
+            client = RateLimitedClient(client, rate_limiter, observe_binance_request)
             # синхронизация времени
             server_time = client.get_server_time()
             local_time = int(time.time() * 1000)
@@ -693,6 +1031,11 @@ def init_client():
             client.ping()
             asset_switcher = AssetSwitcher(client, SYMBOL, trading_mode_controller)
             
+            # Держим соединение теплым: TLS рукопожатие не должно попадать на отправку ордера
+            stop_http_warmer()
+            http_warmer = KeepAliveWarmer(client.ping, TRANSPORT_CONFIG.keepalive_seconds)
+            http_warmer.start()
+            
             log("Подключение к Binance успешно", "SUCCESS")
             bot_status["status"] = "connected"
             return True
@@ -709,49 +1052,86 @@ def init_client():
         return False
 
 # ========== Информация по символу и округление ==========
-def get_symbol_filters(symbol: str):
-    if not client:
-        return 0.001, 0.01, 0.001, 10.0
-    
-    try:
-        info = client.get_symbol_info(symbol)
-        if not info:
-            raise RuntimeError(f"Не найден символ {symbol}")
-        
-        lot = next(f for f in info["filters"] if f["filterType"] == "LOT_SIZE")
-        pricef = next(f for f in info["filters"] if f["filterType"] == "PRICE_FILTER")
-        min_notional = next((f for f in info["filters"] if f["filterType"] == "MIN_NOTIONAL"), None)
-        
-        step = float(lot["stepSize"])
-        tick = float(pricef["tickSize"])
-        min_qty = float(lot["minQty"])
-        min_not = float(min_notional["minNotional"]) if min_notional else 10.0
-        
-        # Подробное логирование фильтров
-        log(f"ФИЛЬТРЫ СИМВОЛА {symbol}:", "INFO")
-        log(f"  - Step Size (LOT_SIZE): {step}", "INFO")
-        log(f"  - Tick Size (PRICE_FILTER): {tick}", "INFO")
-        log(f"  - Min Quantity: {min_qty}", "INFO")
-        log(f"  - Min Notional: {min_not}", "INFO")
-        
-        return step, tick, min_qty, min_not
-    except Exception as e:
-        log(f"Ошибка получения фильтров символа: {e}", "ERROR")
-        return 0.001, 0.01, 0.001, 10.0
+from app.exchange_info import ExchangeInfoCache, SymbolFilters, is_filter_failure
 
-def round_step(qty: float, step: float) -> float:
-    # Определение точности на основе шага
-    precision = 0
-    step_str = str(step)
-    if '.' in step_str:
-        precision = len(step_str.split('.')[-1])
-    
-    rounded = math.floor(qty / step) * step
-    # Форматируем с нужной точностью
-    return float('{:.{}f}'.format(rounded, precision))
+# Фильтры без подключения к бирже (TEST_MODE без ключей) - только для симуляции сделок
+TEST_FILTERS = SymbolFilters("", step_size=0.001, min_qty=0.001, tick_size=0.01, min_notional=10.0)
+
+exchange_info: Optional[ExchangeInfoCache] = None
+
+def get_exchange_info_cache() -> Optional[ExchangeInfoCache]:
+    """Кэш exchangeInfo текущего клиента (создается при первом обращении)"""
+    global exchange_info
+    if client is None:
+        return None
+    if exchange_info is None:
+        exchange_info = ExchangeInfoCache(lambda: client.get_exchange_info(), EXCHANGE_INFO_PATH or None,
+                                          EXCHANGE_INFO_TTL)
+    return exchange_info
+
+def get_symbol_filters(symbol: str) -> SymbolFilters:
+    """Фильтры символа из кэша exchangeInfo; KeyError - фильтры неизвестны"""
+    cache = get_exchange_info_cache()
+    if cache is None:
+        return TEST_FILTERS
+    return cache.get(symbol)
+
+def on_filter_failure(error: Exception):
+    """Ордер отвергнут фильтром (-1013): фильтры могли измениться, перечитать exchangeInfo"""
+    if is_filter_failure(error) and exchange_info is not None:
+        exchange_info.invalidate()
 
-def round_tick(price: float, tick: float) -> float:
-    return round(math.floor(price / tick) * tick, 8)
+# ========== Стакан для исполнения ==========
+from app.execution import BookExecutor, DepthSnapshot, ExecutionReport, parse_depth, report_from_orders
+
+from app.order_book import LocalOrderBook
+from app.streams import DepthStream
+
+# Локальный стакан старше N секунд не используется (поток depth@100ms шлет события постоянно)
+ORDER_BOOK_STALE_SECONDS = 5
+
+order_books: Dict[str, LocalOrderBook] = {}
+depth_stream: Optional[DepthStream] = None
+
+def get_order_book(symbol: str) -> Optional[LocalOrderBook]:
+    """Синхронизированный и свежий локальный стакан символа или None"""
+    book = order_books.get(symbol)
+    if book is None or not book.is_fresh(ORDER_BOOK_STALE_SECONDS):
+        return None
+    return book
+
+def get_depth(symbol: str) -> DepthSnapshot:
+    """Стакан для исполнения: локальный из потока, иначе REST снимок (вес 5 при limit<=100)"""
+    book = get_order_book(symbol)
+    if book is not None:
+        return book.snapshot(EXECUTION_DEPTH_LIMIT)
+    return parse_depth(client.get_order_book(symbol=symbol, limit=EXECUTION_DEPTH_LIMIT))
+
+def order_book_wanted() -> bool:
+    if ORDER_BOOK_STREAM == "auto":
+        return EXECUTION_MODE == "book" or MAX_BOOK_SPREAD_BPS > 0
+    return ORDER_BOOK_STREAM == "on"
+
+def start_depth_stream(symbols: List[str]):
+    """Локальные L2 стаканы: REST снимок + поток <symbol>@depth@100ms"""
+    global depth_stream
+    if not client or MARKET_DATA_MODE != "stream" or EXCHANGE_SIM_URL or not order_book_wanted():
+        return
+    stop_depth_stream()
+    for symbol in symbols:
+        order_books.setdefault(symbol, LocalOrderBook(symbol))
+    depth_stream = DepthStream([order_books[s] for s in symbols],
+                               lambda symbol: client.get_order_book(symbol=symbol, limit=ORDER_BOOK_SNAPSHOT_LIMIT),
+                               BINANCE_WS_URL)
+    depth_stream.start()
+    log(f"📚 Локальный стакан: WebSocket {', '.join(depth_stream.books)}, снимок limit={ORDER_BOOK_SNAPSHOT_LIMIT}", "DATA")
+
+def stop_depth_stream():
+    global depth_stream
+    if depth_stream:
+        depth_stream.stop()
+        depth_stream = None
+    order_books.clear()
 
 def retry_on_error(func, max_retries=MAX_RETRIES, delay=1):
     """Повторяет выполнение функции при ошибках"""
@@ -759,91 +1139,608 @@ def retry_on_error(func, max_retries=MAX_RETRIES, delay=1):
         try:
             return func()
         except (BinanceAPIException, BinanceOrderException) as e:
-            if "Too many requests" in str(e) or "Request rate limit" in str(e):
-                wait_time = delay * (2 ** attempt)
+            if getattr(e, "status_code", None) in (418, 429) or "Too many requests" in str(e) or "Request rate limit" in str(e):
+                RETRIES.inc(reason="rate_limit")
+                # Retry-After уже учтен лимитером; экспонента - если биржа его не прислала
+                wait_time = rate_limiter.backoff_remaining() or delay * (2 ** attempt)
                 log(f"Rate limit, ждем {wait_time}с (попытка {attempt + 1}/{max_retries})", "WARN")
                 time.sleep(wait_time)
             else:
+                RETRIES.inc(reason="binance")
                 log(f"Binance ошибка (попытка {attempt + 1}/{max_retries}): {e}", "ERROR")
                 if attempt < max_retries - 1:
                     time.sleep(delay)
         except Exception as e:
+            RETRIES.inc(reason="unexpected")
             log(f"Неожиданная ошибка (попытка {attempt + 1}/{max_retries}): {e}", "ERROR")
             if attempt < max_retries - 1:
                 time.sleep(delay)
     
+    RETRIES_EXHAUSTED.inc()
     raise RuntimeError(f"Не удалось выполнить операцию после {max_retries} попыток")
 
 # ========== Данные и MA ==========
-BINANCE_INTERVALS = {
-    "1m": Client.KLINE_INTERVAL_1MINUTE,
-    "3m": Client.KLINE_INTERVAL_3MINUTE,
-    "5m": Client.KLINE_INTERVAL_5MINUTE,
-    "15m": Client.KLINE_INTERVAL_15MINUTE,
-    "30m": Client.KLINE_INTERVAL_30MINUTE,
-    "1h": Client.KLINE_INTERVAL_1HOUR,
-    "4h": Client.KLINE_INTERVAL_4HOUR,
-}
+from app.indicators import MovingAverageEngine, get_ma_engine
+from app.market_data import KlineStore, get_kline_store
+from app.streams import KlineStream
+
+# Поток считается живым, если сообщения приходили за последние N секунд
+STREAM_STALE_SECONDS = 30
 
+kline_stream: Optional[KlineStream] = None
+
+@timed(CALL_SECONDS, operation="get_closes")
 def get_closes(symbol: str, interval: str, limit: int = 200):
     if not client:
         import random
         base_price = 600.0 if symbol == "BNBUSDT" else 100.0
         return [base_price + random.uniform(-5, 5) for _ in range(limit)]
     
-    def _get_klines():
-        inter = BINANCE_INTERVALS.get(interval, Client.KLINE_INTERVAL_5MINUTE)
-        klines = client.get_klines(symbol=symbol, interval=inter, limit=limit)
-        return [float(k[4]) for k in klines]
-    
-    return retry_on_error(_get_klines)
+    return refresh_kline_store(symbol, interval, limit).get_closes(limit)
 
-def ma(arr, period):
-    if len(arr) < period:
-        return None
-    return sum(arr[-period:]) / period
+def refresh_kline_store(symbol: str, interval: str, limit: int) -> KlineStore:
+    """Актуальный кэш свечей: история загружается один раз, дальше догружаются только новые.
+    Пока WebSocket поток жив, кэш обновляется им и REST не нужен."""
+    inter = BINANCE_INTERVALS.get(interval, Client.KLINE_INTERVAL_5MINUTE)
+    store = get_kline_store(client, symbol, inter, max(limit, KLINE_CACHE_SIZE))
+    if not (store.loaded and stream_is_live()):
+        retry_on_error(store.refresh)
+    return store
 
-# ========== Балансы ==========
-def get_balances() -> Tuple[float, float]:
+@timed(CALL_SECONDS, operation="get_price_and_mas")
+def get_price_and_mas(symbol: str, interval: str, limit: int) -> Tuple[float, Optional[float], Optional[float]]:
+    """Текущая цена и короткая/длинная MA; MA обновляются инкрементально за O(1)"""
     if not client:
-        return 1000.0, 0.0
+        prices = get_closes(symbol, interval, limit)
+        engine = MovingAverageEngine(MA_SHORT, MA_LONG, MA_TYPE)
+        engine.reset(prices)
+        return prices[-1], *engine.values()
     
-    def _get_balances():
-        base = SYMBOL[:-4] if SYMBOL.endswith("USDT") else SYMBOL.split("USDT")[0]
-        usdt = float(client.get_asset_balance("USDT")["free"])
-        base_bal = float(client.get_asset_balance(base)["free"])
-        return usdt, base_bal
+    store = refresh_kline_store(symbol, interval, limit)
+    if metrics.ENABLED:
+        KLINE_STALENESS.observe(time.time() - max(store.last_refresh, store.last_stream_update), symbol=symbol)
+    engine = get_ma_engine(symbol, store.interval, MA_SHORT, MA_LONG, MA_TYPE)
+    m1, m2 = engine.sync(store)
+    return store.last_close(), m1, m2
+
+def stream_is_live() -> bool:
+    return kline_stream is not None and kline_stream.is_alive(STREAM_STALE_SECONDS)
+
+def start_market_stream(pairs: List[Tuple[str, str]], limit: int):
+    """Запуск одного WebSocket потока свечей на все пары (MARKET_DATA_MODE=stream)"""
+    global kline_stream
+    if not client or MARKET_DATA_MODE != "stream" or EXCHANGE_SIM_URL:
+        log(f"📡 Рыночные данные: REST опрос (MARKET_DATA_MODE={MARKET_DATA_MODE})", "DATA")
+        return
+    stop_market_stream()
+    stores = [
+        get_kline_store(client, symbol, BINANCE_INTERVALS.get(interval, Client.KLINE_INTERVAL_5MINUTE), max(limit, KLINE_CACHE_SIZE))
+        for symbol, interval in pairs
+    ]
+    kline_stream = KlineStream(stores, lambda s: retry_on_error(s.refresh), BINANCE_WS_URL)
+    kline_stream.start()
+    log(f"📡 Рыночные данные: WebSocket {', '.join(kline_stream.stores)}, REST как резерв", "DATA")
+    start_depth_stream(sorted({symbol for symbol, _ in pairs}))
+
+def stop_market_stream():
+    global kline_stream
+    if kline_stream:
+        kline_stream.stop()
+        kline_stream = None
+    stop_depth_stream()
+
+# ========== Снимок состояния для /health и /status ==========
+from app.status_board import StatusBoard
+
+# HTTP обработчики читают только опубликованный снимок: без сети и без блокировок бота
+status_board = StatusBoard()
+
+def publish_status():
+    """Опубликовать состояние бота (вызывается из торгового потока после цикла)"""
+    status_board.publish({
+        # Верхнеуровневые поля /status - те же, что до перехода на снимок
+        "symbol": SYMBOL,
+        "mode": "TEST" if TEST_MODE else "LIVE",
+        "status": bot_status.get("status", "idle"),
+        "current_asset": bot_status.get("current_asset", "USDT"),
+        "should_hold": bot_status.get("should_hold", "USDT"),
+        "current_price": bot_status.get("current_price", 0.0),
+        "balance_usdt": bot_status.get("balance_usdt", 0.0),
+        "balance_base": bot_status.get("balance_base", 0.0),
+        "ma_short": bot_status.get("ma_short", 0.0),
+        "ma_long": bot_status.get("ma_long", 0.0),
+        "error_count": bot_status.get("error_count", 0),
+        "uptime": bot_status.get("uptime", 0),
+        "switches_count": bot_status.get("switches_count", 0),
+        "last_switch": bot_status.get("last_switch"),
+        "last_update": bot_status.get("last_update"),
+        "running": running,
+        "portfolio": {
+            key: {
+                "status": r.status.get("status", "idle"),
+                "current_asset": r.status.get("current_asset", "USDT"),
+                "should_hold": r.status.get("should_hold", "USDT"),
+                "error_count": r.error_count,
+                "switches_count": r.status.get("switches_count", 0)
+            }
+            for key, r in portfolio.runners.items()
+        } if portfolio else None,
+        "rate_limit": rate_limiter.stats(),
+        "balances": balance_service.stats(),
+        "transport": connection_stats(client.session) if client else None,
+        "cycle_latency": cycle_engine.stats() if cycle_engine else None,
+        "journal": journal.stats() if journal else None,
+        "exchange_info": exchange_info.stats() if exchange_info else None,
+        "orders": order_tracker.stats(),
+        "order_books": {symbol: book.stats() for symbol, book in order_books.items()} or None
+    })
+
+def loop_stopped() -> bool:
+    """Проверка остановки во время ожидания; заодно пульс торгового потока для /health"""
+    status_board.heartbeat()
+    return not running
+
+def health_stale_after() -> int:
+    """Сколько секунд без пульса считать зависанием (фиксированная пауза тоже не пульсирует)"""
+    return max(HEALTH_STALE_SECONDS, 2 * CHECK_INTERVAL)
+
+# ========== Планировщик циклов ==========
+from app.scheduler import CandleScheduler
+
+scheduler: Optional[CandleScheduler] = None
+
+def start_scheduler(intervals: List[str]):
+    """Цикл по закрытию свечей (SCHEDULE_MODE=candle) с учетом смещения времени сервера"""
+    global scheduler
+    if SCHEDULE_MODE != "candle":
+        scheduler = None
+        log(f"⏰ Планировщик: фиксированная пауза {CHECK_INTERVAL}с (SCHEDULE_MODE={SCHEDULE_MODE})", "SCHED")
+        return
+    scheduler = CandleScheduler(
+        [i if i in BINANCE_INTERVALS else "5m" for i in intervals],
+        CANDLE_CLOSE_DELAY_MS,
+        lambda: getattr(client, "timestamp_offset", 0) if client else 0,
+    )
+    log(f"⏰ Планировщик: закрытие свечей {', '.join(sorted(set(intervals)))}, "
+        f"промежуточные проверки при спреде <= {MA_SPREAD_BPS + INTRA_CANDLE_BAND_BPS}б.п.", "SCHED")
+
+def wait_next_cycle(near_threshold: bool = False):
+    """Пауза до следующего цикла: до закрытия свечи, а у порога сигнала - не дольше CHECK_INTERVAL"""
+    event = kline_stream.candle_closed if stream_is_live() else None
+    if scheduler is None:
+        log(f"😴 ОЖИДАНИЕ {CHECK_INTERVAL} секунд до следующего цикла...", "SLEEP")
+        if event is not None:
+            if event.wait(CHECK_INTERVAL):
+                event.clear()
+                log("🕯️ Свеча закрыта - внеочередной цикл", "DATA")
+        else:
+            time.sleep(CHECK_INTERVAL)
+        return
     
-    return retry_on_error(_get_balances)
+    until_close = scheduler.seconds_until_close()
+    if near_threshold and CHECK_INTERVAL < until_close:
+        log(f"😴 Спред у порога: проверка через {CHECK_INTERVAL}с (до закрытия свечи {until_close:.0f}с)", "SLEEP")
+    else:
+        log(f"😴 ОЖИДАНИЕ закрытия свечи: {until_close:.1f}с", "SLEEP")
+    reason = scheduler.wait(CHECK_INTERVAL if near_threshold else None, event, loop_stopped,
+                            lambda: kline_stream.last_close_ms)
+    if reason == "stream":
+        log("🕯️ Свеча закрыта (WebSocket) - цикл", "DATA")
+
+# ========== Балансы ==========
+from app.balances import FILLS_UNKNOWN, BalanceService, fill_summary
+from app.order_tracker import OrderTracker
+from app.streams import UserDataStream
+
+user_stream: Optional[UserDataStream] = None
+
+def fetch_account() -> Dict[str, Any]:
+    if not client:
+        return {"balances": [{"asset": "USDT", "free": "1000.0", "locked": "0.0"}]}
+    return retry_on_error(client.get_account)
+
+def user_stream_is_live() -> bool:
+    # User data stream молчит, пока нет событий; обрыв ловится ping/pong WebSocket
+    return user_stream is not None and user_stream.connected
+
+# Один снимок get_account на цикл; в режиме stream - обновляется событиями аккаунта
+balance_service = BalanceService(fetch_account, user_stream_is_live)
+
+@timed(CALL_SECONDS, operation="get_balances")
+def get_balances(symbol: str = SYMBOL, refresh: bool = False) -> Tuple[float, float]:
+    """(USDT, базовый актив) из снимка текущего цикла; refresh=True - перечитать после ордера"""
+    return balance_service.pair(symbol, refresh)
+
+def get_free_balances(refresh: bool = False) -> Dict[str, float]:
+    """Ненулевые свободные балансы всех активов"""
+    return {asset: free for asset, free in balance_service.snapshot(refresh).items() if free > 0}
+
+def on_balance_update(event: Dict[str, Any]):
+    """Ввод/вывод средств: в снимок балансов и в журнал"""
+    balance_service.apply_balance_update(event)
+    journal_record("balance", event["a"], ts=event.get("T"), qty=float(event["d"]), source="balanceUpdate")
+
+# ========== Подтверждение ордеров ==========
+# Исполнения своих ордеров из executionReport: ордер отправляется с ответом ACK, торговый поток
+# ждет события потока вместо ответа FULL или опроса get_account после переключения
+order_tracker = OrderTracker()
+
+def on_execution_report(event: Dict[str, Any]):
+    order = order_tracker.apply_execution_report(event)
+    if event.get("x") == "TRADE":
+        log(f"📨 Исполнение {order.side} {order.symbol} #{order.order_id}: {event['l']} по {event['L']} "
+            f"(всего {order.executed_qty}, {order.status})", "ORDER")
+
+def stream_confirms_orders() -> bool:
+    return ORDER_CONFIRMATION == "stream" and user_stream_is_live()
+
+def order_response_params() -> Dict[str, str]:
+    """Параметры рыночного ордера: ACK, если исполнение подтвердит user data stream"""
+    return {"newOrderRespType": "ACK"} if stream_confirms_orders() else {}
+
+def confirm_order(order: Dict[str, Any]) -> Dict[str, Any]:
+    """Ордер с исполнением: ответ FULL как есть, для ACK - executionReport или GET /api/v3/order"""
+    if "executedQty" in order:
+        return order
+    tracked = order_tracker.wait(order["orderId"], ORDER_CONFIRM_TIMEOUT) if user_stream_is_live() else None
+    if tracked is not None:
+        return tracked.to_order()
+    # Ответ без fills и комиссий: apply_fills его не применит, и балансы перечитаются через REST
+    queried = retry_on_error(lambda: client.get_order(symbol=order["symbol"], orderId=order["orderId"]))
+    return {**queried, FILLS_UNKNOWN: True}
+
+def start_user_stream():
+    """User data stream: балансы и исполнения ордеров без REST запросов (MARKET_DATA_MODE=stream)"""
+    global user_stream
+    if not client or MARKET_DATA_MODE != "stream" or EXCHANGE_SIM_URL:
+        return
+    stop_user_stream()
+    user_stream = UserDataStream(
+        client,
+        {
+            "outboundAccountPosition": balance_service.apply_account_position,
+            "balanceUpdate": on_balance_update,
+            "executionReport": on_execution_report,
+        },
+        resync=balance_service.refresh,
+        base_url=BINANCE_WS_URL,
+    )
+    user_stream.start()
+    log(f"💳 Балансы и ордера: user data stream (ORDER_CONFIRMATION={ORDER_CONFIRMATION}), REST только для пересинхронизации", "DATA")
+
+def stop_user_stream():
+    global user_stream
+    if user_stream:
+        user_stream.stop()
+        user_stream = None
 
 # ========== Проверка здоровья системы ==========
-def health_check():
-    global last_health_check, error_count
+def health_check(runner):
+    global last_health_check
     current_time = time.time()
     
     if current_time - last_health_check > HEALTH_CHECK_INTERVAL:
         try:
             if client:
                 client.ping()
-                usdt_bal, base_bal = get_balances()
-                bot_status.update({
+                usdt_bal, base_bal = get_balances(runner.symbol)
+                runner.status.update({
                     "balance_usdt": usdt_bal,
                     "balance_base": base_bal,
-                    "error_count": error_count
+                    "error_count": runner.error_count
                 })
                 
-                if error_count > 0:
-                    error_count = max(0, error_count - 1)
+                if runner.error_count > 0:
+                    runner.error_count = max(0, runner.error_count - 1)
                     
             last_health_check = current_time
             log("Проверка здоровья системы пройдена", "HEALTH")
         except Exception as e:
             log(f"Ошибка проверки здоровья: {e}", "ERROR")
-            error_count += 1
+            runner.error_count += 1
+
+# ========== Стратегия одной пары ==========
+class SymbolRunner:
+    """Независимый экземпляр стратегии для пары (symbol, interval) со своим состоянием"""
+    
+    def __init__(self, symbol: str, interval: str, status: Dict[str, Any], state_path: str,
+                 switcher: Optional[AssetSwitcher] = None, weight: float = 1.0):
+        self.symbol = symbol
+        self.interval = interval
+        self.key = f"{symbol}_{interval}"
+        self.status = status
+        self.state_path = state_path
+        self.weight = weight
+        self.switcher = switcher or AssetSwitcher(client, symbol, trading_mode_controller)
+        self.kline_limit = max(MA_LONG * 3, 100)
+        self.filters: Optional[SymbolFilters] = None
+        self.error_count = 0
+        self.price = 0.0
+        self.m1: Optional[float] = None
+        self.m2: Optional[float] = None
+    
+    def near_threshold(self) -> bool:
+        """Спред MA близок к порогу переключения - стоит проверить до закрытия свечи"""
+        if INTRA_CANDLE_BAND_BPS <= 0 or self.m1 is None or self.m2 is None or not self.price:
+            return False
+        spread_bps = abs((self.m1 - self.m2) / self.price) * 10000.0
+        return spread_bps <= MA_SPREAD_BPS + INTRA_CANDLE_BAND_BPS
+    
+    def prepare(self):
+        """Фильтры символа и сохраненное состояние"""
+        self.load_filters()
+        load_state(self.status, self.state_path)
+    
+    def load_filters(self) -> Optional[SymbolFilters]:
+        """Фильтры из кэша exchangeInfo (сам обновляется по TTL и после -1013)"""
+        try:
+            filters = get_symbol_filters(self.symbol)
+        except KeyError as e:
+            log(f"❌ {e} - торговля {self.symbol} приостановлена до загрузки фильтров", "ERROR")
+            return None
+        if filters is not self.filters:
+            log(f"ФИЛЬТРЫ СИМВОЛА {self.symbol}: step={filters.step_size}, tick={filters.tick_size}, "
+                f"minQty={filters.min_qty}, minNotional={filters.min_notional}", "INFO")
+            self.filters = filters
+        return filters
+    
+    def update_market(self):
+        """Обновить цену и MA из кэша свечей"""
+        log(f"📊 Получение рыночных данных {self.symbol}...", "DATA")
+        self.price, self.m1, self.m2 = get_price_and_mas(self.symbol, self.interval, self.kline_limit)
+        self.status["current_price"] = self.price
+    
+    def record_signal(self, decision: str, current_asset: str, should_hold: str, spread_bps: float):
+        """Оценка сигнала в журнал: MA на момент решения и что решили"""
+        journal_record("signal", self.symbol, interval=self.interval, price=self.price,
+                       ma_short=self.m1, ma_long=self.m2, decision=decision,
+                       current_asset=current_asset, should_hold=should_hold, spread_bps=round(spread_bps, 3))
+    
+    def record_trade(self, side: str, amount: float, price: float):
+        """Ордер переключения и его исполнения в журнал"""
+        orders = self.switcher.last_orders
+        if orders:
+            if journal:
+                for order in orders:
+                    journal.record_order(self.symbol, order, interval=self.interval)
+            execution = self.switcher.last_execution
+            if execution:
+                journal_record("execution", self.symbol, interval=self.interval, side=side,
+                               price=execution.avg_price, qty=execution.filled_qty, quote_qty=execution.quote,
+                               **{k: v for k, v in execution.summary().items()
+                                  if k not in ("side", "avg_price", "filled_qty", "quote")})
+        else:
+            # TEST_MODE: ордер не отправлялся, пишем расчетные значения
+            qty = amount if side == "SELL" else amount / price
+            journal_record("order", self.symbol, interval=self.interval, side=side, price=price,
+                           qty=qty, quote_qty=qty * price, test=True)
+    
+    def record_error(self, action: str):
+        self.error_count += 1
+        # Добавляем информацию в статус для диагностики
+        self.status["last_error"] = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "action": action,
+            "error_count": self.error_count
+        }
+    
+    def decide(self, balances: Callable[[bool], Tuple[float, float]]):
+        """Решение по стратегии и переключение актива.
+        balances(refresh) возвращает (USDT, базовый актив), доступные этой паре."""
+        global last_action_ts
+        
+        price, m1, m2 = self.price, self.m1, self.m2
+        asset_switcher = self.switcher
+        status = self.status
+        usdt_bal, base_bal = balances(False)
+        
+        # Подробный лог балансов
+        base_value = base_bal * price
+        total_value = usdt_bal + base_value
+        log(f"💰 БАЛАНСЫ: USDT={usdt_bal:.2f} | {asset_switcher.base_asset}={base_bal:.6f} (${base_value:.2f}) | ВСЕГО=${total_value:.2f}", "BALANCE")
+        
+        # Обновляем статус
+        status.update({
+            "current_price": price,
+            "balance_usdt": usdt_bal,
+            "balance_base": base_bal
+        })
+        
+        # Проверяем минимальный баланс
+        if total_value < MIN_BALANCE_USDT:
+            log(f"❌ Недостаточный общий баланс для торговли: ${total_value:.2f} < ${MIN_BALANCE_USDT}", "WARN")
+            return
+        
+        if m1 is None or m2 is None:
+            return
+        
+        # Подробный лог MA
+        ma_diff = m1 - m2
+        ma_diff_pct = (ma_diff / price) * 100
+        spread_bps = abs(ma_diff / price) * 10000.0
+        
+        log(f"📈 MA АНАЛИЗ: MA7={m1:.4f} | MA25={m2:.4f} | Разница={ma_diff:+.4f} ({ma_diff_pct:+.3f}%) | Спред={spread_bps:.1f}б.п.", "MA")
+        
+        status.update({
+            "ma_short": m1,
+            "ma_long": m2
+        })
+        
+        # Определяем какой актив должны держать
+        should_hold_base = asset_switcher.should_hold_base(m1, m2)
+        should_hold_asset = asset_switcher.base_asset if should_hold_base else asset_switcher.quote_asset
+        
+        # Определяем какой актив держим сейчас
+        current_asset = asset_switcher.get_current_asset_preference(usdt_bal, base_bal, price)
+        min_notional = self.filters.min_notional if self.filters else MIN_BALANCE_USDT
+        current_asset = asset_switcher.resume_unfinished(current_asset, should_hold_asset, usdt_bal, base_bal,
+                                                         price, min_notional)
+        resuming = asset_switcher.unfinished_to is not None
+        
+        # Подробный лог стратегии
+        trend_direction = "ВОСХОДЯЩИЙ 📈" if m1 > m2 else "НИСХОДЯЩИЙ 📉"
+        strategy_reason = f"MA7 {'>' if m1 > m2 else '<'} MA25"
+        log(f"🎯 СТРАТЕГИЯ: {trend_direction} ({strategy_reason}) → Должны держать {should_hold_asset}", "STRATEGY")
+        log(f"🏦 ТЕКУЩИЙ АКТИВ: {current_asset} (по балансам: USDT=${usdt_bal:.2f}, {asset_switcher.base_asset}=${base_value:.2f})", "CURRENT")
+        
+        # Обновляем статус
+        status.update({
+            "current_asset": current_asset,
+            "should_hold": should_hold_asset
+        })
+        
+        # Проверяем фильтр шума
+        if spread_bps < MA_SPREAD_BPS and not resuming:
+            log(f"🔇 ФИЛЬТР ШУМА: Спред {spread_bps:.1f}б.п. < {MA_SPREAD_BPS}б.п. - сигнал слишком слабый", "FILTER")
+            self.record_signal("filtered", current_asset, should_hold_asset, spread_bps)
+            return
+        
+        # Проверяем кулдаун
+        time_since_last_switch = time.time() - asset_switcher.last_switch_time
+        # Доисполнение того же переключения - не смена направления, кулдаун не нужен
+        if time_since_last_switch < asset_switcher.min_switch_interval and not resuming:
+            remaining_cooldown = asset_switcher.min_switch_interval - time_since_last_switch
+            log(f"⏰ КУЛДАУН: Осталось {remaining_cooldown:.1f}сек до следующего переключения", "COOLDOWN")
+            self.record_signal("cooldown", current_asset, should_hold_asset, spread_bps)
+            return
+        
+        # Итоговый статус
+        status_emoji = "✅ СИНХРОНИЗИРОВАНО" if current_asset == should_hold_asset else "⚠️ ТРЕБУЕТСЯ ПЕРЕКЛЮЧЕНИЕ"
+        log(f"📊 СТАТУС: Цена={price:.4f} | Держим={current_asset} | Нужно={should_hold_asset} | {status_emoji}", "STATUS")
+        
+        # Подробная диагностика переключения
+        if log_enabled("DEBUG"):
+            log(f"🔍 ДИАГНОСТИКА: current_asset='{current_asset}', should_hold_asset='{should_hold_asset}'", "DEBUG")
+            log(f"🔍 БАЛАНСЫ: USDT={usdt_bal:.2f}, {asset_switcher.base_asset}={base_bal:.6f} (${base_value:.2f})", "DEBUG")
+            log(f"🔍 КУЛДАУН: Прошло {time_since_last_switch:.1f}сек с последнего переключения (мин: {asset_switcher.min_switch_interval}сек)", "DEBUG")
+        
+        # Проверяем нужно ли переключать актив
+        need_switch = asset_switcher.need_to_switch(current_asset, should_hold_asset)
+        if log_enabled("DEBUG"):
+            log(f"🔍 РЕШЕНИЕ: need_to_switch = {need_switch}", "DEBUG")
+        
+        if not need_switch:
+            log(f"✅ ПЕРЕКЛЮЧЕНИЕ НЕ ТРЕБУЕТСЯ - активы синхронизированы", "OK")
+            self.record_signal("hold", current_asset, should_hold_asset, spread_bps)
+            return
+        
+        filters = self.load_filters()
+        if filters is None:
+            self.record_signal("no_filters", current_asset, should_hold_asset, spread_bps)
+            return
+        
+        # Фильтр ликвидности: широкий спред в стакане - переключение дорогое, ждем
+        book = get_order_book(self.symbol) if MAX_BOOK_SPREAD_BPS > 0 else None
+        book_spread = book.spread_bps() if book else None
+        if book_spread is not None and book_spread > MAX_BOOK_SPREAD_BPS:
+            log(f"📚 ФИЛЬТР СПРЕДА: спред стакана {book_spread:.1f}б.п. > {MAX_BOOK_SPREAD_BPS}б.п. - переключение отложено", "FILTER")
+            self.record_signal("wide_spread", current_asset, should_hold_asset, spread_bps)
+            return
+        
+        self.record_signal("switch", current_asset, should_hold_asset, spread_bps)
+        
+        log(f"🔄 ПЕРЕКЛЮЧЕНИЕ ТРЕБУЕТСЯ: {current_asset} → {should_hold_asset}", "SWITCH")
+        
+        # Подробная информация о переключении
+        switch_sent = time.time()
+        if current_asset == asset_switcher.base_asset:
+            # Продаем базовый актив
+            log(f"📉 ПРОДАЖА: {base_bal:.6f} {asset_switcher.base_asset} → USDT по цене {price:.4f}", "TRADE_PLAN")
+            expected_usdt = base_bal * price * 0.999  # с учетом комиссии
+            log(f"💵 ОЖИДАЕМЫЙ РЕЗУЛЬТАТ: ~{expected_usdt:.2f} USDT (с учетом комиссии 0.1%)", "TRADE_PLAN")
+            
+            success = asset_switcher.execute_switch(
+                current_asset, should_hold_asset, base_bal, price, filters
+            )
+        else:
+            # Покупаем базовый актив
+            log(f"📈 ПОКУПКА: {usdt_bal:.2f} USDT → {asset_switcher.base_asset} по цене {price:.4f}", "TRADE_PLAN")
+            expected_qty = (usdt_bal * 0.999) / price  # с учетом комиссии
+            log(f"🪙 ОЖИДАЕМЫЙ РЕЗУЛЬТАТ: ~{expected_qty:.6f} {asset_switcher.base_asset} (с учетом комиссии 0.1%)", "TRADE_PLAN")
+            
+            success = asset_switcher.execute_switch(
+                current_asset, should_hold_asset, usdt_bal, price, filters
+            )
+        
+        if success:
+            side = "SELL" if current_asset == asset_switcher.base_asset else "BUY"
+            self.record_trade(side, base_bal if side == "SELL" else usdt_bal, price)
+            status["switches_count"] = status.get("switches_count", 0) + 1
+            status["last_switch"] = datetime.now(timezone.utc).isoformat()
+            if asset_switcher.last_execution:
+                status["last_execution"] = asset_switcher.last_execution.summary()
+            last_action_ts = time.time()
+            log(f"✅ ПЕРЕКЛЮЧЕНИЕ ВЫПОЛНЕНО УСПЕШНО! Общее количество переключений: {status['switches_count']}", "SUCCESS")
+            
+            # Балансы после переключения - из fills ответа на ордер, без ожидания и get_account
+            orders = asset_switcher.last_orders
+            reconciled = bool(orders) and balance_service.apply_fills(self.symbol, orders, switch_sent)
+            new_usdt_bal, new_base_bal = balances(not reconciled and not TEST_MODE)
+            new_base_value = new_base_bal * price
+            new_total = new_usdt_bal + new_base_value
+            log(f"💰 НОВЫЕ БАЛАНСЫ: USDT={new_usdt_bal:.2f} | {asset_switcher.base_asset}={new_base_bal:.6f} (${new_base_value:.2f}) | ВСЕГО=${new_total:.2f}", "RESULT")
+            journal_record("balance", self.symbol, interval=self.interval, price=price,
+                           usdt=new_usdt_bal, base=new_base_bal, source="switch")
+            
+            # Обновляем статус с новыми балансами
+            status.update({
+                "balance_usdt": new_usdt_bal,
+                "balance_base": new_base_bal
+            })
+        else:
+            log(f"❌ ОШИБКА ПЕРЕКЛЮЧЕНИЯ! Будет повторная попытка в следующем цикле.", "ERROR")
+            self.record_error(f"switch_{current_asset}_to_{should_hold_asset}")
+
+def handle_cycle_error(runner: SymbolRunner, e: Exception):
+    """Обработка ошибки цикла стратегии"""
+    if isinstance(e, (BinanceAPIException, BinanceOrderException)):
+        emsg = str(e)
+        if "Too many requests" in emsg or "Request rate limit" in emsg:
+            log(f"Rate limit: {e} — сплю 5 сек", "WARN")
+            time.sleep(5)
+        else:
+            log(f"Binance ошибка ({runner.symbol}): {e}", "ERROR")
+            runner.error_count += 1
+            time.sleep(2)
+    else:
+        log(f"Неожиданная ошибка ({runner.symbol}): {e}", "ERROR")
+        runner.error_count += 1
+        runner.status["status"] = f"error: {str(e)}"
+        save_state(runner.status, runner.state_path)
+        time.sleep(2)
+
+# ========== Асинхронное ядро цикла ==========
+from app.async_engine import AsyncCycleEngine
+
+cycle_engine: Optional[AsyncCycleEngine] = None
+
+def start_cycle_engine():
+    """ENGINE_MODE=async: независимые запросы цикла выполняются одновременно"""
+    global cycle_engine
+    cycle_engine = AsyncCycleEngine() if ENGINE_MODE == "async" else None
+    log(f"⚙️ Ядро цикла: {'асинхронное (параллельный ввод-вывод)' if cycle_engine else 'последовательное'}", "ENGINE")
+
+def stop_cycle_engine():
+    if cycle_engine:
+        cycle_engine.close()
+
+async def main_cycle_async(runner: SymbolRunner):
+    """Проверка здоровья, балансы и свечи - параллельно; решение - когда готово все"""
+    results = await cycle_engine.gather({
+        "health": lambda: health_check(runner),
+        "market": runner.update_market,
+        "balances": lambda: get_balances(runner.symbol),
+    })
+    for result in results.values():
+        if isinstance(result, Exception):
+            raise result
+    await cycle_engine.call(runner.decide, lambda refresh: get_balances(runner.symbol, refresh))
 
 # ========== Основной торговый цикл ==========
+main_runner: Optional[SymbolRunner] = None
+
 def trading_loop():
-    global running, last_action_ts, bot_status, error_count
+    global running, bot_status, main_runner
     
     start_time = time.time()
     log(f"Старт торгового цикла для {SYMBOL} (TEST_MODE={TEST_MODE})", "START")
@@ -853,16 +1750,25 @@ def trading_loop():
         log("⚠️ running=False, устанавливаем в True", "WARN")
         running = True
     
-    # Получаем фильтры символа
-    step, tick, min_qty, min_notional = get_symbol_filters(SYMBOL)
-    load_state()
-    
     # Инициализируем asset_switcher если не инициализирован
     global asset_switcher
     if asset_switcher is None:
         log("🔧 Инициализация AssetSwitcher...", "INIT")
         asset_switcher = AssetSwitcher(client, SYMBOL)
     
+    # Получаем фильтры символа и сохраненное состояние
+    main_runner = SymbolRunner(SYMBOL, INTERVAL, bot_status, STATE_PATH, asset_switcher)
+    main_runner.prepare()
+    
+    # Рыночные данные: WebSocket поток свечей с REST как резервом
+    start_market_stream([(SYMBOL, INTERVAL)], main_runner.kline_limit)
+    start_user_stream()
+    start_scheduler([INTERVAL])
+    start_cycle_engine()
+    start_http_warmer()
+    open_journal()
+    publish_status()
+    
     cycle_count = 0
     log(f"🔄 Начинаем основной цикл торговли (running={running})", "LOOP")
     
@@ -873,183 +1779,209 @@ def trading_loop():
             
             # Обновляем время работы
             bot_status["uptime"] = int(time.time() - start_time)
+            balance_service.begin_cycle()
             
-            # Проверка здоровья системы
-            health_check()
-            
-            # Получаем данные
-            log("📊 Получение рыночных данных...", "DATA")
-            prices = get_closes(SYMBOL, INTERVAL, limit=max(MA_LONG * 3, 100))
-            price = prices[-1]
-            usdt_bal, base_bal = get_balances()
-            
-            # Подробный лог балансов
-            base_value = base_bal * price
-            total_value = usdt_bal + base_value
-            log(f"💰 БАЛАНСЫ: USDT={usdt_bal:.2f} | {asset_switcher.base_asset}={base_bal:.6f} (${base_value:.2f}) | ВСЕГО=${total_value:.2f}", "BALANCE")
-            
-            # Обновляем статус
-            bot_status.update({
-                "current_price": price,
-                "balance_usdt": usdt_bal,
-                "balance_base": base_bal
-            })
-            
-            # Проверяем минимальный баланс
-            if total_value < MIN_BALANCE_USDT:
-                log(f"❌ Недостаточный общий баланс для торговли: ${total_value:.2f} < ${MIN_BALANCE_USDT}", "WARN")
-                time.sleep(CHECK_INTERVAL)
-                continue
-            
-            # Рассчитываем MA
-            m1 = ma(prices, MA_SHORT)
-            m2 = ma(prices, MA_LONG)
-            
-            if m1 is not None and m2 is not None:
-                # Подробный лог MA
-                ma_diff = m1 - m2
-                ma_diff_pct = (ma_diff / price) * 100
-                spread_bps = abs(ma_diff / price) * 10000.0
-                
-                log(f"📈 MA АНАЛИЗ: MA7={m1:.4f} | MA25={m2:.4f} | Разница={ma_diff:+.4f} ({ma_diff_pct:+.3f}%) | Спред={spread_bps:.1f}б.п.", "MA")
-                
-                bot_status.update({
-                    "ma_short": m1,
-                    "ma_long": m2
-                })
-                
-                # Проверяем что asset_switcher инициализирован
-                if asset_switcher is None:
-                    log("❌ AssetSwitcher не инициализирован", "ERROR")
-                    time.sleep(CHECK_INTERVAL)
-                    continue
-                
-                # Определяем какой актив должны держать
-                should_hold_base = asset_switcher.should_hold_base(m1, m2)
-                should_hold_asset = asset_switcher.base_asset if should_hold_base else asset_switcher.quote_asset
-                
-                # Определяем какой актив держим сейчас
-                current_asset = asset_switcher.get_current_asset_preference(usdt_bal, base_bal, price)
-                
-                # Подробный лог стратегии
-                trend_direction = "ВОСХОДЯЩИЙ 📈" if m1 > m2 else "НИСХОДЯЩИЙ 📉"
-                strategy_reason = f"MA7 {'>' if m1 > m2 else '<'} MA25"
-                log(f"🎯 СТРАТЕГИЯ: {trend_direction} ({strategy_reason}) → Должны держать {should_hold_asset}", "STRATEGY")
-                log(f"🏦 ТЕКУЩИЙ АКТИВ: {current_asset} (по балансам: USDT=${usdt_bal:.2f}, {asset_switcher.base_asset}=${base_value:.2f})", "CURRENT")
-                
-                # Обновляем статус
-                bot_status.update({
-                    "current_asset": current_asset,
-                    "should_hold": should_hold_asset
-                })
-                
-                # Проверяем фильтр шума
-                if spread_bps < MA_SPREAD_BPS:
-                    log(f"🔇 ФИЛЬТР ШУМА: Спред {spread_bps:.1f}б.п. < {MA_SPREAD_BPS}б.п. - сигнал слишком слабый", "FILTER")
-                    time.sleep(CHECK_INTERVAL)
-                    continue
-                
-                # Проверяем кулдаун
-                time_since_last_switch = time.time() - asset_switcher.last_switch_time
-                if time_since_last_switch < asset_switcher.min_switch_interval:
-                    remaining_cooldown = asset_switcher.min_switch_interval - time_since_last_switch
-                    log(f"⏰ КУЛДАУН: Осталось {remaining_cooldown:.1f}сек до следующего переключения", "COOLDOWN")
-                    time.sleep(CHECK_INTERVAL)
-                    continue
-                
-                # Итоговый статус
-                status_emoji = "✅ СИНХРОНИЗИРОВАНО" if current_asset == should_hold_asset else "⚠️ ТРЕБУЕТСЯ ПЕРЕКЛЮЧЕНИЕ"
-                log(f"📊 СТАТУС: Цена={price:.4f} | Держим={current_asset} | Нужно={should_hold_asset} | {status_emoji}", "STATUS")
-                
-                # Подробная диагностика переключения
-                log(f"🔍 ДИАГНОСТИКА: current_asset='{current_asset}', should_hold_asset='{should_hold_asset}'", "DEBUG")
-                log(f"🔍 БАЛАНСЫ: USDT={usdt_bal:.2f}, {asset_switcher.base_asset}={base_bal:.6f} (${base_value:.2f})", "DEBUG")
-                log(f"🔍 КУЛДАУН: Прошло {time_since_last_switch:.1f}сек с последнего переключения (мин: {asset_switcher.min_switch_interval}сек)", "DEBUG")
-                
-                # Проверяем нужно ли переключать актив
-                need_switch = asset_switcher.need_to_switch(current_asset, should_hold_asset)
-                log(f"🔍 РЕШЕНИЕ: need_to_switch = {need_switch}", "DEBUG")
-                
-                if need_switch:
-                    log(f"🔄 ПЕРЕКЛЮЧЕНИЕ ТРЕБУЕТСЯ: {current_asset} → {should_hold_asset}", "SWITCH")
-                    
-                    # Подробная информация о переключении
-                    if current_asset == asset_switcher.base_asset:
-                        # Продаем базовый актив
-                        log(f"📉 ПРОДАЖА: {base_bal:.6f} {asset_switcher.base_asset} → USDT по цене {price:.4f}", "TRADE_PLAN")
-                        expected_usdt = base_bal * price * 0.999  # с учетом комиссии
-                        log(f"💵 ОЖИДАЕМЫЙ РЕЗУЛЬТАТ: ~{expected_usdt:.2f} USDT (с учетом комиссии 0.1%)", "TRADE_PLAN")
-                        
-                        success = asset_switcher.execute_switch(
-                            current_asset, should_hold_asset, base_bal, price, step
-                        )
-                    else:
-                        # Покупаем базовый актив
-                        log(f"📈 ПОКУПКА: {usdt_bal:.2f} USDT → {asset_switcher.base_asset} по цене {price:.4f}", "TRADE_PLAN")
-                        expected_qty = (usdt_bal * 0.999) / price  # с учетом комиссии
-                        log(f"🪙 ОЖИДАЕМЫЙ РЕЗУЛЬТАТ: ~{expected_qty:.6f} {asset_switcher.base_asset} (с учетом комиссии 0.1%)", "TRADE_PLAN")
-                        
-                        success = asset_switcher.execute_switch(
-                            current_asset, should_hold_asset, usdt_bal, price, step
-                        )
-                    
-                    if success:
-                        bot_status["switches_count"] = bot_status.get("switches_count", 0) + 1
-                        bot_status["last_switch"] = datetime.now(timezone.utc).isoformat()
-                        last_action_ts = time.time()
-                        log(f"✅ ПЕРЕКЛЮЧЕНИЕ ВЫПОЛНЕНО УСПЕШНО! Общее количество переключений: {bot_status['switches_count']}", "SUCCESS")
-                        
-                        # Ждем немного для обновления балансов на бирже
-                        time.sleep(2)
-                        
-                        # Логируем новые балансы после переключения
-                        new_usdt_bal, new_base_bal = get_balances()
-                        new_base_value = new_base_bal * price
-                        new_total = new_usdt_bal + new_base_value
-                        log(f"💰 НОВЫЕ БАЛАНСЫ: USDT={new_usdt_bal:.2f} | {asset_switcher.base_asset}={new_base_bal:.6f} (${new_base_value:.2f}) | ВСЕГО=${new_total:.2f}", "RESULT")
-                        
-                        # Обновляем статус с новыми балансами
-                        bot_status.update({
-                            "balance_usdt": new_usdt_bal,
-                            "balance_base": new_base_bal
-                        })
-                    else:
-                        log(f"❌ ОШИБКА ПЕРЕКЛЮЧЕНИЯ! Будет повторная попытка в следующем цикле.", "ERROR")
-                        error_count += 1
-                        # Добавляем информацию в bot_status для диагностики
-                        bot_status["last_error"] = {
-                            "timestamp": datetime.now(timezone.utc).isoformat(),
-                            "action": f"switch_{current_asset}_to_{should_hold_asset}",
-                            "error_count": error_count
-                        }
+            with CYCLE_SECONDS.time(engine=ENGINE_MODE):
+                if cycle_engine:
+                    cycle_engine.run(main_cycle_async(main_runner))
                 else:
-                    log(f"✅ ПЕРЕКЛЮЧЕНИЕ НЕ ТРЕБУЕТСЯ - активы синхронизированы", "OK")
+                    # Проверка здоровья системы
+                    health_check(main_runner)
+                    
+                    # Получаем данные и принимаем решение
+                    main_runner.update_market()
+                    main_runner.decide(lambda refresh: get_balances(SYMBOL, refresh))
             
             # Обновляем статус
             bot_status["status"] = "running"
             save_state()
+            publish_status()
             
-            log(f"😴 ОЖИДАНИЕ {CHECK_INTERVAL} секунд до следующего цикла...", "SLEEP")
-            time.sleep(CHECK_INTERVAL)
+            wait_next_cycle(main_runner.near_threshold())
             
-        except (BinanceAPIException, BinanceOrderException) as e:
-            emsg = str(e)
-            if "Too many requests" in emsg or "Request rate limit" in emsg:
-                log(f"Rate limit: {e} — сплю 5 сек", "WARN")
-                time.sleep(5)
-            else:
-                log(f"Binance ошибка: {e}", "ERROR")
-                error_count += 1
-                time.sleep(2)
         except Exception as e:
-            log(f"Неожиданная ошибка: {e}", "ERROR")
-            error_count += 1
-            bot_status["status"] = f"error: {str(e)}"
-            save_state()
-            time.sleep(2)
+            handle_cycle_error(main_runner, e)
+            publish_status()
     
+    stop_market_stream()
+    stop_user_stream()
+    stop_cycle_engine()
+    stop_http_warmer()
+    publish_status()
     log("Торговый бот остановлен", "SHUTDOWN")
 
+# ========== Портфель: несколько пар в одном процессе ==========
+
+def new_status(symbol: str) -> Dict[str, Any]:
+    status = dict(bot_status)
+    status.update({
+        "status": "idle",
+        "symbol": symbol,
+        "current_asset": "USDT",
+        "should_hold": "USDT",
+        "last_update": None,
+        "last_switch": None,
+        "switches_count": 0,
+        "error_count": 0,
+        "uptime": 0
+    })
+    return status
+
+def runner_state_path(symbol: str, interval: str) -> str:
+    root, ext = os.path.splitext(STATE_PATH)
+    return f"{root}_{symbol}_{interval}{ext or '.json'}"
+
+class PortfolioRunner:
+    """N независимых стратегий в одном процессе.
+    
+    Общие: Binance клиент, WebSocket поток свечей (один combined stream)
+    и снимок балансов аккаунта (один get_account за цикл на все пары).
+    Свободный USDT делится по весам между парами, которые сейчас не держат коин.
+    """
+    
+    def __init__(self, specs: List[Tuple[str, str, float]]):
+        self.runners: Dict[str, SymbolRunner] = {}
+        for symbol, interval, weight in specs:
+            runner = SymbolRunner(symbol, interval, new_status(symbol), runner_state_path(symbol, interval), weight=weight)
+            self.runners[runner.key] = runner
+        self.free: Dict[str, float] = {}
+    
+    def prepare(self):
+        for runner in self.runners.values():
+            runner.prepare()
+        start_market_stream([(r.symbol, r.interval) for r in self.runners.values()],
+                            max(r.kline_limit for r in self.runners.values()))
+        start_user_stream()
+        start_scheduler([r.interval for r in self.runners.values()])
+    
+    def refresh_balances(self, refresh: bool = False):
+        self.free = get_free_balances(refresh)
+    
+    def _holds_base(self, runner: SymbolRunner, usdt_free: float, total_weight: float) -> bool:
+        base_value = self.free.get(runner.switcher.base_asset, 0.0) * runner.price
+        return base_value > max(1.0, usdt_free * runner.weight / total_weight)
+    
+    def balances_for(self, runner: SymbolRunner, refresh: bool = False) -> Tuple[float, float]:
+        """Доля свободного USDT и баланс коина для пары"""
+        # Снимок локальный: после ордера в нем уже учтены fills (или он перечитан при refresh)
+        self.refresh_balances(refresh)
+        usdt_free = self.free.get("USDT", 0.0)
+        total_weight = sum(r.weight for r in self.runners.values())
+        # Пары, держащие коин, свою долю USDT уже потратили
+        sharing = [r for r in self.runners.values() if r is runner or not self._holds_base(r, usdt_free, total_weight)]
+        share = usdt_free * runner.weight / sum(r.weight for r in sharing)
+        return share, self.free.get(runner.switcher.base_asset, 0.0)
+    
+    def run_cycle(self, uptime: int):
+        # 1. Рыночные данные по всем парам (из общего кэша/потока)
+        for runner in self.runners.values():
+            try:
+                runner.update_market()
+            except Exception as e:
+                handle_cycle_error(runner, e)
+        
+        # 2. Один снимок балансов на все пары
+        balance_service.begin_cycle()
+        self.refresh_balances()
+        
+        self.decide_all(uptime)
+    
+    async def run_cycle_async(self, uptime: int):
+        # 1-2. Свечи всех пар и снимок балансов - одновременно
+        balance_service.begin_cycle()
+        calls = {key: runner.update_market for key, runner in self.runners.items()}
+        calls["balances"] = self.refresh_balances
+        results = await cycle_engine.gather(calls)
+        if isinstance(results["balances"], Exception):
+            raise results["balances"]
+        for key, runner in self.runners.items():
+            if isinstance(results[key], Exception):
+                handle_cycle_error(runner, results[key])
+        
+        await cycle_engine.call(self.decide_all, uptime)
+    
+    def decide_all(self, uptime: int):
+        # 3. Решения; после каждого переключения снимок перечитывается
+        for runner in self.runners.values():
+            try:
+                log(f"💼 ПАРА {runner.symbol} {runner.interval} ----------------------", "PORTFOLIO")
+                runner.decide(lambda refresh, r=runner: self.balances_for(r, refresh))
+                runner.status.update({"status": "running", "uptime": uptime, "error_count": runner.error_count})
+                save_state(runner.status, runner.state_path)
+            except Exception as e:
+                handle_cycle_error(runner, e)
+    
+    def stop(self):
+        for runner in self.runners.values():
+            runner.status["status"] = "stopped"
+            save_state(runner.status, runner.state_path)
+
+portfolio: Optional[PortfolioRunner] = None
+
+def portfolio_loop():
+    global running, portfolio
+    
+    start_time = time.time()
+    portfolio = PortfolioRunner(PORTFOLIO_SPECS)
+    log(f"Старт портфеля: {', '.join(portfolio.runners)} (TEST_MODE={TEST_MODE})", "START")
+    running = True
+    portfolio.prepare()
+    start_cycle_engine()
+    start_http_warmer()
+    open_journal()
+    publish_status()
+    
+    cycle_count = 0
+    while running:
+        try:
+            cycle_count += 1
+            log(f"🔄 ЦИКЛ ПОРТФЕЛЯ #{cycle_count} ==========================================", "CYCLE")
+            uptime = int(time.time() - start_time)
+            with CYCLE_SECONDS.time(engine=ENGINE_MODE):
+                if cycle_engine:
+                    cycle_engine.run(portfolio.run_cycle_async(uptime))
+                else:
+                    portfolio.run_cycle(uptime)
+        except Exception as e:
+            log(f"Ошибка цикла портфеля: {e}", "ERROR")
+            publish_status()
+            time.sleep(2)
+            continue
+        publish_status()
+        wait_next_cycle(any(r.near_threshold() for r in portfolio.runners.values()))
+    
+    portfolio.stop()
+    stop_market_stream()
+    stop_user_stream()
+    stop_cycle_engine()
+    stop_http_warmer()
+    publish_status()
+    log("Портфель остановлен", "SHUTDOWN")
+
+def run_bot():
+    """Точка входа торгового потока: портфель (PORTFOLIO) или одна пара (SYMBOL)"""
+    global trading_thread_ident
+    trading_thread_ident = threading.get_ident()
+    if PORTFOLIO_SPECS:
+        portfolio_loop()
+    else:
+        trading_loop()
+
+# ========== Профилирование ==========
+from app.profiler import MAX_SECONDS as PROFILE_MAX_SECONDS, SamplingProfiler
+
+trading_thread_ident: Optional[int] = None
+profiler = SamplingProfiler()
+
+def is_trading_thread(thread: threading.Thread) -> bool:
+    """Поток торгового цикла и пул ввода-вывода асинхронного ядра"""
+    return thread.ident == trading_thread_ident or thread.name.startswith("cycle-io")
+
+def admin_allowed() -> bool:
+    """Только заголовок X-Admin-Token: query string попадает в access log gunicorn (%(r)s)"""
+    token = request.headers.get("X-Admin-Token", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
 # ========== Flask маршруты ==========
 @app.route("/")
 def root():
@@ -1063,16 +1995,28 @@ def root():
         "uptime": bot_status.get("uptime", 0)
     })
 
+def seconds_or_none(value: float) -> Optional[float]:
+    return round(value, 3) if value != float("inf") else None
+
 @app.route("/health")
 def health():
-    try:
-        if client:
-            client.ping()
-            return jsonify({"ok": True, "status": "healthy"})
-        else:
-            return jsonify({"ok": True, "status": "test_mode"})
-    except Exception as e:
-        return jsonify({"ok": False, "error": str(e)}), 500
+    """Живость по снимку торгового потока: без запросов к бирже, 503 если поток завис"""
+    snapshot = status_board.current
+    heartbeat_age = status_board.heartbeat_age()
+    healthy = not running or heartbeat_age <= health_stale_after()
+    return jsonify({
+        "ok": healthy,
+        "status": ("healthy" if client else "test_mode") if healthy else "stale",
+        "running": running,
+        "published_at": snapshot.get("published_at"),
+        "snapshot_age": seconds_or_none(status_board.age()),
+        "heartbeat_age": seconds_or_none(heartbeat_age),
+        "stale_after": health_stale_after(),
+        "error_count": snapshot.get("error_count", 0),
+        "rate_limit": snapshot.get("rate_limit"),
+        "balances": snapshot.get("balances"),
+        "transport": snapshot.get("transport")
+    }), 200 if healthy else 503
 
 @app.route("/start")
 def start():
@@ -1080,14 +2024,14 @@ def start():
     if running:
         return jsonify({"ok": True, "message": "уже работает"})
     
-    if API_KEY and API_SECRET:
+    if EXCHANGE_SIM_URL or (API_KEY and API_SECRET):
         init_client()
     
     running = True
     bot_status["status"] = "running"
     save_state()
     
-    t = threading.Thread(target=trading_loop, daemon=True)
+    t = threading.Thread(target=run_bot, daemon=True)
     t.start()
     log("Бот запущен", "START")
     return jsonify({"ok": True, "mode": "TEST" if TEST_MODE else "LIVE"})
@@ -1103,36 +2047,115 @@ def stop():
 
 @app.route("/status")
 def status():
+    """Последний опубликованный снимок (состояние на конец цикла) + его возраст"""
     return jsonify({
         "ok": True,
-        "symbol": SYMBOL,
+        **status_board.current,
+        "snapshot_age": seconds_or_none(status_board.age())
+    })
+
+@app.route("/portfolio")
+def portfolio_status():
+    if not portfolio:
+        return jsonify({"ok": True, "enabled": bool(PORTFOLIO_SPECS), "runners": {}})
+    return jsonify({
+        "ok": True,
+        "enabled": True,
         "mode": "TEST" if TEST_MODE else "LIVE",
-        "status": bot_status.get("status", "idle"),
-        "current_asset": bot_status.get("current_asset", "USDT"),
-        "should_hold": bot_status.get("should_hold", "USDT"),
-        "current_price": bot_status.get("current_price", 0.0),
-        "balance_usdt": bot_status.get("balance_usdt", 0.0),
-        "balance_base": bot_status.get("balance_base", 0.0),
-        "ma_short": bot_status.get("ma_short", 0.0),
-        "ma_long": bot_status.get("ma_long", 0.0),
-        "error_count": bot_status.get("error_count", 0),
-        "uptime": bot_status.get("uptime", 0),
-        "switches_count": bot_status.get("switches_count", 0),
-        "last_switch": bot_status.get("last_switch"),
-        "last_update": bot_status.get("last_update")
+        "runners": {
+            key: {
+                "symbol": r.symbol,
+                "interval": r.interval,
+                "weight": r.weight,
+                "status": r.status.get("status", "idle"),
+                "current_asset": r.status.get("current_asset", "USDT"),
+                "should_hold": r.status.get("should_hold", "USDT"),
+                "switches_count": r.status.get("switches_count", 0)
+            }
+            for key, r in portfolio.runners.items()
+        }
     })
 
+@app.route("/portfolio/<key>")
+def portfolio_runner_status(key: str):
+    runner = portfolio.runners.get(key) if portfolio else None
+    if runner is None:
+        return jsonify({"ok": False, "error": f"нет стратегии {key}"}), 404
+    return jsonify({"ok": True, "key": key, "interval": runner.interval, **runner.status})
+
+# Значения на момент чтения /metrics
+REGISTRY.gauge("binance_used_weight_1m", "Вес запросов за минуту по заголовку X-MBX-USED-WEIGHT-1M",
+               lambda: rate_limiter.server_used_weight)
+REGISTRY.gauge("binance_weight_available", "Доступный вес в локальном лимитере", lambda: rate_limiter.tokens)
+REGISTRY.gauge("bot_balance_free", "Свободный баланс актива", lambda: {a: v for a, v in list(balance_service.free.items()) if v}, ("asset",))
+REGISTRY.gauge("bot_errors", "Счетчик ошибок стратегии", lambda: bot_status.get("error_count", 0))
+REGISTRY.gauge("bot_switches", "Количество переключений", lambda: bot_status.get("switches_count", 0))
+REGISTRY.gauge("bot_order_book_spread_bps", "Спред локального стакана, б.п.",
+               lambda: {s: b.spread_bps() for s, b in list(order_books.items()) if b.synced}, ("symbol",))
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if not metrics.ENABLED:
+        return jsonify({"ok": False, "error": "METRICS_ENABLED=false"}), 404
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/admin/profile", methods=["POST"])
+def profile_start():
+    """Включить профайлер торгового потока: POST ?seconds=10&interval_ms=10 (заголовок X-Admin-Token)"""
+    if not admin_allowed():
+        return jsonify({"ok": False, "error": "нужен X-Admin-Token (ADMIN_TOKEN)"}), 403
+    if trading_thread_ident is None:
+        return jsonify({"ok": False, "error": "торговый поток не запущен"}), 409
+    seconds = request.args.get("seconds", 10.0, type=float)
+    interval = request.args.get("interval_ms", 10.0, type=float) / 1000.0
+    if not profiler.start(seconds, is_trading_thread, interval):
+        return jsonify({"ok": False, "error": "профилирование уже идет", **profiler.summary()}), 409
+    log(f"🔬 Профилирование торгового потока на {min(seconds, PROFILE_MAX_SECONDS):.0f}с", "PROFILE")
+    return jsonify({"ok": True, **profiler.summary()}), 202
+
+@app.route("/admin/profile/result")
+def profile_result():
+    """Результат последнего сеанса: JSON (сводка + топ функций) или ?format=collapsed"""
+    if not admin_allowed():
+        return jsonify({"ok": False, "error": "нужен X-Admin-Token (ADMIN_TOKEN)"}), 403
+    if request.args.get("format") == "collapsed":
+        return Response(profiler.collapsed(), mimetype="text/plain; charset=utf-8")
+    return jsonify({"ok": True, **profiler.summary(),
+                    "top": profiler.top(request.args.get("limit", 30, type=int))})
+
+@app.route("/journal")
+def journal_page():
+    """Журнал: ?symbol=&kind=&before=<id>&since=<мс>&limit= (от новых к старым, курсор next_before)"""
+    if not JOURNAL_PATH or not (journal or os.path.exists(JOURNAL_PATH)):
+        return jsonify({"ok": True, "enabled": bool(JOURNAL_PATH), "events": [], "next_before": None})
+    kind = request.args.get("kind")
+    if kind and kind not in EVENT_KINDS:
+        return jsonify({"ok": False, "error": f"kind: {', '.join(EVENT_KINDS)}"}), 400
+    try:
+        page = open_journal().query(
+            symbol=(request.args.get("symbol") or "").upper() or None,
+            kind=kind,
+            before_id=request.args.get("before", type=int),
+            since_ts=request.args.get("since", type=int),
+            limit=request.args.get("limit", 100, type=int),
+        )
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    return jsonify({"ok": True, "enabled": True, **page})
+
 @app.route("/config")
 def config():
     return jsonify({
         "symbol": SYMBOL,
+        "portfolio": [f"{symbol}:{interval}:{weight}" for symbol, interval, weight in PORTFOLIO_SPECS],
         "interval": INTERVAL,
         "ma_short": MA_SHORT,
         "ma_long": MA_LONG,
         "test_mode": TEST_MODE,
         "check_interval": CHECK_INTERVAL,
         "ma_spread_bps": MA_SPREAD_BPS,
-        "min_balance_usdt": MIN_BALANCE_USDT
+        "min_balance_usdt": MIN_BALANCE_USDT,
+        "exchange_sim_url": EXCHANGE_SIM_URL or None
     })
 
 @app.route("/config-status")
@@ -1208,12 +2231,14 @@ def config_status():
     })
 
 # ========== Автозапуск для деплоя ==========
-if API_KEY and API_SECRET:
+publish_status()
+
+if EXCHANGE_SIM_URL or (API_KEY and API_SECRET):
     try:
         if not running:
             init_client()
             running = True
-            bot_thread = threading.Thread(target=trading_loop, daemon=True)
+            bot_thread = threading.Thread(target=run_bot, daemon=True)
             bot_thread.start()
             mode = "TEST" if TEST_MODE else "LIVE"
             log(f"🚀 Торговый бот запущен автоматически в режиме {mode}", "STARTUP")
@@ -1221,17 +2246,17 @@ if API_KEY and API_SECRET:
         log(f"❌ Ошибка автозапуска бота: {e}", "ERROR")
         running = False
 else:
-    log("⚠️ Автозапуск бота пропущен: нет API ключей", "WARNING")
+    log("⚠️ Автозапуск бота пропущен: нет API ключей и EXCHANGE_SIM_URL", "WARNING")
 
 # ========== Точка входа ==========
 if __name__ == "__main__":
-    if API_KEY and API_SECRET:
+    if EXCHANGE_SIM_URL or (API_KEY and API_SECRET):
         init_client()
         
         # Запускаем торговый бот в отдельном потоке
         if not running:
             running = True
-            bot_thread = threading.Thread(target=trading_loop, daemon=True)
+            bot_thread = threading.Thread(target=run_bot, daemon=True)
             bot_thread.start()
             mode = "TEST" if TEST_MODE else "LIVE"
             log(f"🚀 Торговый бот запущен в режиме {mode}", "STARTUP")
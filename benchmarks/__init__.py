@@ -0,0 +1 @@
+# benchmarks/__init__.py - Бенчмарки горячих путей бота (python -m benchmarks.run)
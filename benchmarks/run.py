@@ -0,0 +1,391 @@
+# run.py - Воспроизводимые бенчмарки горячих путей бота с JSON бейзлайном
+#
+#   python -m benchmarks.run                 # сравнить с benchmarks/baseline.json
+#   python -m benchmarks.run --save          # записать новый бейзлайн
+#   python -m benchmarks.run --only ma,status_route --threshold 0.2
+#
+# Каждый бенчмарк - лучшее из нескольких повторов (минимум меньше всего зависит от
+# фонового шума). Регрессия - время на операцию больше бейзлайна на threshold (по умолчанию
+# 50%), код выхода 1, но только если она подтверждается перемером с более долгими
+# прогонами (--recheck). Бейзлайн хранит отпечаток машины и интерпретатора: на другой
+# машине сравнение печатается, но не валит запуск.
+# Бот работает против поддельного клиента в памяти - без сети и без API ключей.
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+STATE_DIR = tempfile.mkdtemp(prefix="bot-bench-")
+
+# Окружение бота до импорта web_bot: тестовый режим, без журнала, логи только ошибок
+os.environ.update({
+    "TEST_MODE": "true",
+    "BINANCE_API_KEY": "",
+    "BINANCE_API_SECRET": "",
+    "PORTFOLIO": "",
+    "SYMBOL": "BNBUSDT",
+    "INTERVAL": "1m",
+    "JOURNAL_PATH": "",
+    "EXCHANGE_INFO_PATH": "",
+    "STATE_PATH": os.path.join(STATE_DIR, "state.json"),
+    "MARKET_DATA_MODE": "rest",
+    "LOG_LEVEL": os.environ.get("BENCH_LOG_LEVEL", "ERROR"),
+})
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, ROOT)
+
+from app import web_bot  # noqa: E402
+from app.async_engine import AsyncCycleEngine  # noqa: E402
+from app.indicators import SMA  # noqa: E402
+from app.order_book import LocalOrderBook  # noqa: E402
+from app.rate_limit import RateLimitedClient, WeightLimiter  # noqa: E402
+from app.rounding import Quantizer, round_step, round_tick  # noqa: E402
+
+MINUTE_MS = 60_000
+
+
+class FakeClient:
+    """Минимальный binance.Client в памяти: растущая цена, аккаунт держит BNB"""
+
+    def __init__(self):
+        self.timestamp_offset = 0
+        self.response = None
+        self.session = requests.Session()
+
+    def get_klines(self, symbol: str, interval: str, limit: int = 500, startTime: Optional[int] = None):
+        now_open = int(time.time() * 1000) // MINUTE_MS * MINUTE_MS
+        first = startTime if startTime is not None else now_open - (limit - 1) * MINUTE_MS
+        klines = []
+        for open_time in range(first, now_open + 1, MINUTE_MS)[:limit]:
+            close = 600.0 + (open_time // MINUTE_MS % 100_000) * 0.01
+            klines.append([open_time, "0", "0", "0", f"{close:.2f}", "0", open_time + MINUTE_MS - 1])
+        return klines
+
+    def get_account(self, **params):
+        return {"balances": [
+            {"asset": "USDT", "free": "5.00000000", "locked": "0.00000000"},
+            {"asset": "BNB", "free": "1.50000000", "locked": "0.00000000"},
+        ]}
+
+    def get_exchange_info(self):
+        return {"symbols": [{
+            "symbol": "BNBUSDT", "status": "TRADING", "baseAsset": "BNB", "quoteAsset": "USDT",
+            "quoteAssetPrecision": 8, "quoteOrderQtyMarketAllowed": True,
+            "filters": [
+                {"filterType": "LOT_SIZE", "stepSize": "0.00100000", "minQty": "0.00100000"},
+                {"filterType": "PRICE_FILTER", "tickSize": "0.01000000"},
+                {"filterType": "NOTIONAL", "minNotional": "10.00000000", "maxNotional": "9000000.00000000",
+                 "applyMinToMarket": True},
+            ],
+        }]}
+
+    def ping(self):
+        return {}
+
+
+def install_fake_client():
+    # Лимит веса не должен ограничивать: измеряется код бота, а не ожидание лимитера
+    web_bot.client = RateLimitedClient(FakeClient(), WeightLimiter(10**9))
+    web_bot.asset_switcher = web_bot.AssetSwitcher(web_bot.client, web_bot.SYMBOL)
+    runner = web_bot.SymbolRunner(web_bot.SYMBOL, web_bot.INTERVAL, web_bot.bot_status,
+                                  web_bot.STATE_PATH, web_bot.asset_switcher)
+    runner.prepare()
+    return runner
+
+
+# ========== Бенчмарки: setup() -> операция ==========
+def bench_ma():
+    # Новое закрытие и чтение значения, как в MovingAverageEngine.sync()
+    sma = SMA(25)
+    sma.reset([600.0 + i * 0.01 for i in range(200)])
+
+    def op():
+        sma.update(602.0)
+        return sma.value
+    return op
+
+
+def bench_round_step():
+    return lambda: round_step(1.23456789, 0.001)
+
+
+def bench_round_tick():
+    return lambda: round_tick(612.345678, 0.01)
+
+
+def bench_quantize_qty_str():
+    quantizer = Quantizer("0.00100000", "0.01000000")
+    return lambda: quantizer.qty_str(1.23456789)
+
+
+def make_order_book(levels: int = 1000) -> LocalOrderBook:
+    """Стакан BNBUSDT: по `levels` уровней с шагом 0.01 вокруг 600"""
+    book = LocalOrderBook("BNBUSDT")
+    book.apply_snapshot({
+        "lastUpdateId": 1,
+        "bids": [(f"{599.99 - i * 0.01:.2f}", "1.5") for i in range(levels)],
+        "asks": [(f"{600.01 + i * 0.01:.2f}", "1.5") for i in range(levels)],
+    })
+    return book
+
+
+def bench_order_book_diff():
+    book = make_order_book()
+    # 10 уровней на сторону: половина удаляется, половина появляется снова
+    events = [
+        {"b": [(f"{599.99 - i * 0.01:.2f}", "0" if (i + k) % 2 else "2.0") for i in range(10)],
+         "a": [(f"{600.01 + i * 0.01:.2f}", "0" if (i + k) % 2 else "2.0") for i in range(10)]}
+        for k in range(2)
+    ]
+    seq = [book.last_update_id]
+
+    def op():
+        event = events[seq[0] % 2]
+        event["U"] = seq[0] + 1
+        event["u"] = seq[0] = seq[0] + 3
+        book.apply_diff(event)
+    return op
+
+
+def bench_order_book_depth_to_price():
+    book = make_order_book()
+    return lambda: book.depth_to_price("BUY", 600.30)
+
+
+def bench_order_book_spread():
+    book = make_order_book()
+    return book.spread_bps
+
+
+def bench_asset_preference():
+    switcher = web_bot.AssetSwitcher(None, "BNBUSDT")
+    return lambda: switcher.get_current_asset_preference(5.0, 1.5, 612.34)
+
+
+def bench_trading_cycle_sync():
+    runner = install_fake_client()
+    web_bot.cycle_engine = None
+
+    def cycle():
+        web_bot.balance_service.begin_cycle()
+        web_bot.health_check(runner)
+        runner.update_market()
+        runner.decide(lambda refresh: web_bot.get_balances(web_bot.SYMBOL, refresh))
+        web_bot.save_state(runner.status, runner.state_path)
+    return cycle
+
+
+def bench_trading_cycle_async():
+    runner = install_fake_client()
+    web_bot.cycle_engine = AsyncCycleEngine()
+
+    def cycle():
+        web_bot.balance_service.begin_cycle()
+        web_bot.cycle_engine.run(web_bot.main_cycle_async(runner))
+        web_bot.save_state(runner.status, runner.state_path)
+    return cycle
+
+
+def bench_save_state_unchanged():
+    status = dict(web_bot.bot_status)
+    path = os.path.join(STATE_DIR, "unchanged.json")
+    web_bot.save_state(status, path)
+
+    def op():
+        status["uptime"] = status.get("uptime", 0) + 1
+        web_bot.save_state(status, path)
+    return op
+
+
+def bench_save_state_changed():
+    status = dict(web_bot.bot_status)
+    path = os.path.join(STATE_DIR, "changed.json")
+
+    def op():
+        status["switches_count"] = status.get("switches_count", 0) + 1
+        web_bot.save_state(status, path)
+    return op
+
+
+def bench_status_route():
+    web_bot.publish_status()
+    http = web_bot.app.test_client()
+    return lambda: http.get("/status")
+
+
+BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {
+    "ma": bench_ma,
+    "round_step": bench_round_step,
+    "round_tick": bench_round_tick,
+    "quantize_qty_str": bench_quantize_qty_str,
+    "order_book_diff": bench_order_book_diff,
+    "order_book_depth_to_price": bench_order_book_depth_to_price,
+    "order_book_spread": bench_order_book_spread,
+    "get_current_asset_preference": bench_asset_preference,
+    "trading_cycle_sync": bench_trading_cycle_sync,
+    "trading_cycle_async": bench_trading_cycle_async,
+    "save_state_unchanged": bench_save_state_unchanged,
+    "save_state_changed": bench_save_state_changed,
+    "status_route": bench_status_route,
+}
+
+
+# Во сколько раз длиннее прогоны при перепроверке регрессии
+RECHECK_FACTOR = 5
+
+
+def measure(op: Callable[[], object], min_time: float = 0.2, repeat: int = 5) -> Dict[str, float]:
+    """Наносекунд на операцию: лучшее из repeat прогонов по ~min_time секунд"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 10 or number >= 1_000_000:
+            break
+        number *= 10
+    # Подгоняем число операций под ~min_time секунд на прогон
+    number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            op()
+        best = min(best, (time.perf_counter() - started) / number)
+    return {"ns_per_op": round(best * 1e9, 1), "ops_per_run": number}
+
+
+def run(names: List[str], min_time: float, repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name in names:
+        op = BENCHMARKS[name]()
+        op()  # прогрев: загрузка истории свечей, кэши
+        results[name] = measure(op, min_time, repeat)
+        print(f"  {name:<32} {format_ns(results[name]['ns_per_op']):>12}", flush=True)
+    if web_bot.cycle_engine:
+        web_bot.cycle_engine.close()
+        web_bot.cycle_engine = None
+    return results
+
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[str]:
+    """Список регрессий: время на операцию выросло больше чем на threshold"""
+    regressions = []
+    print(f"\n  {'бенчмарк':<32} {'бейзлайн':>12} {'сейчас':>12} {'изменение':>10}")
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"  {name:<32} {'-':>12} {format_ns(current['ns_per_op']):>12} {'новый':>10}")
+            continue
+        ratio = current["ns_per_op"] / base["ns_per_op"] - 1
+        mark = " РЕГРЕССИЯ" if ratio > threshold else ""
+        print(f"  {name:<32} {format_ns(base['ns_per_op']):>12} {format_ns(current['ns_per_op']):>12} "
+              f"{ratio * 100:>+9.1f}%{mark}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def fingerprint() -> Dict[str, str]:
+    """Машина и интерпретатор бейзлайна: на другой сравнение только информационное"""
+    return {
+        "python": f"{platform.python_implementation()} {platform.python_version()}",
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "cpus": str(os.cpu_count()),
+    }
+
+
+def recheck(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            regressions: List[str], threshold: float, min_time: float, repeat: int,
+            rounds: int) -> List[str]:
+    """Перемерить только отмеченные бенчмарки с прогонами в RECHECK_FACTOR раз длиннее
+
+    Разовый выброс (фоновая нагрузка, частота CPU) не должен валить проверку: регрессия
+    засчитывается, только если подтверждается на каждом более долгом замере.
+    """
+    for _ in range(rounds):
+        if not regressions:
+            break
+        min_time *= RECHECK_FACTOR
+        print(f"\n🔁 Перепроверка ({min_time:g}с на прогон): {', '.join(regressions)}")
+        for name, current in run(regressions, min_time, repeat).items():
+            if current["ns_per_op"] < results[name]["ns_per_op"]:
+                results[name] = current
+        regressions = compare({name: results[name] for name in regressions}, baseline, threshold)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей бота")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON файл бейзлайна")
+    parser.add_argument("--save", action="store_true", help="записать результаты как новый бейзлайн")
+    parser.add_argument("--threshold", type=float, default=0.5, help="допустимое замедление (0.5 = 50%%)")
+    parser.add_argument("--only", default="", help="список бенчмарков через запятую")
+    parser.add_argument("--min-time", type=float, default=0.2, help="секунд на один прогон")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--recheck", type=int, default=2,
+                        help="сколько раз перемерить регрессии более долгими прогонами перед ошибкой")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.only.split(",") if n.strip()] or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"неизвестные бенчмарки: {', '.join(unknown)} (есть: {', '.join(BENCHMARKS)})")
+
+    print(f"🏁 Бенчмарки ({platform.python_implementation()} {platform.python_version()}, {platform.machine()})")
+    results = run(names, args.min_time, args.repeat)
+
+    if args.save:
+        previous = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                previous = json.load(f).get("results", {})
+        previous.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({**fingerprint(), "results": previous}, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n💾 Бейзлайн записан: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n⚠️ Нет бейзлайна {args.baseline} - запустите с --save")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    mismatch = {key: (baseline.get(key), value) for key, value in fingerprint().items()
+                if baseline.get(key) != value}
+    regressions = compare(results, baseline.get("results", {}), args.threshold)
+    if mismatch:
+        for key, (recorded, current) in mismatch.items():
+            print(f"\n⚠️ {key}: бейзлайн {recorded}, сейчас {current}")
+        print("⚠️ Бейзлайн записан на другой машине - сравнение без гейта (перезапишите с --save)")
+        return 0
+    regressions = recheck(results, baseline.get("results", {}), regressions, args.threshold,
+                          args.min_time, args.repeat, args.recheck)
+    if regressions:
+        print(f"\n❌ Регрессии больше {args.threshold * 100:.0f}%: {', '.join(regressions)}")
+        return 1
+    print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Проверка асинхронного ядра: независимые блокирующие вызовы идут параллельно
+"""
+import time
+
+from app.async_engine import AsyncCycleEngine
+
+
+def test_gather_runs_blocking_calls_concurrently():
+    engine = AsyncCycleEngine(max_workers=4)
+
+    def boom():
+        raise RuntimeError("нет связи")
+
+    async def cycle():
+        results = await engine.gather({
+            "balances": lambda: time.sleep(0.2) or "balances",
+            "market": lambda: time.sleep(0.2) or "market",
+            "health": boom,
+        })
+        return results, await engine.call(lambda a, b: a + b, 1, 2)
+
+    try:
+        started = time.perf_counter()
+        results, total = engine.run(cycle())
+        assert time.perf_counter() - started < 0.35
+        assert results["balances"] == "balances" and results["market"] == "market"
+        assert isinstance(results["health"], RuntimeError)
+        assert total == 3
+        assert engine.stats()["cycles"] == 1
+    finally:
+        engine.close()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Сверка векторизованного бэктеста с пошаговой симуляцией торгового цикла
+"""
+import numpy as np
+
+from app.backtest import (FEE_HAIRCUT, MIN_BUY_USDT, BacktestParams, KlineHistory,
+                          resample, run_backtest)
+from app.rounding import round_step
+
+
+def naive_backtest(closes, params):
+    """Прямой перенос правил торгового цикла: sum(window) / period (как SMA) на каждой свече"""
+    usdt, base, switches = params.initial_usdt, 0.0, 0
+    for i in range(len(closes)):
+        prices = closes[: i + 1].tolist()
+        if len(prices) < params.ma_long:
+            continue
+        price = prices[-1]
+        m1 = sum(prices[-params.ma_short:]) / params.ma_short
+        m2 = sum(prices[-params.ma_long:]) / params.ma_long
+        if usdt + base * price < params.min_balance_usdt:
+            continue
+        should_base = m1 > m2
+        base_value = base * price
+        holding_base = base_value > usdt and base_value > 1.0
+        if abs((m1 - m2) / price) * 10000.0 < params.ma_spread_bps or should_base == holding_base:
+            continue
+        if holding_base:
+            qty = round_step(base * FEE_HAIRCUT, params.step)
+            if qty > 0:
+                usdt += qty * price * (1 - params.fee)
+                base -= qty
+                switches += 1
+        else:
+            # quoteOrderQty тратит весь USDT, режим quantity - 99.9%
+            to_spend = usdt * (1.0 if params.buy_order_mode == "quote" else FEE_HAIRCUT)
+            qty = round_step(to_spend / price, params.step)
+            if qty > 0 and to_spend >= MIN_BUY_USDT:
+                usdt -= qty * price
+                base += qty * (1 - params.fee)
+                switches += 1
+    return usdt, base, switches
+
+
+def test_matches_naive_simulation():
+    rng = np.random.default_rng(3)
+    n = 3000
+    closes = 600 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    open_times = np.arange(n, dtype=np.int64) * 30 * 60_000
+    finals = {}
+    for mode in ("quote", "quantity"):
+        params = BacktestParams(interval="30m", ma_spread_bps=2.0, buy_order_mode=mode)
+
+        result = run_backtest(KlineHistory(open_times, closes), params)
+        usdt, base, switches = naive_backtest(closes, params)
+
+        assert result.switches == switches > 0
+        assert np.isclose(result.final_usdt, usdt)
+        assert np.isclose(result.final_base, base)
+        assert 0 <= result.max_drawdown_pct <= 100
+        finals[mode] = result.final_equity
+    # По умолчанию - режим quote, как BUY_ORDER_MODE торгового цикла
+    assert BacktestParams().buy_order_mode == "quote" and finals["quote"] != finals["quantity"]
+
+
+def test_resample_takes_last_close_of_period():
+    open_times = np.arange(90, dtype=np.int64) * 60_000
+    closes = np.arange(90, dtype=np.float64)
+    hist = resample(KlineHistory(open_times, closes), "30m")
+    assert hist.closes.tolist() == [29.0, 59.0, 89.0]
+    assert hist.open_times.tolist() == [0, 30 * 60_000, 60 * 60_000]
+
+
+def test_sweep_matches_single_backtest():
+    from app.sweep import build_combos, run_sweep
+
+    rng = np.random.default_rng(5)
+    n = 2000
+    closes = 600 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    hist = KlineHistory(np.arange(n, dtype=np.int64) * 30 * 60_000, closes)
+    combos = build_combos(["30m"], [5, 7], [7, 25], [0.0, 2.0])
+    assert all(short < long for _, short, long, _ in combos)
+
+    rows = run_sweep(hist, combos, BacktestParams(), processes=2)
+    assert len(rows) == len(combos)
+    for row in rows:
+        params = BacktestParams(interval="30m", ma_short=row["ma_short"], ma_long=row["ma_long"],
+                                ma_spread_bps=row["ma_spread_bps"])
+        assert np.isclose(run_backtest(hist, params).pnl_pct, row["pnl_pct"])
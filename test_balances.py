@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Проверка снимка балансов: один get_account за цикл и обновления из user data stream
+"""
+from app.balances import BalanceService
+
+
+class FakeAccount:
+    def __init__(self):
+        self.calls = 0
+        self.usdt = "1000.0"
+
+    def get_account(self):
+        self.calls += 1
+        return {"balances": [{"asset": "USDT", "free": self.usdt, "locked": "0"},
+                             {"asset": "BNB", "free": "0.5", "locked": "0"}]}
+
+
+def test_one_account_request_per_cycle():
+    account = FakeAccount()
+    service = BalanceService(account.get_account)
+
+    service.begin_cycle()
+    assert service.pair("BNBUSDT") == (1000.0, 0.5)
+    assert service.get("USDT") == 1000.0
+    assert service.pair("ETHUSDT") == (1000.0, 0.0)
+    assert account.calls == 1
+
+    # После собственного ордера - принудительное перечитывание
+    account.usdt = "700.0"
+    assert service.pair("BNBUSDT", refresh=True) == (700.0, 0.5)
+    assert account.calls == 2
+
+    service.begin_cycle()
+    service.pair("BNBUSDT")
+    assert account.calls == 3
+
+
+def test_stream_events_replace_rest_reads():
+    account = FakeAccount()
+    alive = [True]
+    service = BalanceService(account.get_account, lambda: alive[0])
+    service.refresh()
+
+    service.apply_account_position({"e": "outboundAccountPosition",
+                                    "B": [{"a": "BNB", "f": "1.25", "l": "0"}, {"a": "USDT", "f": "10.0", "l": "0"}]})
+    service.begin_cycle()
+    assert service.pair("BNBUSDT", refresh=True) == (10.0, 1.25)
+    service.apply_balance_update({"e": "balanceUpdate", "a": "USDT", "d": "5.5"})
+    assert service.get("USDT") == 15.5
+    assert account.calls == 1
+
+    # Поток упал - снова REST
+    alive[0] = False
+    service.begin_cycle()
+    assert service.pair("BNBUSDT") == (1000.0, 0.5)
+    assert account.calls == 2
+
+
+def test_fills_reconcile_snapshot_without_account_request():
+    account = FakeAccount()
+    service = BalanceService(account.get_account)
+    service.refresh()
+    service.updated -= 10          # снимок получен до отправки ордера
+    sent_at = service.updated + 5
+
+    order = {"side": "BUY", "status": "FILLED", "executedQty": "0.99900000", "cummulativeQuoteQty": "600.00000000",
+             "fills": [{"price": "600.00", "qty": "0.999", "commission": "0.000999", "commissionAsset": "BNB"}]}
+    assert service.apply_fills("BNBUSDT", [order], sent_at)
+    usdt, bnb = service.pair("BNBUSDT")
+    assert usdt == 400.0
+    assert abs(bnb - (0.5 + 0.999 - 0.000999)) < 1e-12
+    assert account.calls == 1
+
+    # Снимок обновлен уже после отправки ордера - исполнение в нем учтено
+    service.refresh()
+    assert service.apply_fills("BNBUSDT", [order], sent_at)
+    assert service.pair("BNBUSDT") == (1000.0, 0.5)
+    assert service.stats()["fills_applied"] == 1
+
+    # Ответ без fills (newOrderRespType=ACK) - нужен перечитанный снимок
+    assert not service.apply_fills("BNBUSDT", [{"side": "BUY", "status": "NEW"}], sent_at)
+
+
+def test_quote_order_buy_against_simulator(monkeypatch):
+    """BUY_ORDER_MODE=quote: quoteOrderQty с точностью котировки, minNotional и запасной путь quantity"""
+    import dataclasses
+
+    import numpy as np
+
+    from app import web_bot
+    from app.backtest import KlineHistory
+    from app.exchange_info import ExchangeInfoCache
+    from app.exchange_sim import ExchangeSimulator, SimConfig, SimServer, SimulatedClient
+
+    n = 400
+    open_times = 1_700_000_000_000 // 60_000 * 60_000 + np.arange(n, dtype=np.int64) * 60_000
+    sim = ExchangeSimulator({"BNBUSDT": KlineHistory(open_times, np.full(n, 600.0))},
+                            SimConfig(speed=0, balances={"USDT": 1000.0}), start_ms=int(open_times[300]))
+    server = SimServer(sim).start()
+    try:
+        sent = []
+
+        class RecordingClient(SimulatedClient):
+            def order_market_buy(self, **params):
+                sent.append(params)
+                return super().order_market_buy(**params)
+
+        client = RecordingClient(server.url)
+        filters = ExchangeInfoCache(client.get_exchange_info).get("BNBUSDT")
+        assert filters.quote_order_allowed and filters.min_notional == 10.0
+        monkeypatch.setattr(web_bot, "TEST_MODE", False)
+        monkeypatch.setattr(web_bot, "BUY_ORDER_MODE", "quote")
+        switcher = web_bot.AssetSwitcher(client, "BNBUSDT")
+
+        # Сумма округляется вниз до точности котировки (здесь 2 знака), а не вверх
+        cents = dataclasses.replace(filters, quote_precision=2, quantizer=None)
+        assert switcher._buy_base_with_usdt(123.456789, 600.0, cents)
+        assert sent[-1] == {"symbol": "BNBUSDT", "quoteOrderQty": "123.45"}
+        # Симулятор, как и биржа, режет количество до шага лота: потрачено не больше запрошенного
+        assert 122.0 < float(switcher.last_orders[0]["cummulativeQuoteQty"]) <= 123.45
+
+        # Меньше minNotional - ордер не отправляется
+        assert not switcher._buy_base_with_usdt(9.99, 600.0, filters)
+        assert len(sent) == 1
+
+        # Пара без quoteOrderQty - покупка количеством с запасом на комиссию
+        no_quote = dataclasses.replace(filters, quote_order_allowed=False)
+        assert switcher._buy_base_with_usdt(120.0, 600.0, no_quote)
+        assert sent[-1] == {"symbol": "BNBUSDT", "quantity": "0.199"}
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Проверка кэша exchangeInfo: один запрос на все символы, NOTIONAL/MIN_NOTIONAL, теплый старт
+"""
+import time
+
+import pytest
+
+from app.exchange_info import ExchangeInfoCache, is_filter_failure
+
+
+def exchange_info():
+    return {"symbols": [
+        {"symbol": "BNBUSDT", "status": "TRADING", "baseAsset": "BNB", "quoteAsset": "USDT", "filters": [
+            {"filterType": "PRICE_FILTER", "tickSize": "0.10000000"},
+            {"filterType": "LOT_SIZE", "stepSize": "0.00100000", "minQty": "0.00100000"},
+            {"filterType": "NOTIONAL", "minNotional": "5.00000000", "applyMinToMarket": True,
+             "maxNotional": "9000000.00000000"},
+        ]},
+        {"symbol": "SHIBUSDT", "status": "TRADING", "baseAsset": "SHIB", "quoteAsset": "USDT", "filters": [
+            {"filterType": "PRICE_FILTER", "tickSize": "0.00000001"},
+            {"filterType": "LOT_SIZE", "stepSize": "1.00000000", "minQty": "1.00000000"},
+            {"filterType": "MIN_NOTIONAL", "minNotional": "1.00000000", "applyToMarket": False},
+        ]},
+    ]}
+
+
+class Fetcher:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return exchange_info()
+
+
+def test_one_request_serves_all_symbols(tmp_path):
+    fetch = Fetcher()
+    cache = ExchangeInfoCache(fetch, str(tmp_path / "info.json"), ttl=3600)
+
+    bnb = cache.get("BNBUSDT")
+    shib = cache.get("SHIBUSDT")
+    assert fetch.calls == 1
+    assert (bnb.step_size, bnb.tick_size, bnb.min_notional, bnb.max_notional) == (0.001, 0.1, 5.0, 9000000.0)
+    assert (shib.step_size, shib.min_notional, shib.apply_min_to_market) == (1.0, 1.0, False)
+    assert cache.get("BNBUSDT") is bnb
+
+    # Неизвестный символ - ошибка вместо значений по умолчанию; повторное обновление не
+    # раньше min_refresh_interval после предыдущей попытки
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            cache.get("XYZUSDT")
+    assert fetch.calls == 1 and cache.stats()["throttled"] == 3
+    cache.attempted_at -= cache.min_refresh_interval
+    with pytest.raises(KeyError):
+        cache.get("XYZUSDT")
+    assert fetch.calls == 2
+
+
+def test_warm_start_ttl_and_filter_failure(tmp_path):
+    path = str(tmp_path / "info.json")
+    ExchangeInfoCache(Fetcher(), path).get("BNBUSDT")
+
+    # Перезапуск: фильтры с диска, без запроса к бирже
+    fetch = Fetcher()
+    cache = ExchangeInfoCache(fetch, path, ttl=3600)
+    assert cache.get("BNBUSDT").min_notional == 5.0
+    assert fetch.calls == 0
+
+    # -1013 сбрасывает кэш: следующий get перечитывает exchangeInfo
+    error = Exception("Filter failure: NOTIONAL")
+    error.code = -1013
+    assert is_filter_failure(error)
+    cache.invalidate()
+    cache.get("BNBUSDT")
+    assert fetch.calls == 1
+
+    # Биржа недоступна после истечения TTL - работаем на прежних фильтрах
+    def failing():
+        raise ConnectionError("offline")
+    stale = ExchangeInfoCache(failing, path, ttl=0.001)
+    time.sleep(0.01)
+    assert stale.get("SHIBUSDT").step_size == 1.0
+    assert stale.get("BNBUSDT").min_notional == 5.0
+    assert stale.stats()["failures"] == 1 and stale.stats()["throttled"] == 1
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Проверка симулятора биржи через настоящий python-binance Client
+"""
+import numpy as np
+import pytest
+from binance.exceptions import BinanceAPIException
+
+from app.backtest import KlineHistory, resample
+from app.exchange_sim import ExchangeSimulator, SimConfig, SimServer, SimulatedClient
+from app.market_data import KlineStore
+
+
+def make_sim(**config):
+    n = 600
+    open_times = 1_700_000_000_000 // 60_000 * 60_000 + np.arange(n, dtype=np.int64) * 60_000
+    hist = KlineHistory(open_times, 600.0 + np.arange(n, dtype=np.float64) / 10)
+    sim = ExchangeSimulator({"BNBUSDT": hist}, SimConfig(speed=0, **config), start_ms=int(open_times[300]))
+    server = SimServer(sim).start()
+    return sim, server, hist
+
+
+def test_klines_replay_and_incremental_store():
+    sim, server, hist = make_sim()
+    try:
+        client = SimulatedClient(server.url)
+        expected = resample(KlineHistory(hist.open_times[:301], hist.closes[:301]), "5m")
+        klines = client.get_klines(symbol="BNBUSDT", interval="5m", limit=20)
+        assert [k[0] for k in klines] == expected.open_times[-20:].tolist()
+        assert [float(k[4]) for k in klines] == expected.closes[-20:].tolist()
+
+        store = KlineStore(client, "BNBUSDT", "5m", capacity=50)
+        store.refresh()
+        sim.advance(12 * 60_000)
+        client.ping()  # смещение времени клиента подстраивается по X-Sim-Time
+        store.refresh()
+        assert store.last_close() == hist.closes[312]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_market_orders_fill_with_slippage_and_fee():
+    sim, server, _ = make_sim(slippage_bps=10, fee=0.001)
+    try:
+        client = SimulatedClient(server.url)
+        price = sim.last_price("BNBUSDT")
+        order = client.order_market_buy(symbol="BNBUSDT", quantity="1.000")
+        assert order["status"] == "FILLED"
+        assert float(order["fills"][0]["price"]) == pytest.approx(price * 1.001)
+        assert float(client.get_asset_balance("BNB")["free"]) == pytest.approx(0.999)
+
+        with pytest.raises(BinanceAPIException) as e:
+            client.order_market_buy(symbol="BNBUSDT", quantity="0.0005")
+        assert e.value.code == -1013
+        with pytest.raises(BinanceAPIException) as e:
+            client.order_market_buy(symbol="BNBUSDT", quantity="5")
+        assert e.value.code == -2010
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_rate_limit_injection():
+    sim, server, _ = make_sim(weight_limit=30)
+    try:
+        client = SimulatedClient(server.url)
+        with pytest.raises(BinanceAPIException) as e:
+            for _ in range(20):
+                client.get_account()
+        assert e.value.status_code == 429 and e.value.code == -1003
+        assert client.response.headers["Retry-After"] == "1"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_trading_loop_cycle_against_simulator(tmp_path, monkeypatch):
+    """EXCHANGE_SIM_URL без API ключей: цикл идет по ценам и балансам симулятора, а не по заглушкам"""
+    from app import web_bot
+
+    sim, server, hist = make_sim()
+    try:
+        for name, value in {"EXCHANGE_SIM_URL": server.url, "API_KEY": "", "API_SECRET": "", "TEST_MODE": False,
+                            "SYMBOL": "BNBUSDT", "INTERVAL": "5m", "STATE_PATH": str(tmp_path / "state.json"),
+                            "EXCHANGE_INFO_PATH": "", "JOURNAL_PATH": "", "exchange_info": None,
+                            "asset_switcher": None, "http_warmer": None, "bot_status": dict(web_bot.bot_status)}.items():
+            monkeypatch.setattr(web_bot, name, value)
+        # Один цикл: ожидание следующего цикла останавливает бота
+        monkeypatch.setattr(web_bot, "wait_next_cycle", lambda near_threshold=False: setattr(web_bot, "running", False))
+        monkeypatch.setattr(web_bot, "client", None)
+
+        assert web_bot.init_client()
+        web_bot.running = True
+        web_bot.trading_loop()
+
+        # Цена растет - MA7 > MA25, бот купил BNB на USDT симулятора
+        assert web_bot.bot_status["current_price"] == sim.last_price("BNBUSDT")
+        assert web_bot.bot_status["switches_count"] == 1
+        account = {b["asset"]: float(b["free"]) for b in web_bot.client.get_account()["balances"]}
+        assert account["BNB"] > 1.0 and account.get("USDT", 0.0) < 10.0
+        # Остановленный бот не пингует биржу
+        assert not web_bot.http_warmer.running
+    finally:
+        web_bot.running = False
+        if web_bot.http_warmer:
+            web_bot.http_warmer.stop()
+        web_bot.balance_service.begin_cycle()
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Проверка исполнения по стакану: IOC части в пределах бюджета проскальзывания против
+рыночного ордера, который проходит стакан на всю глубину
+"""
+import time
+
+import numpy as np
+
+from app.backtest import KlineHistory
+from app.exchange_info import ExchangeInfoCache
+from app.exchange_sim import ExchangeSimulator, SimConfig, SimServer, SimulatedClient
+from app.execution import BookExecutor, parse_depth, report_from_orders
+
+
+def make_sim():
+    n = 600
+    open_times = 1_700_000_000_000 // 60_000 * 60_000 + np.arange(n, dtype=np.int64) * 60_000
+    hist = KlineHistory(open_times, np.full(n, 600.0))
+    config = SimConfig(speed=0, fee=0.001, book_level_qty=0.5, book_levels=40, book_spread_bps=2.0,
+                       book_level_bps=1.0, book_recovery_ms=5000.0, balances={"USDT": 20000.0})
+    sim = ExchangeSimulator({"BNBUSDT": hist}, config, start_ms=int(open_times[300]))
+    return sim, SimServer(sim).start()
+
+
+def test_sliced_ioc_stays_within_budget():
+    sim, server = make_sim()
+    try:
+        client = SimulatedClient(server.url)
+        filters = ExchangeInfoCache(client.get_exchange_info).get("BNBUSDT")
+        depth = lambda: parse_depth(client.get_order_book(symbol="BNBUSDT", limit=100))
+        executor = BookExecutor(client, "BNBUSDT", filters, depth, max_slippage_bps=5.0, max_slices=6,
+                                slice_interval=1.0, sleep=lambda s: sim.advance(10_000))
+
+        report = executor.execute("BUY", 3000.0)
+        assert report.reason == "исполнено"
+        assert report.slices > 1
+        assert all(o["type"] == "LIMIT" and o["timeInForce"] == "IOC" for o in report.orders)
+        assert report.quote <= 3000.0 and report.quote > 3000.0 * 0.99
+        assert 0 < report.slippage_bps <= 5.0
+
+        # Тот же объем одним рыночным ордером проходит стакан глубже
+        sim.advance(600_000)
+        order = client.order_market_buy(symbol="BNBUSDT", quantity=f"{report.filled_qty:.3f}")
+        market = report_from_orders("BUY", [order], 3000.0, 600.0)
+        assert len(order["fills"]) > 5
+        assert market.slippage_bps > report.slippage_bps + 2
+
+        # Продажа упирается в лимит частей, если стакан не успевает восстановиться
+        sim.advance(600_000)
+        stuck = BookExecutor(client, "BNBUSDT", filters, depth, max_slippage_bps=3.0, max_slices=2,
+                             slice_interval=0.0, sleep=lambda s: None)
+        sale = stuck.execute("SELL", 5.0)
+        assert sale.reason in ("исчерпан лимит частей", "нет ликвидности в пределах бюджета")
+        assert 0 < sale.filled_qty < 5.0
+        assert sale.slippage_bps <= 3.0
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_partial_book_switch_is_finished_next_cycle(tmp_path, monkeypatch):
+    """После продажи 60% коина бот по стоимости уже "держит" USDT, но остаток все равно продается"""
+    from app import web_bot
+
+    monkeypatch.setattr(web_bot, "TEST_MODE", True)
+    switcher = web_bot.AssetSwitcher(None, "BNBUSDT")
+    runner = web_bot.SymbolRunner("BNBUSDT", "5m", {}, str(tmp_path / "state.json"), switcher)
+    runner.filters = web_bot.TEST_FILTERS
+    runner.price, runner.m1, runner.m2 = 600.0, 590.0, 600.0       # сигнал: держать USDT
+
+    # Частичное исполнение по стакану: 0.6 BNB продано, 0.4 BNB ($240) осталось
+    switcher.unfinished_to = "USDT"
+    switcher.last_switch_time = time.time()
+    sold = []
+    monkeypatch.setattr(switcher, "execute_switch",
+                        lambda src, dst, balance, price, filters: sold.append((src, dst, balance)) or True)
+    runner.decide(lambda refresh: (360.0, 0.4))
+    assert sold == [("BNB", "USDT", 0.4)]
+
+    # Остаток меньше minNotional - переключение считается законченным
+    switcher.unfinished_to = "USDT"
+    runner.decide(lambda refresh: (599.0, 0.01))
+    assert len(sold) == 1 and switcher.unfinished_to is None
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Сверка инкрементальных MA с пересчетом с нуля
+"""
+import math
+import random
+
+from app.indicators import EMA, SMA, WMA, MovingAverageEngine
+from app.market_data import KlineStore
+from test_market_data import FakeKlineClient
+
+
+def ma(arr, period):
+    if len(arr) < period:
+        return None
+    return sum(arr[-period:]) / period
+
+
+def wma(arr, period):
+    if len(arr) < period:
+        return None
+    window = arr[-period:]
+    return sum((i + 1) * v for i, v in enumerate(window)) / (period * (period + 1) / 2)
+
+
+def test_sma_and_wma_match_full_recompute_with_replacements():
+    rng = random.Random(7)
+    closes = []
+    sma, wma_ = SMA(25, recompute_every=50), WMA(7)
+    for i in range(2000):
+        price = round(600 + rng.uniform(-5, 5), 2)
+        if closes and i % 3:
+            closes[-1] = price
+            sma.replace_last(price)
+            wma_.replace_last(price)
+        else:
+            closes.append(price)
+            sma.update(price)
+            wma_.update(price)
+        # SMA - бит в бит как сумма окна, WMA - с точностью до округления
+        assert sma.value == ma(closes, 25)
+        got, want = wma_.value, wma(closes, 7)
+        assert (got is None) == (want is None)
+        if want is not None:
+            assert math.isclose(got, want, rel_tol=1e-12)
+
+
+def test_ema_replace_last_equals_fresh_update():
+    rng = random.Random(1)
+    closes = [100 + rng.uniform(-1, 1) for _ in range(100)]
+    a = EMA(10)
+    a.reset(closes[:-1] + [50.0])
+    a.replace_last(closes[-1])
+    b = EMA(10)
+    b.reset(closes)
+    assert math.isclose(a.value, b.value, rel_tol=1e-12)
+
+
+def test_engine_follows_store():
+    client = FakeKlineClient(200)
+    store = KlineStore(client, "BNBUSDT", "1m", capacity=100)
+    store.refresh()
+    engine = MovingAverageEngine(7, 25)
+    engine.sync(store)
+
+    store.apply_stream_kline(client.klines[-1][0], 123.0)
+    store.apply_stream_kline(client.klines[-1][0] + client.step, 321.0)
+    m1, m2 = engine.sync(store)
+    closes = store.get_closes(100)
+    assert (m1, m2) == (ma(closes, 7), ma(closes, 25))
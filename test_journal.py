@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Проверка журнала сделок: пакетная запись и keyset пагинация
+"""
+from app.journal import TradeJournal
+
+ORDER = {
+    "orderId": 42, "side": "BUY", "type": "MARKET", "status": "FILLED", "transactTime": 1_700_000_000_000,
+    "executedQty": "1.5", "cummulativeQuoteQty": "901.5",
+    "fills": [
+        {"price": "600.0", "qty": "1.0", "commission": "0.001", "commissionAsset": "BNB", "tradeId": 1},
+        {"price": "603.0", "qty": "0.5", "commission": "0.0005", "commissionAsset": "BNB", "tradeId": 2},
+    ],
+}
+
+
+def test_batched_writes_and_pagination(tmp_path):
+    journal = TradeJournal(str(tmp_path / "journal.db"), flush_interval=0.05)
+    for i in range(250):
+        journal.record("signal", "BNBUSDT" if i % 2 else "ETHUSDT", interval="1m", price=600.0 + i,
+                       ma_short=1.0, ma_long=2.0, decision="hold", spread_bps=3.5)
+    journal.record_order("BNBUSDT", ORDER, interval="1m")
+    journal.flush()
+    assert journal.stats()["written"] == 253
+    assert journal.stats()["batches"] < 253
+
+    order = journal.query(kind="order")["events"][0]
+    assert order["price"] == 601.0 and order["qty"] == 1.5 and order["status"] == "FILLED"
+    fills = journal.query(kind="fill")["events"]
+    assert [f["trade_id"] for f in fills] == [2, 1] and fills[0]["commission_asset"] == "BNB"
+
+    seen, cursor = [], None
+    while True:
+        page = journal.query(symbol="BNBUSDT", kind="signal", before_id=cursor, limit=40)
+        seen += [e["id"] for e in page["events"]]
+        cursor = page["next_before"]
+        if cursor is None:
+            break
+    assert len(seen) == 125 and seen == sorted(seen, reverse=True)
+    assert journal.query(symbol="ETHUSDT", limit=1)["events"][0]["spread_bps"] == 3.5
+    journal.close()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Проверка логирования: пороги по компонентам, JSON формат, фоновая запись пачками
+"""
+import json
+
+import pytest
+
+from app import logger
+
+
+def test_thresholds_json_and_batched_writer(capsys):
+    try:
+        logger.configure(level="INFO", components="CONFIG=WARN,DEBUG=DEBUG", fmt="json", async_write=True)
+        assert not logger.enabled("CONFIG") and logger.enabled("DEBUG") and logger.enabled("TRADE")
+        logger.log("скрыто", "CONFIG")
+        for i in range(100):
+            logger.log(f"сообщение {i}", "TRADE")
+        logger.log("ошибка", "ERROR")
+        logger.flush()
+
+        lines = capsys.readouterr().out.splitlines()
+        records = [json.loads(line) for line in lines]
+        assert len(records) == 101
+        assert records[0]["tag"] == "TRADE" and records[0]["msg"] == "сообщение 0"
+        assert records[-1]["level"] == "ERROR"
+    finally:
+        logger.configure(level="INFO", components="", fmt="text", async_write=False)
+    logger.log("синхронно", "INFO")
+    assert capsys.readouterr().out.endswith("[INFO] синхронно\n")
+
+
+def test_invalid_level_does_not_block_other_settings(monkeypatch):
+    from app import web_bot
+
+    monkeypatch.setenv("LOG_LEVEL", "LOUD")
+    monkeypatch.setenv("LOG_COMPONENTS", "CONFIG=OFF")
+    monkeypatch.setenv("LOG_FORMAT", "json")
+    monkeypatch.setenv("LOG_ASYNC", "false")
+    try:
+        config = web_bot.EnvironmentConfig()
+        assert logger._threshold == logger.LEVELS["INFO"] and logger._json_format
+        assert not logger.enabled("CONFIG") and logger._writer is None
+        assert any("LOUD" in issue for issue in config.config_status.configuration_issues)
+
+        # Ошибка разбора не меняет текущую настройку частично
+        with pytest.raises(ValueError):
+            logger.configure(level="ERROR", components="CONFIG=LOUD")
+        assert logger._threshold == logger.LEVELS["INFO"]
+    finally:
+        logger.configure(level="INFO", components="", fmt="text", async_write=False)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Проверка инкрементального кэша свечей на фейковом клиенте
+"""
+import time
+
+from app.market_data import KlineStore, interval_to_ms
+
+
+class FakeKlineClient:
+    """Отдает свечи из заранее сгенерированного ряда, фиксирует запросы"""
+
+    def __init__(self, count: int, interval: str = "1m"):
+        self.step = interval_to_ms(interval)
+        now_ms = int(time.time() * 1000)
+        first_open = (now_ms // self.step - count + 1) * self.step
+        self.klines = [[first_open + i * self.step, "0", "0", "0", str(100.0 + i)] for i in range(count)]
+        self.timestamp_offset = 0
+        self.calls = []
+
+    def get_klines(self, symbol, interval, limit=500, startTime=None):
+        self.calls.append({"limit": limit, "startTime": startTime})
+        rows = self.klines
+        if startTime is not None:
+            rows = [k for k in rows if k[0] >= startTime]
+            return rows[:limit]
+        return rows[-limit:]
+
+
+def test_history_loaded_once_then_incremental():
+    client = FakeKlineClient(300)
+    store = KlineStore(client, "BNBUSDT", "1m", capacity=100)
+
+    store.refresh()
+    assert store.get_closes(100) == [float(k[4]) for k in client.klines[-100:]]
+    assert client.calls[0]["startTime"] is None
+
+    # Обновилась незакрытая свеча и появилась новая
+    client.klines[-1][4] = "999.0"
+    client.klines.append([client.klines[-1][0] + client.step, "0", "0", "0", "1000.0"])
+    store.refresh()
+
+    assert client.calls[1]["startTime"] == client.klines[-2][0]
+    assert client.calls[1]["limit"] <= 4
+    closes = store.get_closes(100)
+    assert len(closes) == 100
+    assert closes[-2:] == [999.0, 1000.0]
+    assert closes == [float(k[4]) for k in client.klines[-100:]]
+
+
+def test_get_closes_limit():
+    client = FakeKlineClient(50)
+    store = KlineStore(client, "BNBUSDT", "1m", capacity=100)
+    store.refresh()
+    assert len(store.get_closes(100)) == 50
+    assert store.get_closes(7) == [float(k[4]) for k in client.klines[-7:]]
+
+
+def test_stream_klines_update_cache_and_detect_gaps():
+    client = FakeKlineClient(30)
+    store = KlineStore(client, "BNBUSDT", "1m", capacity=100)
+    store.refresh()
+    last_open = client.klines[-1][0]
+
+    assert store.apply_stream_kline(last_open, 555.0)
+    assert store.get_closes(1) == [555.0]
+    assert store.apply_stream_kline(last_open + client.step, 556.0)
+    assert store.get_closes(2) == [555.0, 556.0]
+    # Пропущена свеча - нужна догрузка через REST
+    assert not store.apply_stream_kline(last_open + 3 * client.step, 557.0)
+    assert len(store.get_closes(100)) == 31
+
+
+def test_empty_initial_load_is_retried_in_full():
+    client = FakeKlineClient(0)
+    store = KlineStore(client, "BNBUSDT", "1m", capacity=100)
+    assert store.refresh() == 0 and store.loaded
+
+    # Биржа начала отдавать свечи: кэш пуст, поэтому снова полная загрузка, а не догрузка
+    client.klines = FakeKlineClient(20).klines
+    assert store.refresh() == 20
+    assert client.calls[-1]["startTime"] is None
+    assert store.get_closes(100) == [float(k[4]) for k in client.klines]
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Проверка метрик: гистограммы в формате Prometheus и отключение
+"""
+from app import metrics
+from app.metrics import Registry, timed
+
+
+def test_histogram_render_and_disabled_mode():
+    registry = Registry()
+    latency = registry.histogram("demo_seconds", "Задержка", ("endpoint",), buckets=(0.1, 1.0))
+    retries = registry.counter("demo_retries_total", "Повторы")
+    registry.gauge("demo_balance", "Баланс", lambda: {"USDT": 12.5, "BNB": 0.25}, ("asset",))
+
+    @timed(latency, endpoint="fast")
+    def fast():
+        return 42
+
+    assert fast() == 42
+    latency.observe(0.5, endpoint="get_klines")
+    latency.observe(3.0, endpoint="get_klines")
+    retries.inc()
+
+    text = registry.render()
+    assert '# TYPE demo_seconds histogram' in text
+    assert 'demo_seconds_bucket{endpoint="get_klines",le="0.1"} 0' in text
+    assert 'demo_seconds_bucket{endpoint="get_klines",le="1"} 1' in text
+    assert 'demo_seconds_bucket{endpoint="get_klines",le="+Inf"} 2' in text
+    assert 'demo_seconds_sum{endpoint="get_klines"} 3.5' in text
+    assert 'demo_seconds_count{endpoint="fast"} 1' in text
+    assert 'demo_retries_total 1' in text
+    assert 'demo_balance{asset="USDT"} 12.5' in text
+
+    metrics.set_enabled(False)
+    try:
+        assert fast() == 42
+        latency.observe(0.01, endpoint="fast")
+        retries.inc()
+    finally:
+        metrics.set_enabled(True)
+    assert 'demo_seconds_count{endpoint="fast"} 1' in registry.render()
+    assert 'demo_retries_total 1' in registry.render()
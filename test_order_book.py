@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Проверка локального стакана: синхронизация снимка с diff потоком по U/u, разрывы
+последовательности и запросы лучших цен, спреда и объема до цены
+"""
+from app.order_book import APPLIED, GAP, STALE, UNSYNCED, LocalOrderBook
+from app.streams import DepthStream
+
+
+def snapshot(update_id):
+    return {
+        "lastUpdateId": update_id,
+        "bids": [["600.00", "1.0"], ["599.90", "2.0"], ["599.80", "3.0"]],
+        "asks": [["600.20", "1.5"], ["600.30", "2.5"], ["600.50", "4.0"]],
+    }
+
+
+def diff(first, last, bids=(), asks=()):
+    return {"e": "depthUpdate", "s": "BNBUSDT", "U": first, "u": last, "b": list(bids), "a": list(asks)}
+
+
+def test_sync_rules_and_queries():
+    book = LocalOrderBook("bnbusdt")
+    assert book.apply_diff(diff(95, 99)) == UNSYNCED
+    book.apply_snapshot(snapshot(100))
+
+    # Событие целиком до снимка отбрасывается, первое применяемое покрывает 101
+    assert book.apply_diff(diff(95, 100, bids=[["600.00", "9"]])) == STALE
+    assert book.apply_diff(diff(98, 103, bids=[["600.10", "0.5"]], asks=[["600.20", "0"]])) == APPLIED
+    assert book.synced and book.last_update_id == 103
+    assert book.best_bid() == (600.10, 0.5)
+    assert book.best_ask() == (600.30, 2.5)
+    assert abs(book.spread_bps() - 0.2 / 600.2 * 10000) < 1e-9
+
+    # Объем до цены: покупка берет asks не дороже цены, продажа - bids не дешевле
+    qty, quote = book.depth_to_price("BUY", 600.40)
+    assert qty == 2.5 and abs(quote - 600.30 * 2.5) < 1e-9
+    assert book.depth_to_price("SELL", 599.90)[0] == 0.5 + 1.0 + 2.0
+
+    depth = book.snapshot(2)
+    assert depth.bids == [(600.10, 0.5), (600.00, 1.0)] and depth.asks[0] == (600.30, 2.5)
+    assert depth.update_id == 103
+
+    # После синхронизации каждое событие продолжает предыдущее без пропусков
+    assert book.apply_diff(diff(104, 105, asks=[["600.25", "1"]])) == APPLIED
+    assert book.apply_diff(diff(107, 108)) == GAP
+    assert not book.synced and book.gaps == 1
+    assert book.apply_diff(diff(109, 110)) == UNSYNCED
+
+
+def test_depth_stream_resyncs_on_gap():
+    snapshots = []
+
+    def fetch(symbol):
+        snapshots.append(symbol)
+        return snapshot(100 if len(snapshots) == 1 else 200)
+
+    book = LocalOrderBook("BNBUSDT")
+    stream = DepthStream([book], fetch, base_url="wss://example", resync_interval=0.0)
+    assert stream.get_url() == "wss://example/stream?streams=bnbusdt@depth@100ms"
+
+    def message(event):
+        stream.handle_message({"stream": "bnbusdt@depth@100ms", "data": event})
+
+    # Первое событие тянет снимок и сразу применяется
+    message(diff(99, 101, bids=[["600.10", "1"]]))
+    assert snapshots == ["BNBUSDT"] and book.synced and book.best_bid()[0] == 600.10
+
+    # Пропуск 102..104: новый снимок, событие старше него отбрасывается, следующее - продолжает
+    message(diff(105, 106))
+    assert len(snapshots) == 2 and not book.synced and book.last_update_id == 200
+    message(diff(195, 201, asks=[["600.15", "1"]]))
+    assert book.synced and book.best_ask() == (600.15, 1.0)
+
+    # Переподключение: события могли потеряться
+    stream.on_connected()
+    assert not book.synced and not book.have_snapshot
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Проверка подтверждения ордеров по executionReport: ожидание конечного статуса из
+торгового потока и сборка ответа в форме FULL для учета исполнений
+"""
+import threading
+import time
+
+from app.balances import fill_summary
+from app.order_tracker import OrderTracker
+
+
+def report(order_id, execution, status, last_qty="0", last_price="0", cum_qty="0", cum_quote="0"):
+    return {"e": "executionReport", "s": "BNBUSDT", "c": "bot-1", "S": "SELL", "o": "MARKET",
+            "x": execution, "X": status, "i": order_id, "l": last_qty, "L": last_price,
+            "z": cum_qty, "Z": cum_quote, "n": "0.06", "N": "USDT", "T": 1700000000000}
+
+
+def test_wait_returns_filled_order_from_stream():
+    tracker = OrderTracker()
+    tracker.apply_execution_report(report(7, "NEW", "NEW"))
+    assert tracker.stats()["open"] == 1
+
+    def exchange():
+        time.sleep(0.05)
+        tracker.apply_execution_report(report(7, "TRADE", "PARTIALLY_FILLED", "0.4", "600.0", "0.4", "240.0"))
+        tracker.apply_execution_report(report(7, "TRADE", "FILLED", "0.1", "599.9", "0.5", "299.99"))
+
+    threading.Thread(target=exchange).start()
+    order = tracker.wait(7, timeout=2.0).to_order()
+    assert order["status"] == "FILLED" and order["orderId"] == 7
+    fill = fill_summary(order)
+    assert fill["complete"] and fill["qty"] == 0.5 and fill["quote"] == 299.99
+    assert abs(fill["commissions"]["USDT"] - 0.12) < 1e-12
+    assert tracker.stats() == {"tracked": 1, "open": 0, "events": 3, "confirmed": 1, "timeouts": 0}
+
+
+def test_wait_times_out_and_old_orders_are_evicted():
+    tracker = OrderTracker(max_orders=2)
+    assert tracker.wait(1, timeout=0.01) is None and tracker.timeouts == 1
+
+    tracker.apply_execution_report(report(1, "NEW", "NEW"))
+    tracker.apply_execution_report(report(2, "TRADE", "FILLED", "1", "600", "1", "600"))
+    tracker.apply_execution_report(report(3, "NEW", "NEW"))
+    # Вытеснен завершенный ордер, открытый остался
+    assert tracker.get(2) is None and tracker.get(1) is not None and tracker.get(3) is not None
+
+
+def test_ack_timeout_falls_back_to_query_without_shifting_balances(monkeypatch):
+    from app import web_bot
+
+    class QueryClient:
+        def get_order(self, symbol, orderId):
+            # GET /api/v3/order: исполнение есть, fills и комиссий нет
+            return {"symbol": symbol, "orderId": orderId, "side": "BUY", "status": "FILLED",
+                    "executedQty": "1.00000000", "cummulativeQuoteQty": "600.00000000"}
+
+    class LiveStream:
+        connected = True
+
+    monkeypatch.setattr(web_bot, "client", QueryClient())
+    monkeypatch.setattr(web_bot, "user_stream", LiveStream())
+    monkeypatch.setattr(web_bot, "ORDER_CONFIRM_TIMEOUT", 0.01)
+    monkeypatch.setattr(web_bot, "order_tracker", OrderTracker())
+
+    ack = {"symbol": "BNBUSDT", "orderId": 42, "clientOrderId": "bot-2", "transactTime": 1700000000000}
+    order = web_bot.confirm_order(ack)
+    assert order["status"] == "FILLED" and web_bot.order_tracker.timeouts == 1
+    assert not fill_summary(order)["complete"]
+
+    # Снимок не сдвигается без комиссий - цикл перечитает балансы через REST
+    service = web_bot.BalanceService(lambda: {"balances": [{"asset": "USDT", "free": "600", "locked": "0"}]})
+    service.refresh()
+    assert not service.apply_fills("BNBUSDT", [order], sent_at=service.updated + 1)
+    assert service.free.get("BNB", 0.0) == 0.0 and service.free["USDT"] == 600.0
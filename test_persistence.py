@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Проверка сохранения состояния: запись только при изменении, атомарная замена файла
+"""
+import json
+import os
+
+from app.persistence import StateStore
+
+
+def test_writes_only_on_real_state_change(tmp_path):
+    path = str(tmp_path / "state.json")
+    store = StateStore(path)
+    status = {"status": "running", "current_asset": "USDT", "switches_count": 0, "uptime": 0}
+
+    assert store.save(status)
+    for second in range(1, 60):
+        # Цикл обновляет uptime/цены - на диск это не уходит
+        status.update({"uptime": second, "current_price": 600.0 + second, "last_update": str(second)})
+        assert not store.save(status)
+
+    status.update({"current_asset": "BNB", "switches_count": 1})
+    assert store.save(status)
+    assert store.stats() == {"writes": 2, "skipped": 59}
+    assert json.load(open(path))["current_asset"] == "BNB"
+    assert os.listdir(tmp_path) == ["state.json"]
+
+    # После перезапуска неизменное состояние не переписывается
+    reloaded = StateStore(path)
+    assert reloaded.load()["switches_count"] == 1
+    assert not reloaded.save(status)
+
+
+def test_failed_write_keeps_previous_file(tmp_path):
+    path = str(tmp_path / "state.json")
+    store = StateStore(path)
+    store.save({"current_asset": "USDT"})
+    try:
+        store.save({"current_asset": "BNB", "current_price": BrokenJSON()})
+        assert False, "ожидалась ошибка записи"
+    except RuntimeError:
+        pass
+    assert json.load(open(path)) == {"current_asset": "USDT"}
+    assert os.listdir(tmp_path) == ["state.json"]
+
+
+class BrokenJSON:
+    def __str__(self):
+        raise RuntimeError("сбой посреди записи")
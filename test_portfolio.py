@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Проверка портфеля: разбор PORTFOLIO и деление свободного USDT по весам между парами
+"""
+import pytest
+
+from app import web_bot
+
+
+def test_parse_portfolio_and_validation():
+    specs = web_bot.parse_portfolio("bnbusdt:30m, ETHUSDT:1h:2,SOLUSDT,BNBUSDT:5m", "15m")
+    # Второй BNBUSDT пропущен: две стратегии делили бы один баланс BNB
+    assert specs == [("BNBUSDT", "30m", 1.0), ("ETHUSDT", "1h", 2.0), ("SOLUSDT", "15m", 1.0)]
+    assert web_bot.parse_portfolio("", "30m") == []
+
+    for spec in ("BNBUSDT:30m:x", "BNBUSDT:30m:0", "BNBUSDT:30m:-1", "BNBUSDT:2m", ":30m", "BNBUSDT:30m:1:extra"):
+        with pytest.raises(ValueError):
+            web_bot.parse_portfolio(spec, "30m")
+
+
+def test_invalid_portfolio_is_a_configuration_issue(monkeypatch):
+    monkeypatch.setenv("PORTFOLIO", "BNBUSDT:30m:x")
+    config = web_bot.EnvironmentConfig()
+    assert config.portfolio_specs == []
+    assert any("PORTFOLIO" in issue for issue in config.config_status.configuration_issues)
+
+
+def test_balances_for_splits_free_usdt_by_weight(monkeypatch):
+    portfolio = web_bot.PortfolioRunner([("BNBUSDT", "30m", 1.0), ("ETHUSDT", "1h", 3.0)])
+    bnb, eth = portfolio.runners["BNBUSDT_30m"], portfolio.runners["ETHUSDT_1h"]
+    bnb.price, eth.price = 600.0, 3000.0
+    free = {"USDT": 1000.0}
+    monkeypatch.setattr(web_bot, "get_free_balances", lambda refresh=False: dict(free))
+
+    assert portfolio.balances_for(bnb) == (250.0, 0.0)
+    assert portfolio.balances_for(eth) == (750.0, 0.0)
+
+    # ETH уже куплен на свою долю: весь свободный USDT - паре, которая коин не держит
+    free.update({"USDT": 250.0, "ETH": 0.25})
+    assert portfolio.balances_for(bnb) == (250.0, 0.0)
+    assert portfolio.balances_for(eth) == (187.5, 0.25)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Проверка семплирующего профайлера
+"""
+import threading
+import time
+
+from app.profiler import SamplingProfiler
+
+
+def busy_leaf(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def busy_root(stop):
+    busy_leaf(stop)
+
+
+def test_samples_only_selected_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_root, args=(stop,), name="bot-worker")
+    worker.start()
+    profiler = SamplingProfiler()
+    try:
+        assert profiler.start(0.3, lambda t: t.name == "bot-worker", interval=0.005)
+        assert not profiler.start(0.3, lambda t: True)
+        while profiler.running:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        worker.join()
+
+    summary = profiler.summary()
+    assert summary["samples"] > 10 and summary["threads"] == ["bot-worker"]
+    lines = profiler.collapsed().splitlines()
+    assert lines and all(line.startswith("bot-worker;") for line in lines)
+    assert any("busy_root" in line and "busy_leaf" in line for line in lines)
+    top = profiler.top()
+    assert top[0]["function"].startswith("busy_leaf") and top[0]["total_pct"] > 90
+
+
+def test_admin_endpoints_accept_only_header_token(monkeypatch):
+    from app import web_bot
+
+    monkeypatch.setattr(web_bot, "ADMIN_TOKEN", "s3cret")
+    monkeypatch.setattr(web_bot, "trading_thread_ident", None)
+    http = web_bot.app.test_client()
+
+    # Запуск профилирования меняет состояние - только POST
+    assert http.get("/admin/profile", headers={"X-Admin-Token": "s3cret"}).status_code == 405
+    # Токен в query string не принимается: он попал бы в access log
+    assert http.post("/admin/profile?token=s3cret").status_code == 403
+    assert http.post("/admin/profile", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert http.post("/admin/profile", headers={"X-Admin-Token": "s3cret"}).status_code == 409
+    assert http.get("/admin/profile/result?token=s3cret").status_code == 403
+    assert http.get("/admin/profile/result", headers={"X-Admin-Token": "s3cret"}).status_code == 200
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Проверка ограничителя веса запросов на симуляторе биржи
+"""
+import time
+
+import numpy as np
+
+from app.backtest import KlineHistory
+from app.exchange_sim import ExchangeSimulator, SimConfig, SimServer, SimulatedClient
+from app.rate_limit import RateLimitedClient, WeightLimiter
+
+
+def make_client(weight_limit=6000, limiter=None):
+    open_times = np.arange(100, dtype=np.int64) * 60_000
+    sim = ExchangeSimulator({"BNBUSDT": KlineHistory(open_times, np.full(100, 600.0))},
+                            SimConfig(speed=0, weight_limit=weight_limit), start_ms=int(open_times[-1]))
+    server = SimServer(sim).start()
+    return sim, server, RateLimitedClient(SimulatedClient(server.url), limiter or WeightLimiter(weight_limit))
+
+
+def test_balances_are_coalesced_into_one_account_request():
+    sim, server, client = make_client()
+    try:
+        before = sim.requests
+        assert client.get_asset_balance("USDT")["free"] == "1000.00000000"
+        assert client.get_asset_balance("BNB")["free"] == "0.00000000"
+        assert sim.requests - before == 1
+        assert client.limiter.stats()["used_weight_1m"] == sim.used_weight
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_limiter_throttles_instead_of_getting_429():
+    # Бюджет 480 веса в минуту (0.8 * 600) = 8 веса/с; 5 запросов klines по 2 веса не влезают сразу
+    limiter = WeightLimiter(600)
+    sim, server, client = make_client(weight_limit=600, limiter=limiter)
+    try:
+        limiter.tokens = 2.0
+        started = time.monotonic()
+        for _ in range(5):
+            client.get_klines(symbol="BNBUSDT", interval="1m", limit=5)
+        assert time.monotonic() - started >= 8 / limiter.rate * 0.9
+        assert sim.rejected == 0
+        assert limiter.stats()["throttled"] >= 1
+    finally:
+        server.shutdown()
+        server.server_close()
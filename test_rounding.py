@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Проверка Quantizer: точный floor до шага и строки без лишней точности
+"""
+from decimal import Decimal
+
+from app.rounding import Quantizer, round_step, round_tick
+
+
+def test_quantizer_strings_match_exchange_steps():
+    q = Quantizer("0.00100000", "0.01000000")
+    assert q.qty_str(0.043) == "0.043"            # float деление дало бы 0.042
+    assert q.qty_str(1.499) == "1.499"
+    assert q.qty_str(0.3) == "0.300"
+    assert q.qty_str(0.0009) == "0.000"
+    assert q.price_str(612.345678) == "612.34"
+    assert q.qty(2.0) == Decimal("2.000")
+
+    whole = Quantizer("1.00000000", "0.00000001")
+    assert whole.qty_str(12345.987) == "12345"
+    assert whole.price_str(0.0000123456) == "0.00001234"
+
+    tens = Quantizer("10", "0.1")
+    assert tens.qty_str(1234.5) == "1230"
+
+
+def test_float_helpers_use_exact_floor():
+    assert round_step(0.3, 0.1) == 0.3
+    assert round_step(1.23456789, 0.001) == 1.234
+    assert round_tick(612.345678, 0.01) == 612.34
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Проверка планировщика по закрытию свечей
+"""
+import threading
+import time
+
+from app.scheduler import CandleScheduler
+
+
+def test_next_close_uses_server_offset_and_shortest_interval():
+    scheduler = CandleScheduler(["30m", "5m"], close_delay_ms=500, offset_ms=lambda: 0)
+    minute = 60_000
+    assert scheduler.next_close_ms(7 * minute + 1) == 10 * minute + 500
+    # Ровно на границе - следующая граница, а не текущая
+    assert scheduler.next_close_ms(10 * minute) == 15 * minute + 500
+
+    # Граница считается по часам сервера: локальное время + client.timestamp_offset
+    ahead = CandleScheduler(["1m"], offset_ms=lambda: 2000)
+    assert abs(ahead.server_now_ms() - int(time.time() * 1000) - 2000) < 50
+
+
+def test_wait_wakes_on_check_stream_and_stop():
+    scheduler = CandleScheduler(["4h"])
+    started = time.monotonic()
+    assert scheduler.wait(max_wait=0.1) == "check"
+    assert time.monotonic() - started < 1.0
+
+    event = threading.Event()
+    threading.Timer(0.1, event.set).start()
+    assert scheduler.wait(event=event) == "stream"
+    assert not event.is_set()
+
+    assert scheduler.wait(should_stop=lambda: True) == "stop"
+    assert scheduler.wakeups == {"candle": 0, "stream": 1, "check": 1, "stop": 1}
+
+
+def test_one_cycle_per_candle_boundary():
+    minute = 60_000
+    local = int(time.time() * 1000)
+    boundary = (local // minute + 10) * minute
+    # Часы сервера за 100мс до границы
+    scheduler = CandleScheduler(["1m"], close_delay_ms=0, offset_ms=lambda: boundary - local - 100)
+    assert scheduler.wait() == "candle" and scheduler.last_close_ms == boundary
+
+    # Закрытие той же свечи из потока после пробуждения по таймеру - не второй цикл
+    event = threading.Event()
+    event.set()
+    assert scheduler.wait(max_wait=0.1, event=event, stream_close_ms=lambda: boundary) == "check"
+    assert scheduler.duplicates == 1
+
+    # Поток опередил таймер: граница уже обработана, следующее пробуждение - через свечу
+    early = CandleScheduler(["1m"], close_delay_ms=500, offset_ms=lambda: boundary - local - 100)
+    event.set()
+    assert early.wait(event=event, stream_close_ms=lambda: boundary) == "stream"
+    assert early.next_close_ms(boundary + 100) == boundary + minute + 500
+    assert early.next_close_ms(boundary - 50) == boundary + minute + 500
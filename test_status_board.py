@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Проверка снимка состояния для /health и /status
+"""
+import threading
+import time
+
+from app.status_board import StatusBoard
+
+
+def test_readers_see_whole_snapshots():
+    board = StatusBoard()
+    assert board.age() == float("inf")
+    stop = threading.Event()
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            n += 1
+            board.publish({"a": n, "b": n})
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(20000):
+            snapshot = board.current
+            assert snapshot.get("a") == snapshot.get("b")
+    finally:
+        stop.set()
+        thread.join()
+    assert board.publications > 0 and board.age() < 1.0
+    assert "published_at" in board.current
+
+
+def test_health_reports_stale_loop_without_exchange_calls():
+    from app import web_bot
+
+    class NoNetwork:
+        session = None
+
+        def __getattr__(self, name):
+            raise AssertionError(f"/health обратился к бирже: {name}")
+
+    web_bot.publish_status()
+    http = web_bot.app.test_client()
+    old_client, web_bot.client = web_bot.client, NoNetwork()
+    web_bot.running = True
+    try:
+        response = http.get("/health")
+        assert response.status_code == 200 and response.get_json()["ok"]
+
+        web_bot.status_board._heartbeat = time.time() - web_bot.health_stale_after() - 1
+        response = http.get("/health")
+        assert response.status_code == 503
+        assert response.get_json()["status"] == "stale"
+
+        status = http.get("/status").get_json()
+        assert status["published_at"] is not None
+        # Поля /status до перехода на снимок остаются на верхнем уровне
+        for key in ("symbol", "mode", "status", "current_asset", "should_hold", "current_price",
+                    "balance_usdt", "balance_base", "ma_short", "ma_long", "error_count", "uptime",
+                    "switches_count", "last_switch", "last_update", "rate_limit", "cycle_latency"):
+            assert key in status, key
+    finally:
+        web_bot.running = False
+        web_bot.client = old_client
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Проверка переподключения WebSocket: ошибка получения адреса (REST listenKey) не
+останавливает поток, а уходит в backoff
+"""
+import threading
+
+from app.streams import UserDataStream
+
+
+class FailingListenKeyClient:
+    def __init__(self):
+        self.calls = 0
+        self.retried = threading.Event()
+
+    def stream_get_listen_key(self):
+        self.calls += 1
+        if self.calls >= 2:
+            self.retried.set()
+        raise ConnectionError("listenKey недоступен")
+
+
+def test_listen_key_failure_is_retried():
+    client = FailingListenKeyClient()
+    stream = UserDataStream(client, {}, base_url="ws://127.0.0.1:9")
+    stream.keepalive = 3600
+    stream.start()
+    try:
+        assert client.retried.wait(5.0)
+        assert stream._thread.is_alive() and stream.reconnects >= 1
+    finally:
+        stream.stop()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Проверка HTTP транспорта: переиспользование соединений и таймауты по типу запроса
+"""
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import requests
+
+from app.backtest import KlineHistory
+from app.exchange_sim import ExchangeSimulator, SimConfig, SimServer, SimulatedClient
+from app.transport import KeepAliveWarmer, TransportConfig, connection_stats, install_transport
+
+
+def test_keep_alive_connection_is_reused():
+    open_times = np.arange(100, dtype=np.int64) * 60_000
+    sim = ExchangeSimulator({"BNBUSDT": KlineHistory(open_times, np.full(100, 600.0))},
+                            SimConfig(speed=0), start_ms=int(open_times[-1]))
+    server = SimServer(sim).start()
+    try:
+        client = SimulatedClient(server.url)
+        session = install_transport(client, TransportConfig(pool_size=4))
+        for _ in range(10):
+            client.ping()
+            client.get_klines(symbol="BNBUSDT", interval="1m", limit=5)
+        client.order_market_buy(symbol="BNBUSDT", quantity="0.100")
+
+        stats = connection_stats(session)
+        assert stats["requests"] == 21
+        assert stats["connections_opened"] == 1
+        assert client.session.headers["X-MBX-APIKEY"] == "sim"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_timeouts_by_endpoint():
+    config = TransportConfig(connect_timeout=1.0, read_timeout=10.0, order_read_timeout=3.0, market_read_timeout=4.0)
+    client = SimpleNamespace(session=requests.Session())
+    session = install_transport(client, config)
+    assert session.timeout_for("https://api.binance.com/api/v3/order") == (1.0, 3.0)
+    assert session.timeout_for("https://api.binance.com/api/v3/klines?symbol=BNBUSDT") == (1.0, 4.0)
+    assert session.timeout_for("https://api.binance.com/api/v3/account") == (1.0, 10.0)
+
+
+def test_keep_alive_warmer_stops_and_restarts():
+    pings = []
+    warmer = KeepAliveWarmer(lambda: pings.append(time.monotonic()), 0.02)
+    warmer.start()
+    time.sleep(0.1)
+    assert warmer.running and pings
+    warmer.stop()
+    assert not warmer.running
+    time.sleep(0.05)
+    stopped_at = len(pings)
+    time.sleep(0.1)
+    assert len(pings) == stopped_at
+
+    # Повторный запуск сразу после остановки (как /stop и затем /start)
+    warmer.stop()
+    warmer.start()
+    time.sleep(0.1)
+    assert warmer.running and len(pings) > stopped_at
+    warmer.stop()